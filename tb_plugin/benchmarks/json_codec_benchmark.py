@@ -0,0 +1,65 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+"""Compare the json backends on the sample traces.
+
+Usage: python benchmarks/json_codec_benchmark.py [trace files or directories] [--repeat N]
+The traces in tb_plugin/samples are used if no path is given.
+"""
+import argparse
+import gc
+import glob
+import gzip
+import os
+import time
+
+from torch_tb_profiler import json_codec
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'samples')
+
+
+def find_traces(paths):
+    traces = []
+    for path in paths:
+        if os.path.isdir(path):
+            traces.extend(sorted(glob.glob(os.path.join(path, '**', '*.pt.trace.json*'), recursive=True)))
+        else:
+            traces.append(path)
+    return traces
+
+
+def best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', default=[SAMPLES_DIR])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    backends = json_codec.available_backends()
+    print('backends: {}, default: {}'.format(', '.join(backends), json_codec.backend_name()))
+    print('{:<64} {:>10} {:>10} {:>10} {:>10}'.format('trace', 'size(MB)', 'backend', 'loads(s)', 'dumps(s)'))
+    for trace in find_traces(args.paths):
+        with open(trace, 'rb') as f:
+            data = f.read()
+        if trace.endswith('.gz'):
+            data = gzip.decompress(data)
+        name = os.path.relpath(trace, os.path.dirname(os.path.dirname(trace)))
+        obj = json_codec.get_backend('json').loads(data)
+        for backend in backends.values():
+            loads = best_time(lambda: backend.loads(data), args.repeat)
+            dumps = best_time(lambda: backend.dumps(obj), args.repeat)
+            print('{:<64} {:>10.1f} {:>10} {:>10.3f} {:>10.3f}'.format(
+                name, len(data) / 1024 / 1024, backend.name, loads, dumps))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+"""Measure the memory of the operator tree nodes on a synthetic trace.
+
+Every kernel of the trace is launched by its own cudaLaunchKernel inside its own operator,
+so the trace has the given number of OperatorNode, RuntimeNode and DeviceNode each.
+The node classes are compared with plain classes holding the same attributes in __dict__.
+
+Usage: python benchmarks/node_memory_benchmark.py [--kernels N]
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+from torch_tb_profiler.profiler.event_parser import EventParser
+from torch_tb_profiler.profiler.event_table import EventTable
+
+
+def synthetic_trace(kernels: int):
+    for i in range(kernels):
+        ts = i * 10
+        yield {'ph': 'X', 'cat': 'cpu_op', 'name': 'aten::conv2d', 'pid': 100, 'tid': 100, 'ts': ts, 'dur': 8,
+               'args': {'External id': i + 1, 'Input Dims': [[32, 3, 224, 224], [64, 3, 7, 7]],
+                        'Input type': ['float', 'float']}}
+        yield {'ph': 'X', 'cat': 'runtime', 'name': 'cudaLaunchKernel', 'pid': 100, 'tid': 100,
+               'ts': ts + 1, 'dur': 5, 'args': {'correlation': i + 1, 'external id': i + 1}}
+        yield {'ph': 'X', 'cat': 'kernel', 'name': 'volta_scudnn_128x64_relu_interior_nn_v1', 'pid': 0, 'tid': 7,
+               'ts': ts + 3, 'dur': 6,
+               'args': {'correlation': i + 1, 'external id': i + 1, 'device': 0, 'blocks per SM': 1.5,
+                        'est. achieved occupancy %': 25, 'grid': [1, 2, 3], 'block': [128, 1, 1],
+                        'registers per thread': 128, 'shared memory': 49152}}
+
+
+def slot_names(cls):
+    names = []
+    for klass in reversed(cls.__mro__):
+        names.extend(getattr(klass, '__slots__', ()))
+    return names
+
+
+def dict_node_class(cls):
+    """Return a class with the same attributes as cls stored in __dict__, which is the layout without __slots__."""
+    names = slot_names(cls)
+
+    def __init__(self, node):
+        for name in names:
+            setattr(self, name, getattr(node, name))
+
+    # a class per node type, so that the instances share the keys of their __dict__ as the original classes did.
+    return type('Dict' + cls.__name__, (), {'__init__': __init__})
+
+
+def dict_layout_size(nodes):
+    """The bytes allocated for the nodes if their attributes were stored in __dict__."""
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    dict_class = dict_node_class(type(nodes[0]))
+    dict_nodes = [dict_class(n) for n in nodes]
+    size = tracemalloc.get_traced_memory()[0] - start - sys.getsizeof(dict_nodes)
+    tracemalloc.stop()
+    del dict_nodes
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--kernels', type=int, default=1000000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    events = EventTable()
+    for data in synthetic_trace(args.kernels):
+        events.append(data)
+    events.finish()
+    print('{} events in the table: {:.1f}s'.format(len(events), time.perf_counter() - start))
+
+    start = time.perf_counter()
+    event_parser = EventParser()
+    tid2list, _, _, _ = event_parser.parse_nodes(events)
+    print('parse_nodes: {:.1f}s'.format(time.perf_counter() - start))
+
+    node_lists = {
+        'OperatorNode': [op for ops in tid2list.values() for op in ops],
+        'RuntimeNode': event_parser.runtime_node_list,
+        'DeviceNode': event_parser.device_node_list,
+    }
+    print('{:<15} {:>10} {:>20} {:>20} {:>8}'.format(
+        'node', 'count', '__slots__ (B/node)', '__dict__ (B/node)', 'saving'))
+    total_slots_size = total_dict_size = 0
+    for name, nodes in node_lists.items():
+        # The attribute values are shared by both layouts, only the node objects are compared.
+        slots_size = sum(sys.getsizeof(n) for n in nodes)
+        dict_size = dict_layout_size(nodes)
+        total_slots_size += slots_size
+        total_dict_size += dict_size
+        print('{:<15} {:>10} {:>20.1f} {:>20.1f} {:>7.0f}%'.format(
+            name, len(nodes), slots_size / len(nodes), dict_size / len(nodes), 100 - slots_size / dict_size * 100))
+    print('total: {:.1f} MB with __slots__, {:.1f} MB with __dict__'.format(
+        total_slots_size / 1024 / 1024, total_dict_size / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+import unittest
+
+import numpy as np
+from json.decoder import JSONDecodeError
+
+from torch_tb_profiler import json_codec
+
+
+class TestJsonCodec(unittest.TestCase):
+
+    def test_backends(self):
+        backends = json_codec.available_backends()
+        self.assertIn('json', backends)
+        self.assertIn(json_codec.backend_name(), backends)
+
+        obj = {'schemaVersion': 1, 'traceEvents': [{'name': 'aten::to é', 'ts': 1623142623460016, 'dur': 1.5}]}
+        for name, backend in backends.items():
+            with self.subTest(backend=name):
+                self.assertEqual(backend.loads(backend.dumps(obj)), obj)
+                self.assertEqual(backend.loads(backend.dumps(obj).decode('utf-8')), obj)
+                # control character in string, which is only accepted with strict=False
+                self.assertEqual(backend.loads(b'{"name": "a\x01b"}'), {'name': 'a\x01b'})
+                self.assertEqual(backend.loads(backend.dumps({1: np.int64(2), 'a': np.arange(3)})),
+                                 {'1': 2, 'a': [0, 1, 2]})
+                with self.assertRaises(JSONDecodeError):
+                    backend.loads(b'{"Input Dims": N/A}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import copy
+import random
+import unittest
+
+import numpy as np
+
+from torch_tb_profiler.profiler.node import BackwardNode, OperatorNode
+from torch_tb_profiler.profiler.op_index import OperatorIndex
+from torch_tb_profiler.profiler.op_tree import OpTreeBuilder
+from torch_tb_profiler.profiler.trace import EventTypes
+
+
+def create_tree(rng: random.Random, start: int, end: int, depth: int = 0) -> OperatorNode:
+    # the children are sorted, disjoint and contained in the parent, all the times are even.
+    node = OperatorNode(name='op{}'.format(depth), start_time=start, end_time=end, type=EventTypes.OPERATOR, tid=1)
+    if depth < 5:
+        times = sorted(rng.sample(range(start // 2 + 1, end // 2), min(rng.randint(0, 6), end // 2 - start // 2 - 1)))
+        for child_start, child_end in zip(times[::2], times[1::2]):
+            node.children.append(create_tree(rng, child_start * 2, child_end * 2, depth + 1))
+    return node
+
+
+def walk(root: OperatorNode):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children))
+
+
+def shape(node: OperatorNode):
+    return (node.name, node.start_time, node.end_time, [shape(child) for child in node.children])
+
+
+class TestOperatorIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(0)
+        self.root = create_tree(self.rng, 0, 2000)
+        self.index = OperatorIndex.build(self.root)
+
+    def test_build(self):
+        self.assertIsNotNone(self.index)
+        self.assertEqual(self.index.nodes, list(walk(self.root)))
+
+        overlapped = OperatorNode(name='op', start_time=0, end_time=10, type=EventTypes.OPERATOR, tid=1)
+        overlapped.children = [
+            OperatorNode(name='a', start_time=0, end_time=6, type=EventTypes.OPERATOR, tid=1),
+            OperatorNode(name='b', start_time=4, end_time=8, type=EventTypes.OPERATOR, tid=1)]
+        self.assertIsNone(OperatorIndex.build(overlapped))
+        overlapped.children[1].start_time = None
+        self.assertIsNone(OperatorIndex.build(overlapped))
+
+    def test_queries(self):
+        nodes = list(walk(self.root))
+        for ts in range(-1, 2002, 3):
+            expected = [n for n in nodes if n.start_time <= ts < n.end_time]
+            self.assertEqual(self.index.containing(ts), expected)
+            located = self.index.locate(np.array([ts]))[0]
+            self.assertEqual(self.index.nodes[located] if located >= 0 else None, expected[-1] if expected else None)
+
+        for start in range(-1, 2002, 37):
+            for end in (start, start + 1, start + 50, start + 500):
+                expected = [n for n in nodes if n.start_time <= end and n.end_time >= start]
+                self.assertEqual(self.index.overlapping(start, end), expected)
+
+        for node in nodes:
+            self.assertEqual(self.index.descendants(node), list(walk(node))[1:])
+
+    def test_insert_backward_modules(self):
+        for _ in range(20):
+            # the modules are disjoint and their times are odd, so they are inserted by the index.
+            times = sorted(self.rng.sample(range(-10, 1010), 2 * self.rng.randint(1, 30)))
+            modules = [BackwardNode(name='module{}'.format(i), start_time=2 * start + 1, end_time=2 * end + 1,
+                                    type='backward', tid=0)
+                       for i, (start, end) in enumerate(zip(times[::2], times[1::2]))]
+            index = OperatorIndex.build(self.root)
+            self.assertIsNotNone(OpTreeBuilder._locate_backward_parents(index, modules))
+
+            expected = copy.deepcopy((self.root, modules))
+            OpTreeBuilder._walk_backward_modules(*expected)
+            actual = copy.deepcopy((self.root, modules))
+            OpTreeBuilder._insert_backward_modules(*actual)
+            self.assertEqual(shape(actual[0]), shape(expected[0]))
+
+        # the modules overlapping each other are inserted by walking the tree.
+        modules = [BackwardNode(name='module', start_time=3, end_time=9, type='backward', tid=0),
+                   BackwardNode(name='module', start_time=5, end_time=7, type='backward', tid=0)]
+        self.assertIsNone(OpTreeBuilder._locate_backward_parents(self.index, modules))
+
+
+if __name__ == '__main__':
+    unittest.main()
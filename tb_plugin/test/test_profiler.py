@@ -1,14 +1,30 @@
+import contextlib
 import gzip
 import json
+import multiprocessing
 import os
+import signal
 import unittest
+from collections import defaultdict
+from io import BytesIO
+
+import numpy as np
 
 from torch_tb_profiler.profiler.data import (DistributedRunProfileData,
                                              RunProfileData)
 from torch_tb_profiler.profiler.loader import RunLoader
 from torch_tb_profiler.profiler.overall_parser import ProfileRole
+from torch_tb_profiler.profiler.memory_parser import (MemoryMetrics, MemoryParser,
+                                                      MemoryRecord, MemoryRecordStore)
 from torch_tb_profiler.profiler.gpu_metrics_parser import GPUMetricsParser
+from torch_tb_profiler.profiler.node import OperatorNode
+from torch_tb_profiler.profiler.op_index import OperatorIndex
+from torch_tb_profiler.profiler.op_tree import OpTreeBuilder
+from torch_tb_profiler.profiler import trace_stream
+from torch_tb_profiler.profiler.trace import DeviceType, EventTypes
 from torch_tb_profiler.run import RunProfile
+from torch_tb_profiler import utils
+from torch_tb_profiler.utils import lttb_downsample
 
 SCHEMA_VERSION = 1
 WORKER_NAME = 'worker0'
@@ -20,6 +36,25 @@ def parse_json_trace(json_content, worker_name=WORKER_NAME) -> RunProfileData:
     return RunProfileData.from_json(worker_name, 0, trace_json)
 
 
+@contextlib.contextmanager
+def environ(**env):
+    """Set the environment variables within the context, None removes the variable."""
+    old_env = {k: os.environ.get(k) for k in env}
+    try:
+        for k, v in env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        yield
+    finally:
+        for k, v in old_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
 '''
 All the events in json string are only simulation, not actual generated events.
 We removed the data fields that not used by current version of our profiler,
@@ -1032,6 +1067,40 @@ class TestProfiler(unittest.TestCase):
                 gpu_util_id += 1
             self.assertEqual(gpu_util_id, len(gpu_util_expected))
 
+        # a finer timeline of any number of buckets, e.g. when the trace view is zoomed in.
+        buckets = profile.gpu_metrics_parser.get_gpu_util_timeline(1, [125, 129, 133, 165, 171, 210, 225])
+        self.assertEqual([b[0] for b in buckets], [125, 129, 133, 165, 171, 210, 225])
+        for b, util in zip(buckets, [0, 3 / 4, 1.0, 5 / 6, 10 / 39, 10 / 15, 0]):
+            self.assertAlmostEqual(b[1], util)
+
+        # the counters of the trace view at multiple resolutions.
+        parser = profile.gpu_metrics_parser
+        self.assertEqual([len(level.edges) for level in parser.counter_pyramid], [101, 121, 121])
+        counters = parser.get_gpu_counters()
+        self.assertEqual(len(counters), 2 * (2 + 100 + 1))
+        self.assertEqual({c['name'] for c in counters}, {'GPU 1 Utilization', 'GPU 1 Est. SM Efficiency'})
+
+        counters = parser.get_gpu_counters(130, 150, 4)
+        util = [c for c in counters if c['name'] == 'GPU 1 Utilization']
+        self.assertEqual(util[2]['ts'], 130)
+        self.assertEqual(util[-1]['ts'], 150)
+        self.assertGreaterEqual(len(util), 2 + 4 + 1)
+        self.assertTrue(all(c['args']['GPU Utilization'] == 1.0 for c in util[2:-1]))
+
+        # zoomed in beyond the finest level, the buckets are calculated from the merged ranges.
+        counters = parser.get_gpu_counters(169.25, 170.75, 3)
+        util = [(c['ts'], c['args']['GPU Utilization']) for c in counters if c['name'] == 'GPU 1 Utilization']
+        self.assertEqual(util, [(169.25, 1), (169.25, 0), (169.25, 1.0), (169.75, 0.5), (170.25, 0.0), (170.75, 0)])
+        sm_efficiency = [c['args']['Est. SM Efficiency'] for c in counters
+                         if c['name'] == 'GPU 1 Est. SM Efficiency']
+        for value, expected in zip(sm_efficiency[2:-1], [0.3, 0.15, 0]):
+            self.assertAlmostEqual(value, expected)
+        # a coarser resolution is served by the pyramid.
+        counters = parser.get_gpu_counters(165.5, 172.5, 7)
+        util = [c['ts'] for c in counters if c['name'] == 'GPU 1 Utilization']
+        self.assertEqual(util, [164, 164, 164, 166, 167, 168, 169, 170, 172, 173])
+        self.assertEqual(parser.get_gpu_counters(300, 400), [])
+
         sm_efficiency_expected = [(130, 0.5), (135, 0), (135, 1.0), (140, 0), (140, 0.6), (145, 0), (145, 0.9),
                                   (150, 0), (150, 0.3), (170, 0), (170, 0), (200, 0), (200, 1.0), (220, 0)]
         for gpu_id in profile.gpu_metrics_parser.gpu_ids:
@@ -1209,11 +1278,10 @@ class TestProfiler(unittest.TestCase):
         gpu_metrics_parser.gpu_util_buckets = gpu_util_buckets
         gpu_metrics_parser.approximated_sm_efficiency_ranges = approximated_sm_efficiency_ranges
         profile.gpu_metrics = gpu_metrics_parser.get_gpu_metrics()
-        with open(trace_json_flat_path, 'rb') as file:
-            raw_data = file.read()
-        data_with_gpu_metrics_compressed = profile.append_gpu_metrics(raw_data)
-        data_with_gpu_metrics_flat = gzip.decompress(
-            data_with_gpu_metrics_compressed)
+        output = BytesIO()
+        tail, has_events = trace_stream.write_trace_body(trace_json_flat_path, output)
+        trace_stream.append_trace_events(output, profile.gpu_metrics, tail, has_events)
+        data_with_gpu_metrics_flat = gzip.decompress(output.getvalue())
 
         trace_json_expected_path = os.path.join(basedir, 'gpu_metrics_expected.json')
         with open(trace_json_expected_path, 'rb') as file:
@@ -1638,6 +1706,97 @@ class TestProfiler(unittest.TestCase):
             for name, values in expected_data.items():
                 self.assertEqual(mem_stat[name], values)
 
+        # the records attributed in bulk are the same as visiting the trees record by record.
+        snapshot = profile.memory_snapshot
+        parser = MemoryParser(MemoryRecord.from_table(profile.events))
+        records_by_tid = defaultdict(list)
+        for r in parser.memory_records:
+            records_by_tid[r.tid].append(r)
+        op_memory_table, processed_node = defaultdict(list), defaultdict(int)
+        for tid, records in records_by_tid.items():
+            self.assertIsNotNone(OperatorIndex.build(profile.tid2tree[tid]))
+            parser._walk_records(records, profile.tid2tree[tid], op_memory_table, processed_node)
+        self.assertEqual(list(processed_node.items()), list(snapshot.processed_node.items()))
+
+        def get_records(table):
+            return [(op, [(r.ts, r.addr, r.bytes, r.op_name if r.bytes > 0 else None) for r in records])
+                    for op, records in table.items()]
+        self.assertEqual(get_records(op_memory_table), get_records(snapshot.op_memory_table))
+
+        # the records and metrics within a window are answered by the record store.
+        for start_ts, end_ts in ((None, None), (100, 400), (205, None), (None, 205), (350, 350), (1000, 2000)):
+            records = [r for r in snapshot.memory_records if (start_ts is None or r.ts >= start_ts)
+                       and (end_ts is None or r.ts <= end_ts)]
+            self.assertEqual(snapshot.get_records(start_ts, end_ts), records)
+            for op, op_records in snapshot.op_memory_table.items():
+                expected = {}
+                for r in op_records:
+                    if r in records and r.device_name is not None:
+                        metrics = expected.setdefault(r.device_name, [0, 0, 0])
+                        metrics[MemoryMetrics.SelfIncreaseSize] += r.bytes
+                        metrics[MemoryMetrics.SelfAllocationSize] += max(r.bytes, 0)
+                        metrics[MemoryMetrics.SelfAllocationCount] += r.bytes > 0
+                self.assertEqual(dict(snapshot.get_memory_metrics(op, start_ts, end_ts)), expected)
+
+            # the self metrics of the names sum up to the metrics of the operators.
+            stats = snapshot.get_memory_statistics(profile.tid2tree, start_ts, end_ts)
+            for device in ('CPU', 'GPU0'):
+                expected = [0, 0, 0]
+                for op in snapshot.op_memory_table:
+                    metrics = snapshot.get_memory_metrics(op, start_ts, end_ts).get(device, [0, 0, 0])
+                    expected = [x + y for x, y in zip(expected, metrics)]
+                actual = [sum(values[i] for values in stats.get(device, {}).values()) for i in range(3)]
+                self.assertEqual(actual, expected)
+
+    def test_memory_allocations(self):
+        # the allocations and releases of a few addresses, with repeated allocations and releases.
+        rng = np.random.default_rng(0)
+        records = [MemoryRecord('Memory', 1, 1, ts, DeviceType.CUDA, 0,
+                                None if addr < 0 else addr, int(size), float('nan'), float('nan'))
+                   for ts, addr, size in zip(np.sort(rng.integers(0, 100, 300)).tolist(),
+                                             rng.integers(-1, 6, 300).tolist(),
+                                             rng.choice([-8, 8, 16], 300).tolist())]
+        store = MemoryRecordStore(records, {})
+
+        def pair(records):
+            # the pairing of the records one by one by their address.
+            pairs, alloc, free = [], {}, {}
+            for i, r in enumerate(records):
+                if r.addr is None:
+                    continue
+                if r.bytes > 0:
+                    alloc[r.addr] = i
+                elif r.addr in alloc:
+                    pairs.append((alloc.pop(r.addr), i))
+                else:
+                    free[r.addr] = i
+            return pairs, list(alloc.values()), list(free.values())
+
+        for start_ts, end_ts in ((None, None), (10, 60), (None, 30), (50, None), (40, 40), (200, 300)):
+            begin, _ = store.window(start_ts, end_ts)
+            pairs, allocations, releases = pair(store.get_records(start_ts, end_ts))
+            alloc_idx, free_idx, actual_allocations, actual_releases = store.get_allocations(start_ts, end_ts)
+            self.assertEqual(list(zip(alloc_idx.tolist(), free_idx.tolist())),
+                             [(begin + i, begin + j) for i, j in pairs])
+            self.assertEqual(actual_allocations.tolist(), [begin + i for i in allocations])
+            self.assertEqual(actual_releases.tolist(), [begin + i for i in releases])
+
+    def test_deep_call_stack(self):
+        # a call chain deeper than the recursion limit, every two consecutive calls of a name are merged.
+        depth = 100000
+        nodes = [OperatorNode(name='op{}'.format(i // 2), start_time=i, end_time=2 * depth - i,
+                              type=EventTypes.OPERATOR, tid=1) for i in range(depth)]
+        root = OpTreeBuilder()._build_tree({1: nodes}, {}, [])[1]
+        self.assertEqual((root.start_time, root.end_time), (0, 2 * depth))
+
+        node, height = root.children[0], 0
+        while node.children:
+            self.assertEqual(len(node.children), 1)
+            self.assertEqual(node.self_host_duration, 4)
+            node, height = node.children[0], height + 1
+        self.assertEqual(height, depth // 2 - 1)
+        self.assertEqual((node.name, node.self_host_duration), ('op{}'.format(depth // 2 - 1), 4))
+
     # Test group by 'kernel detail + op name'.
     def test_group_by_kernel_columns(self):
         json_content = """[
@@ -2026,9 +2185,61 @@ class TestProfiler(unittest.TestCase):
         self.assertAlmostEqual(profile.tc_ratio[0], 15 / (15 + 10))
         self.assertAlmostEqual(profile.tc_eligible_ops_kernel_ratio, 15 / (15 + 10))
 
+    def test_lazy_views(self):
+        from torch_tb_profiler.profiler.run_generator import RunGenerator
+
+        json_content = """
+          [{
+            "ph": "X", "cat": "Operator",
+            "name": "aten::mat_mul", "pid": 13721, "tid": "456",
+            "ts": 100, "dur": 100,
+            "args": {"Input Dims": [], "External id": 2, "Call stack": "a.py(1): f"}
+          },
+          {
+            "ph": "X", "cat": "Kernel",
+            "name": "void cunn_ClassNLLCriterion_updateGradInput_kernel<float>", "pid": 0, "tid": "stream 7",
+            "ts": 120, "dur": 10,
+            "args": {"correlation": 334, "external id": 2, "device": 0}
+          },
+          {
+            "ph": "X", "cat": "Runtime",
+            "name": "cudaLaunchKernel", "pid": 13721, "tid": "456",
+            "ts": 110, "dur": 5,
+            "args": {"correlation": 334, "external id": 2}
+          }]
+        """
+        profile_data = parse_json_trace(json_content)
+        run_profile = RunGenerator(WORKER_NAME, 0, profile_data).generate_run_profile()
+
+        # nothing but the overview is generated at load time.
+        self.assertIsNotNone(run_profile.overview)
+        self.assertNotIn('operation_table_by_name', vars(run_profile))
+        self.assertNotIn('kernel_table', vars(run_profile))
+
+        table = run_profile.operation_table_by_name
+        self.assertEqual(table['data'][0]['name'], 'aten::mat_mul')
+        self.assertTrue(table['data'][0]['has_call_stack'])
+        self.assertIs(run_profile.operation_table_by_name, table)
+        self.assertEqual(run_profile.kernel_table['data']['rows'][0][0],
+                         'void cunn_ClassNLLCriterion_updateGradInput_kernel<float>')
+        self.assertEqual(run_profile.operation_stack_by_name['aten::mat_mul']['data'][0]['call_stack'], 'a.py(1): f')
+
+        # the views are the same when they are generated again.
+        generator = run_profile.view_generator
+        self.assertEqual(generator.generate_view('operation_stack_by_name'), run_profile.operation_stack_by_name)
+        self.assertIsNone(RunProfile(WORKER_NAME, 0).kernel_pie)
+
 
 class TestDistributed(unittest.TestCase):
 
+    def setUp(self):
+        # the RunLoader of the tests does not write into the profile cache.
+        self.environ = environ(TORCH_PROFILER_CACHE_DIR=None, TORCH_PROFILER_CACHE_SIZE_MB='0')
+        self.environ.__enter__()
+
+    def tearDown(self):
+        self.environ.__exit__(None, None, None)
+
     def test_distributed_nccl(self):
         json_content0 = """[
             {
@@ -2503,6 +2714,51 @@ class TestMemoryCurve(unittest.TestCase):
                 self.assertEqual(self.event_data_gpu[i//2][-2], curves['GPU0'][i][1])
                 self.assertEqual(self.event_data_gpu[i//2][-1], curves['GPU0'][i][2])
 
+    def test_memory_curve_range(self):
+        json_content = json.dumps([self.entry(*data) for data in self.all_events])
+
+        profile = parse_json_trace(json_content)
+        profile.process()
+        result = RunProfile.get_memory_curve(profile, time_metric='us', memory_metric='B', patch_for_step_plot=False,
+                                             start_ts=150, end_ts=600)
+        start_ts = profile.profiler_start_ts
+        curves = result['rows']
+        # the points in the range, together with the last one before it.
+        self.assertEqual([p[0] + start_ts for p in curves['CPU']], [100, 200, 300, 400, 500, 600])
+        self.assertEqual([p[0] + start_ts for p in curves['GPU0']], [106, 205, 401, 499, 501, 502])
+        self.assertEqual(result['metadata']['peaks']['CPU'], 'Peak Memory Usage: 8000.0B')
+
+        result = RunProfile.get_memory_curve(profile, time_metric='us', memory_metric='B', patch_for_step_plot=False,
+                                             start_ts=150, end_ts=600, points=3)
+        self.assertEqual([p[0] + start_ts for p in result['rows']['CPU']], [100, 200, 600])
+
+    def test_lttb_downsample(self):
+        def lttb(data, n_out):
+            bins = np.array_split(data[1:-1], n_out - 2)
+            out = [data[0]]
+            for i, bs in enumerate(bins):
+                a = out[-1]
+                c = bins[i + 1].mean(axis=0) if i + 1 < len(bins) else data[-1]
+                areas = 0.5 * np.abs((a[0] - c[0]) * (bs[:, 1] - a[1]) - (a[0] - bs[:, 0]) * (c[1] - a[1]))
+                out.append(bs[np.argmax(areas)])
+            out.append(data[-1])
+            return np.array(out)
+
+        rng = np.random.default_rng(0)
+        for length, n_out in ((10, 4), (100, 7), (1000, 999), (5003, 100)):
+            data = np.stack([np.cumsum(rng.random(length)), np.cumsum(rng.normal(size=length)),
+                             rng.random(length)], axis=1)
+            self.assertEqual(lttb_downsample(data, n_out).tolist(), lttb(data, n_out).tolist())
+        self.assertIs(lttb_downsample(data, length), data)
+
+        # the bins still changing after the passes are selected one by one.
+        max_passes = utils._LTTB_MAX_PASSES
+        utils._LTTB_MAX_PASSES = 1
+        try:
+            self.assertEqual(lttb_downsample(data, 500).tolist(), lttb(data, 500).tolist())
+        finally:
+            utils._LTTB_MAX_PASSES = max_passes
+
 
 class TestModuleView(unittest.TestCase):
 
@@ -2733,5 +2989,246 @@ class TestDataPipe(unittest.TestCase):
         self.assertTrue(datapipe_op is None)
 
 
+class TestEventTable(unittest.TestCase):
+
+    def test_event_table(self):
+        from torch_tb_profiler.profiler import trace
+        from torch_tb_profiler.profiler.event_table import EVENT_TYPES, EventTable
+        from torch_tb_profiler.profiler.trace import EventTypes
+
+        json_content = """[
+            {"ph": "X", "cat": "Kernel", "name": "void cunn_ClassNLLCriterion_updateGradInput_kernel<float>",
+             "pid": 0, "tid": "stream 7", "ts": 50, "dur": 5,
+             "args": {"correlation": 12, "external id": 2, "device": 0, "blocks per SM": 0.5,
+                      "est. achieved occupancy %": 13, "grid": [1, 1, 1], "block": [32, 1, 1]}},
+            {"ph": "X", "cat": "Operator", "name": "ProfilerStep#2", "pid": 13721, "tid": "123",
+             "ts": 10, "dur": 100, "args": {"Input dims": [], "External id": 1}},
+            {"ph": "X", "cat": "Runtime", "name": "cudaLaunchKernel", "pid": 13721, "tid": "123",
+             "ts": 30, "dur": 3, "args": {"correlation": 12, "external id": 2}},
+            {"ph": "X", "cat": "Operator", "name": "aten::nll_loss_backward", "pid": 13721, "tid": "123",
+             "ts": 20, "dur": 20, "args": {"Input Dims": [[32, 1000], [32]], "Input type": ["float", "long"],
+                                           "External id": 2}},
+            {"ph": "i", "s": "t", "name": "[memory]", "pid": 13721, "tid": 123, "ts": 25,
+             "args": {"Device Type": 1, "Device Id": 0, "Addr": 90378059776, "Bytes": 128,
+                      "Total Allocated": 256, "Total Reserved": 2048}},
+            {"ph": "X", "cat": "python_function", "name": "nn.Module: Linear", "pid": 13721, "tid": 123,
+             "ts": 10.5, "dur": 7, "args": {"Python id": 3, "Python parent id": 1, "Python module id": 100}},
+            {"ph": "X", "cat": "user_annotation", "name": "my_annotation", "pid": 13721, "tid": 123,
+             "ts": 15, "dur": 1},
+            {"ph": "X", "cat": "Unknown", "name": "unknown", "pid": 13721, "tid": 123, "ts": 15, "dur": 1},
+            {"ph": "M", "name": "process_name", "pid": 13721, "tid": 0, "args": {"name": "python"}}
+        ]"""
+        content = json.loads(json_content)
+        expected = [e for e in (trace.create_event(data, False) for data in content) if e is not None]
+        expected.sort(key=lambda e: e.ts)
+
+        table = EventTable()
+        for data in content:
+            table.append(data)
+        table.finish()
+
+        self.assertEqual(len(table), 6)
+        self.assertEqual(table.start_ts, 10)
+        self.assertEqual(table.ts.tolist(), [10, 10.5, 20, 25, 30, 50])
+        self.assertEqual(table.names_of(table.rows([EventTypes.KERNEL])).tolist(),
+                         ['void cunn_ClassNLLCriterion_updateGradInput_kernel<float>'])
+        self.assertEqual(table.ids_of(table.tid[table.rows([EventTypes.KERNEL])]).tolist(), ['stream 7'])
+        self.assertEqual(table.external_id.tolist(), [1, -1, 2, -1, 2, 2])
+        self.assertEqual(table.type_args(EventTypes.KERNEL, 'grid'), [[1, 1, 1]])
+        self.assertEqual(table.rows(exclude=[EventTypes.MEMORY]).tolist(), [0, 1, 2, 4, 5])
+        self.assertEqual(table.rows([EventTypes.MODULE, EventTypes.KERNEL]).tolist(), [1, 5])
+        for event_type in EVENT_TYPES:
+            self.assertEqual(table.rows([event_type]).tolist(),
+                             [row for row, code in enumerate(table.type.tolist()) if EVENT_TYPES[code] == event_type])
+
+        events = list(table)
+        self.assertEqual([type(e) for e in events], [type(e) for e in expected])
+        for event, expected_event in zip(events, expected):
+            attrs = dict(vars(event))
+            expected_attrs = dict(vars(expected_event))
+            # only the args used by the profiler are kept.
+            attrs.pop('args')
+            expected_attrs.pop('args')
+            self.assertEqual(attrs, expected_attrs)
+        memory_event = events[3]
+        self.assertEqual((memory_event.addr, memory_event.bytes, memory_event.total_allocated),
+                         (90378059776, 128, 256))
+        memory_record, = MemoryRecord.from_table(table)
+        self.assertEqual((memory_record.ts, memory_record.tid, memory_record.device_type, memory_record.addr,
+                          memory_record.bytes, memory_record.total_reserved),
+                         (25, 123, DeviceType.CUDA, 90378059776, 128, 2048))
+
+    def test_event_table_ids(self):
+        from torch_tb_profiler.profiler.event_table import EventTable
+
+        # the ids which are not integers do not stop the load.
+        table = EventTable()
+        for i, (external_id, correlation_id) in enumerate([(2.0, '12'), ('abc', 1.5), (2 ** 64, None), (7, 8)]):
+            table.append({'ph': 'X', 'cat': 'Runtime', 'name': 'cudaLaunchKernel', 'pid': 1, 'tid': 1,
+                          'ts': i, 'dur': 1, 'args': {'external id': external_id, 'correlation': correlation_id}})
+        table.finish()
+        self.assertEqual(table.external_id.tolist(), [2, -1, -1, 7])
+        self.assertEqual(table.correlation_id.tolist(), [12, -1, -1, 8])
+
+
+class KillingRunLoader(RunLoader):
+    """Kill the process loading the trace file of the worker 'killed', as if it ran out of memory."""
+
+    def _process_data(self, worker, span, path):
+        if worker == 'killed':
+            os.kill(os.getpid(), signal.SIGKILL)
+        return super()._process_data(worker, span, path)
+
+
+class TestRunLoader(unittest.TestCase):
+
+    def setUp(self):
+        import tempfile
+        self.cache_dir = tempfile.mkdtemp()
+
+    def write_run(self, num_workers):
+        import tempfile
+
+        json_content = """[
+            {"ph": "X", "cat": "Operator", "name": "ProfilerStep#1", "pid": 13721, "tid": "123",
+             "ts": 100, "dur": 200, "args": {"Input dims": [], "External id": 1}},
+            {"ph": "X", "cat": "Operator", "name": "aten::to", "pid": 13721, "tid": "123",
+             "ts": 120, "dur": 50, "args": {"Input dims": [[2, 8, 5], []], "External id": 2}}
+        ]"""
+        run_dir = tempfile.mkdtemp()
+        for i in range(num_workers):
+            path = os.path.join(run_dir, 'worker{}.pt.trace.json.gz'.format(i))
+            with gzip.open(path, 'wt') as f:
+                f.write(json.dumps({'schemaVersion': 1, 'traceEvents': json.loads(json_content)}))
+        return run_dir
+
+    def load(self, run_dir, env):
+        from torch_tb_profiler import io
+
+        with environ(**dict(env, TORCH_PROFILER_CACHE_DIR=self.cache_dir)), io.Cache(run_dir) as cache:
+            return RunLoader('test_run', run_dir, cache).load()
+
+    def test_load_by_process_pool(self):
+        run_dir = self.write_run(5)
+        run = self.load(run_dir, {'TORCH_PROFILER_NUM_PROCESSES': '2', 'TORCH_PROFILER_MEMORY_BUDGET_MB': '1'})
+
+        self.assertEqual(sorted(run.workers), ['worker{}'.format(i) for i in range(5)])
+        for i in range(5):
+            profile = run.get_profile('worker{}'.format(i), 'default')
+            self.assertEqual(profile.operation_table_by_name['data'][0]['name'], 'aten::to')
+
+    def test_load_with_process_killed(self):
+        from torch_tb_profiler import io
+
+        run_dir = self.write_run(3)
+        with gzip.open(os.path.join(run_dir, 'killed.pt.trace.json.gz'), 'wt') as f:
+            f.write(json.dumps({'schemaVersion': 1, 'traceEvents': []}))
+        for num_processes in ('1', '2'):
+            with self.subTest(num_processes=num_processes), \
+                    environ(TORCH_PROFILER_NUM_PROCESSES=num_processes, TORCH_PROFILER_CACHE_DIR=self.cache_dir), \
+                    io.Cache(run_dir) as cache:
+                children = set(multiprocessing.active_children())
+                run = KillingRunLoader('test_run', run_dir, cache).load()
+                # the loading processes have exited.
+                self.assertEqual(set(multiprocessing.active_children()), children)
+            # the killed process is replaced to load the other files.
+            self.assertEqual(sorted(run.workers), ['worker{}'.format(i) for i in range(3)])
+
+        # the processes are stopped if the load is abandoned.
+        with environ(TORCH_PROFILER_NUM_PROCESSES='2', TORCH_PROFILER_CACHE_DIR=self.cache_dir), \
+                io.Cache(run_dir) as cache:
+            children = set(multiprocessing.active_children())
+            results = RunLoader('test_run', run_dir, cache)._process_tasks(
+                [('worker{}'.format(i), None, 'worker{}.pt.trace.json.gz'.format(i)) for i in range(3)])
+            next(results)
+            results.close()
+            self.assertEqual(set(multiprocessing.active_children()), children)
+
+    def test_append_gpu_metrics_at_load(self):
+        import tempfile
+
+        trace_json = {'schemaVersion': 1, 'traceEvents': [
+            {'ph': 'X', 'cat': 'Operator', 'name': 'ProfilerStep#1', 'pid': 13721, 'tid': '123',
+             'ts': 100, 'dur': 200, 'args': {'Input dims': [], 'External id': 1}},
+            {'ph': 'X', 'cat': 'Operator', 'name': 'aten::mm', 'pid': 13721, 'tid': '123',
+             'ts': 120, 'dur': 50, 'args': {'Input dims': [[2, 8], [8, 5]], 'External id': 2}},
+            {'ph': 'X', 'cat': 'Runtime', 'name': 'cudaLaunchKernel', 'pid': 13721, 'tid': '123',
+             'ts': 130, 'dur': 5, 'args': {'correlation': 3, 'external id': 2}},
+            {'ph': 'X', 'cat': 'Kernel', 'name': 'void gemm_kernel', 'pid': 0, 'tid': 'stream 7',
+             'ts': 140, 'dur': 60, 'args': {'correlation': 3, 'external id': 2, 'device': 0,
+                                            'blocks per SM': 0.5, 'est. achieved occupancy %': 10}}
+        ], 'displayTimeUnit': 'ms'}
+        run_dir = tempfile.mkdtemp()
+        path = os.path.join(run_dir, 'worker0.pt.trace.json.gz')
+        with gzip.open(path, 'wt') as f:
+            f.write(json.dumps(trace_json))
+
+        # the GPU metrics are appended to the trace file in the loading process, also kept by the profile cache.
+        for _ in range(2):
+            run = self.load(run_dir, {'TORCH_PROFILER_TRACE_INDEX_MB': '0'})
+            profile = run.get_profile('worker0', 'default')
+            self.assertTrue(profile.trace_has_gpu_metrics)
+            self.assertEqual(profile.get_step_range('1'), (100, 300))
+            window = json.loads(gzip.decompress(b''.join(profile.trace_index.iter_window(150, 160))))
+            self.assertEqual([e['name'] for e in window['traceEvents'] if e['ph'] == 'X'],
+                             ['ProfilerStep#1', 'aten::mm', 'void gemm_kernel'])
+            self.assertNotEqual(profile.trace_file_path, path)
+            with gzip.open(profile.trace_file_path, 'rb') as f:
+                appended_json = json.loads(f.read())
+            expected_json = dict(trace_json)
+            expected_json['traceEvents'] = trace_json['traceEvents'] + [json.loads(c) for c in profile.gpu_metrics]
+            self.assertEqual(appended_json, expected_json)
+            self.assertTrue(any(e['ph'] == 'C' for e in appended_json['traceEvents']))
+
+    def test_load_from_profile_cache(self):
+        from torch_tb_profiler.profiler.profile_cache import ProfileCache
+
+        run_dir = self.write_run(2)
+        run = self.load(run_dir, {})
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        # mark the cached profile of worker0 to check that it is used instead of parsing the file again.
+        cache = ProfileCache(self.cache_dir, 1024 * 1024 * 1024)
+        path = os.path.join(run_dir, 'worker0.pt.trace.json.gz')
+        key = cache.key('worker0', None, path, path)
+        profile, dist_data = cache.get(key, path)
+        profile.operation_table_by_name['data'][0]['name'] = 'cached'
+        cache.put(key, profile, dist_data, path)
+
+        cached_run = self.load(run_dir, {})
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+        profile = cached_run.get_profile('worker0', 'default')
+        self.assertEqual(profile.operation_table_by_name['data'][0]['name'], 'cached')
+        self.assertEqual(profile.trace_file_path, run.get_profile('worker0', 'default').trace_file_path)
+        self.assertEqual(cached_run.get_profile('worker1', 'default').views,
+                         run.get_profile('worker1', 'default').views)
+
+        # a changed file gets a new entry.
+        with gzip.open(path, 'wt') as f:
+            f.write(json.dumps({'schemaVersion': 1, 'traceEvents': []}))
+        self.load(run_dir, {})
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+
+        # the cache is disabled unless its directory or size is set.
+        with environ(TORCH_PROFILER_CACHE_DIR=None, TORCH_PROFILER_CACHE_SIZE_MB=None):
+            self.assertIsNone(ProfileCache.from_env())
+        with environ(TORCH_PROFILER_CACHE_DIR=None, TORCH_PROFILER_CACHE_SIZE_MB='64', XDG_CACHE_HOME=self.cache_dir):
+            cache = ProfileCache.from_env()
+            self.assertEqual((cache.cache_dir, cache.max_size),
+                             (os.path.join(self.cache_dir, 'torch_tb_profiler'), 64 * 1024 * 1024))
+        os.rmdir(cache.cache_dir)
+
+        # the cache is disabled by the size 0.
+        os.remove(path)
+        self.load(run_dir, {'TORCH_PROFILER_CACHE_SIZE_MB': '0'})
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+
+        # the least recently used entries are removed beyond the size limit.
+        entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)]
+        entries.sort(key=lambda entry: os.stat(entry).st_mtime)
+        ProfileCache(self.cache_dir, os.stat(entries[-1]).st_size).evict()
+        self.assertEqual(os.listdir(self.cache_dir), [os.path.basename(entries[-1])])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,12 @@
 import unittest
 import math
+import random
+from typing import List, Tuple
 
-from torch_tb_profiler.profiler.overall_parser import (
-    merge_ranges, subtract_ranges_lists, intersection_ranges_lists, get_ranges_sum
+from torch_tb_profiler.profiler.overall_parser import OverallParser, ProfileRole
+from torch_tb_profiler.profiler.range_utils import (
+    IntervalSet, get_ranges_sum, intersection_ranges_lists, intersection_ranges_lists_with_value, merge_ranges,
+    merge_ranges_with_value, subtract_ranges_lists
 )
 
 
@@ -46,5 +50,296 @@ class TestOverallParser(unittest.TestCase):
         self.assertTrue(math.isclose(dst_sum, expected_sum))
 
 
+# The pure python implementation replaced by IntervalSet, which is the reference of TestIntervalSet.
+def reference_merge_ranges_with_value(src_ranges):
+    from collections import namedtuple
+    from enum import IntEnum
+
+    class EndpointTypes(IntEnum):
+        START = 0
+        END = 1
+
+    EndPoint = namedtuple('EndPoint', ['time', 'pt_type', 'value'])
+
+    merged_ranges = []
+    if len(src_ranges) > 0:
+        # Build tuple of (time, type, value)
+        endpoints: List[EndPoint] = []
+        for r in src_ranges:
+            endpoints.append(EndPoint(r[0], EndpointTypes.START, r[2]))
+            endpoints.append(EndPoint(r[1], EndpointTypes.END, r[2]))
+        endpoints.sort(key=lambda x: [x.time, int(x.pt_type)])  # Make START in front of END if equal on time.
+
+        last_endpoint_time = endpoints[0].time
+        last_value = endpoints[0].value
+        for i in range(1, len(endpoints)):
+            ep = endpoints[i]
+            if ep.time > last_endpoint_time and last_value > 0.0:
+                approximated_sm_efficiency = min(last_value, 1.0)
+                merged_ranges.append((last_endpoint_time, ep.time, approximated_sm_efficiency))
+            last_endpoint_time = ep.time
+            if ep.pt_type == EndpointTypes.START:
+                last_value += ep.value
+            else:
+                last_value -= ep.value
+
+    return merged_ranges
+
+
+# range_list1 item is length 3. range_list2 item is length 2.
+# Reture value's item is length 3.
+def reference_intersection_ranges_lists_with_value(range_list1, range_list2) -> List[Tuple[int, int, int]]:
+    range_list_dst = []
+    if len(range_list1) == 0 or len(range_list2) == 0:
+        return range_list_dst
+    r1 = range_list1[0]
+    r2 = range_list2[0]
+    i1 = i2 = 0
+    while i1 < len(range_list1):
+        if i2 == len(range_list2):
+            break
+        elif r2[1] <= r1[0]:
+            r2, i2 = reference_pop_list(range_list2, i2)
+        elif r2[0] <= r1[0] and r2[1] < r1[1]:
+            assert (r2[1] > r1[0])
+            range_list_dst.append((r1[0], r2[1], r1[2]))
+            r1 = (r2[1], r1[1], r1[2])
+            r2, i2 = reference_pop_list(range_list2, i2)
+        elif r2[0] <= r1[0]:
+            assert (r2[1] >= r1[1])
+            range_list_dst.append(r1)
+            r2 = (r1[1], r2[1])
+            r1, i1 = reference_pop_list(range_list1, i1)
+        elif r2[1] < r1[1]:
+            assert (r2[0] > r1[0])
+            range_list_dst.append((r2[0], r2[1], r1[2]))
+            r1 = (r2[1], r1[1], r1[2])
+            r2, i2 = reference_pop_list(range_list2, i2)
+        elif r2[0] < r1[1]:
+            assert (r2[1] >= r1[1])
+            range_list_dst.append((r2[0], r1[1], r1[2]))
+            r2 = (r1[1], r2[1])
+            r1, i1 = reference_pop_list(range_list1, i1)
+        else:
+            assert (r2[0] >= r1[1])
+            r1, i1 = reference_pop_list(range_list1, i1)
+    return range_list_dst
+
+
+def reference_subtract_ranges_lists(range_list1: List[Tuple[int, int]],
+                                    range_list2: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    range_list_dst = []
+    if len(range_list1) == 0:
+        return range_list_dst
+    if len(range_list2) == 0:
+        range_list_dst = list(range_list1)
+        return range_list_dst
+    r1 = range_list1[0]
+    r2 = range_list2[0]
+    i1 = i2 = 0
+    while i1 < len(range_list1):
+        if i2 == len(range_list2):
+            range_list_dst.append(r1)
+            r1, i1 = reference_pop_list(range_list1, i1)
+        elif r2[1] <= r1[0]:
+            r2, i2 = reference_pop_list(range_list2, i2)
+        elif r2[0] <= r1[0] and r2[1] < r1[1]:
+            r1 = (r2[1], r1[1])
+            r2, i2 = reference_pop_list(range_list2, i2)
+        elif r2[0] <= r1[0]:
+            assert (r2[1] >= r1[1])
+            r2 = (r1[1], r2[1])
+            r1, i1 = reference_pop_list(range_list1, i1)
+        elif r2[0] < r1[1]:
+            assert (r2[0] > r1[0])
+            range_list_dst.append((r1[0], r2[0]))
+            r1 = (r2[0], r1[1])
+        else:
+            assert (r2[0] >= r1[1])
+            range_list_dst.append(r1)
+            r1, i1 = reference_pop_list(range_list1, i1)
+    return range_list_dst
+
+
+def reference_intersection_ranges_lists(range_list1: List[Tuple[int, int]],
+                                        range_list2: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    range_list_dst = []
+    if len(range_list1) == 0 or len(range_list2) == 0:
+        return range_list_dst
+    r1 = range_list1[0]
+    r2 = range_list2[0]
+    i1 = i2 = 0
+    while i1 < len(range_list1):
+        if i2 == len(range_list2):
+            break
+        elif r2[1] <= r1[0]:
+            r2, i2 = reference_pop_list(range_list2, i2)
+        elif r2[0] <= r1[0] and r2[1] < r1[1]:
+            assert (r2[1] > r1[0])
+            range_list_dst.append((r1[0], r2[1]))
+            r1 = (r2[1], r1[1])
+            r2, i2 = reference_pop_list(range_list2, i2)
+        elif r2[0] <= r1[0]:
+            assert (r2[1] >= r1[1])
+            range_list_dst.append(r1)
+            r2 = (r1[1], r2[1])
+            r1, i1 = reference_pop_list(range_list1, i1)
+        elif r2[1] < r1[1]:
+            assert (r2[0] > r1[0])
+            range_list_dst.append(r2)
+            r1 = (r2[1], r1[1])
+            r2, i2 = reference_pop_list(range_list2, i2)
+        elif r2[0] < r1[1]:
+            assert (r2[1] >= r1[1])
+            range_list_dst.append((r2[0], r1[1]))
+            r2 = (r1[1], r2[1])
+            r1, i1 = reference_pop_list(range_list1, i1)
+        else:
+            assert (r2[0] >= r1[1])
+            r1, i1 = reference_pop_list(range_list1, i1)
+    return range_list_dst
+
+
+def reference_pop_list(range_list, index):
+    next_index = index + 1
+    if next_index >= len(range_list):
+        return None, len(range_list)
+    next_item = range_list[next_index]
+    return next_item, next_index
+
+
+def reference_merge_ranges(src_ranges, is_sorted=False) -> List[Tuple[int, int]]:
+    if not src_ranges:
+        # return empty list if src_ranges is None or its length is zero.
+        return []
+
+    if not is_sorted:
+        src_ranges.sort(key=lambda x: x[0])
+
+    merged_ranges = []
+    merged_ranges.append(src_ranges[0])
+    for src_id in range(1, len(src_ranges)):
+        src_range = src_ranges[src_id]
+        if src_range[1] > merged_ranges[-1][1]:
+            if src_range[0] <= merged_ranges[-1][1]:
+                merged_ranges[-1] = (merged_ranges[-1][0], src_range[1])
+            else:
+                merged_ranges.append((src_range[0], src_range[1]))
+
+    return merged_ranges
+
+
+def non_empty(ranges):
+    return [r for r in ranges if r[1] > r[0]]
+
+
+class TestIntervalSet(unittest.TestCase):
+    """Compare the functions on random ranges with the reference implementation."""
+
+    def setUp(self):
+        self.random = random.Random(0)
+
+    def random_ranges(self, max_count=20, span=100, with_value=False, allow_float=True):
+        ranges = []
+        for _ in range(self.random.randint(0, max_count)):
+            start = self.random.randint(0, span)
+            length = self.random.choice([0, 1, 2, self.random.randint(0, span // 4)])
+            if allow_float and self.random.random() < 0.1:
+                start += 0.5
+            r = (start, start + length)
+            if with_value:
+                r += (self.random.choice([0.0, 0.125, 0.5, 1.5, self.random.random()]),)
+            ranges.append(r)
+        return ranges
+
+    def random_merged_ranges(self):
+        return reference_merge_ranges(non_empty(self.random_ranges()))
+
+    def test_merge_ranges(self):
+        for _ in range(500):
+            ranges = self.random_ranges()
+            expected = reference_merge_ranges(non_empty(ranges))
+            self.assertEqual(merge_ranges(list(ranges)), expected)
+            self.assertEqual(merge_ranges(sorted(ranges), True), expected)
+
+            intervals = IntervalSet.from_ranges(ranges)
+            self.assertEqual(intervals.to_list(), expected)
+            self.assertEqual(intervals.sum(), get_ranges_sum(expected))
+
+    def test_intersection_ranges_lists(self):
+        for _ in range(500):
+            ranges1 = self.random_merged_ranges()
+            ranges2 = self.random_merged_ranges()
+            self.assertEqual(intersection_ranges_lists(ranges1, ranges2),
+                             non_empty(reference_intersection_ranges_lists(ranges1, ranges2)))
+
+    def test_subtract_ranges_lists(self):
+        for _ in range(500):
+            ranges1 = self.random_merged_ranges()
+            ranges2 = self.random_merged_ranges()
+            self.assertEqual(subtract_ranges_lists(ranges1, ranges2),
+                             non_empty(reference_subtract_ranges_lists(ranges1, ranges2)))
+
+    def test_union(self):
+        for _ in range(200):
+            ranges1 = self.random_ranges()
+            ranges2 = self.random_ranges()
+            union = IntervalSet.from_ranges(ranges1).union(IntervalSet.from_ranges(ranges2))
+            self.assertEqual(union.to_list(), reference_merge_ranges(non_empty(ranges1 + ranges2)))
+
+    def test_merge_ranges_with_value(self):
+        for _ in range(500):
+            ranges = self.random_ranges(with_value=True)
+            self.assertEqual(merge_ranges_with_value(ranges), reference_merge_ranges_with_value(ranges))
+
+    def test_intersection_ranges_lists_with_value(self):
+        for _ in range(500):
+            ranges1 = reference_merge_ranges_with_value(self.random_ranges(with_value=True))
+            ranges2 = self.random_merged_ranges()
+            self.assertEqual(intersection_ranges_lists_with_value(ranges1, ranges2),
+                             non_empty(reference_intersection_ranges_lists_with_value(ranges1, ranges2)))
+
+    def test_overlap(self):
+        for _ in range(300):
+            ranges = self.random_merged_ranges()
+            intervals = IntervalSet.from_ranges(ranges)
+            windows = self.random_ranges(allow_float=False)
+            overlap = intervals.overlap([w[0] for w in windows], [w[1] for w in windows]).tolist()
+            for window, length in zip(windows, overlap):
+                expected = get_ranges_sum(reference_intersection_ranges_lists([window], ranges))
+                self.assertAlmostEqual(length, expected)
+
+    def test_overall_parser_steps(self):
+        for _ in range(100):
+            steps = sorted(non_empty(self.random_ranges(max_count=10, allow_float=False)))
+            if not steps:
+                continue
+            role_ranges = [self.random_merged_ranges() for _ in range(ProfileRole.Total - 1)]
+            parser = OverallParser()
+            parser.aggregate(steps, role_ranges)
+
+            # the breakdown of the steps by the per-step intersections.
+            slots = reference_merge_ranges(list(steps))
+            cost_ranges = []
+            for i, role in enumerate(role_ranges):
+                cost = reference_intersection_ranges_lists(slots, role) if i > 0 else role
+                cost_ranges.append(cost)
+                slots = reference_subtract_ranges_lists(slots, cost)
+            cost_ranges.append(slots)
+            computation = role_ranges[ProfileRole.Kernel] or role_ranges[ProfileRole.CpuOp]
+            comm_comp_overlap = reference_intersection_ranges_lists(computation,
+                                                                    role_ranges[ProfileRole.Communication])
+
+            def step_sum(step, ranges):
+                return get_ranges_sum(reference_intersection_ranges_lists([step], ranges))
+
+            for step, costs, comm_costs in zip(steps, parser.steps_costs, parser.communication_overlap):
+                expected = [step_sum(step, ranges) for ranges in cost_ranges] + [step[1] - step[0]]
+                self.assertEqual(costs.costs, expected)
+                self.assertEqual(comm_costs.overlap, step_sum(step, comm_comp_overlap))
+                self.assertEqual(comm_costs.computation, step_sum(step, computation))
+                self.assertEqual(comm_costs.communication, step_sum(step, role_ranges[ProfileRole.Communication]))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,84 @@
+import gc
+import gzip
+import json
+import unittest
+from types import SimpleNamespace
+
+import werkzeug
+from werkzeug.test import EnvironBuilder
+
+from torch_tb_profiler.plugin import TorchProfilerPlugin
+from torch_tb_profiler.response_cache import ResponseCache
+
+
+class Profile:
+    pass
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_get_put(self):
+        cache = ResponseCache(1024 * 1024)
+        profile = Profile()
+        self.assertIsNone(cache.get('/overview', profile))
+        data, etag = cache.put('/overview', profile, b'{"steps": []}')
+        self.assertEqual(gzip.decompress(data), b'{"steps": []}')
+        self.assertEqual(cache.get('/overview', profile), (data, etag))
+
+        # the same content has the same etag, even by another profile.
+        other = Profile()
+        self.assertIsNone(cache.get('/overview', other))
+        self.assertEqual(cache.put('/overview', other, b'{"steps": []}')[1], etag)
+        self.assertNotEqual(cache.put('/kernel', other, b'{"steps": [1]}')[1], etag)
+
+        # the entries of the released profiles are not hit.
+        del profile, other
+        gc.collect()
+        self.assertIsNone(cache.get('/overview', Profile()))
+
+    def test_evict(self):
+        profile = Profile()
+        contents = [bytes(range(256)) * (i + 1) for i in range(4)]
+        size = sum(len(gzip.compress(c, 1)) for c in contents[1:])
+        cache = ResponseCache(size)
+        for i, content in enumerate(contents):
+            cache.put(i, profile, content)
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get(0, profile))
+
+        # the recently used entries are kept.
+        cache.get(1, profile)
+        cache.put(4, profile, contents[0])
+        self.assertIsNotNone(cache.get(1, profile))
+        self.assertIsNone(cache.get(2, profile))
+
+        # nothing is cached with the size 0.
+        cache = ResponseCache(0)
+        cache.put(0, profile, contents[0])
+        self.assertEqual(len(cache), 0)
+
+    def test_respond_as_cached_json(self):
+        plugin = SimpleNamespace(_response_cache=ResponseCache(1024 * 1024))
+        profile = Profile()
+
+        def respond(**headers):
+            request = werkzeug.Request(EnvironBuilder('/overview', headers=headers).get_environ())
+            return TorchProfilerPlugin.respond_as_cached_json(plugin, request, profile, lambda: {'steps': []})
+
+        # gzipped only for the clients which accept it.
+        response = respond()
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+        self.assertEqual(json.loads(response.get_data()), {'steps': []})
+        response = respond(**{'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.get_data())), {'steps': []})
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+
+        etag = response.get_etag()[0]
+        self.assertEqual(respond(**{'Accept-Encoding': 'gzip', 'If-None-Match': '"{}"'.format(etag)}).status_code,
+                         304)
+        self.assertEqual(respond(**{'If-None-Match': '"{}"'.format(etag)}).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
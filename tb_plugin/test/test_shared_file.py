@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from torch_tb_profiler.profiler import shared_file
+
+
+class TestSharedFile(unittest.TestCase):
+
+    def dump(self, obj):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            shared_file.dump(obj, f)
+        return path
+
+    def test_round_trip(self):
+        obj = {
+            'ts': np.arange(1000, dtype=np.int64),
+            'values': np.linspace(0, 1, 333),
+            'strided': np.arange(100)[::3],
+            'empty': np.array([], dtype=np.uint8),
+            'names': ['aten::mm', 'aten::add'],
+            'nested': [(1, 2.5, None)]
+        }
+        path = self.dump(obj)
+        loaded = shared_file.load(path, remove=True)
+        self.assertFalse(os.path.exists(path))
+
+        self.assertEqual(loaded.keys(), obj.keys())
+        for key in ('ts', 'values', 'strided', 'empty'):
+            np.testing.assert_array_equal(loaded[key], obj[key])
+            self.assertEqual(loaded[key].dtype, obj[key].dtype)
+        self.assertEqual(loaded['names'], obj['names'])
+        self.assertEqual(loaded['nested'], obj['nested'])
+
+        # the contiguous arrays are views of the mapped file, and still writable.
+        self.assertFalse(loaded['ts'].flags.owndata)
+        self.assertEqual(loaded['ts'].ctypes.data % 64, 0)
+        loaded['ts'][0] = -1
+        self.assertEqual(loaded['ts'][0], -1)
+
+    def test_load_keeps_file(self):
+        path = self.dump([1, 2, 3])
+        self.assertEqual(shared_file.load(path), [1, 2, 3])
+        self.assertEqual(shared_file.load(path), [1, 2, 3])
+        os.remove(path)
+
+    def test_invalid_file(self):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'not a shared file, but long enough for the header')
+        with self.assertRaises(ValueError):
+            shared_file.load(path, remove=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
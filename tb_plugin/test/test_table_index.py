@@ -0,0 +1,69 @@
+import unittest
+
+from torch_tb_profiler.profiler.table_index import TableIndex
+
+
+class TestTableIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [
+            {'name': 'aten::conv2d', 'calls': 3, 'host_self_duration': 30},
+            {'name': 'aten::add', 'calls': 5, 'host_self_duration': 20},
+            {'name': 'aten::addmm', 'calls': 3, 'host_self_duration': 20},
+            {'name': 'aten::relu', 'calls': 1, 'host_self_duration': 5},
+        ]
+        self.table = {
+            'columns': [{'type': 'string', 'name': 'Name'}, {'type': 'number', 'name': 'Calls'}],
+            'rows': [['volta_gemm', 2], ['add_kernel', 7], ['gemm_nt', 2]]
+        }
+
+    def names(self, rows):
+        return [row['name'] if isinstance(row, dict) else row[0] for row in rows]
+
+    def test_query_records(self):
+        index = TableIndex.from_records(self.records, 'name')
+        rows, total = index.query()
+        self.assertEqual((rows, total), (self.records, 4))
+
+        rows, total = index.query('calls', descending=True)
+        self.assertEqual(self.names(rows), ['aten::add', 'aten::conv2d', 'aten::addmm', 'aten::relu'])
+        rows, total = index.query('calls', descending=False)
+        self.assertEqual(self.names(rows), ['aten::relu', 'aten::conv2d', 'aten::addmm', 'aten::add'])
+        rows, total = index.query('name', descending=False, offset=1, limit=2)
+        self.assertEqual((self.names(rows), total), (['aten::addmm', 'aten::conv2d'], 4))
+
+        rows, total = index.query(search='add')
+        self.assertEqual((self.names(rows), total), (['aten::add', 'aten::addmm'], 2))
+        rows, total = index.query('host_self_duration', descending=False, search='add', limit=1)
+        self.assertEqual((self.names(rows), total), (['aten::add'], 2))
+        rows, total = index.query(search='Add', offset=10)
+        self.assertEqual((rows, total), ([], 0))
+
+        self.assertRaises(ValueError, index.query, 'unknown')
+
+    def test_query_table(self):
+        index = TableIndex.from_table(self.table)
+        rows, total = index.query('Calls', descending=True, search='gemm')
+        self.assertEqual((self.names(rows), total), (['volta_gemm', 'gemm_nt'], 2))
+        rows, total = index.query('Calls', descending=False, limit=2)
+        self.assertEqual((self.names(rows), total), (['volta_gemm', 'gemm_nt'], 3))
+
+        self.assertEqual(TableIndex.from_records([], 'name').query('name'), ([], 0))
+
+    def test_sort_numbers(self):
+        records = [{'name': str(i), 'duration': v} for i, v in enumerate([9.5, None, 10.25, 100, 9.5])]
+        index = TableIndex.from_records(records, 'name')
+        self.assertEqual(self.names(index.query('duration', descending=False)[0]), ['1', '0', '4', '2', '3'])
+        self.assertEqual(self.names(index.query('duration', descending=True)[0]), ['3', '2', '0', '4', '1'])
+
+        # the number columns of the kernel tables could have the numbers in strings.
+        table = {
+            'columns': [{'type': 'string', 'name': 'Name'}, {'type': 'number', 'name': 'Register Per Thread'}],
+            'rows': [['a', '32'], ['b', '128'], ['c', '0'], ['d', '']]
+        }
+        index = TableIndex.from_table(table)
+        self.assertEqual(self.names(index.query('Register Per Thread', descending=True)[0]), ['b', 'a', 'c', 'd'])
+
+
+if __name__ == '__main__':
+    unittest.main()
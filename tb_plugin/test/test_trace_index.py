@@ -0,0 +1,66 @@
+import gzip
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from torch_tb_profiler.profiler import trace_index
+from torch_tb_profiler.profiler.trace_index import TraceIndex
+
+
+class TestTraceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        rng = random.Random(0)
+        self.events = [
+            {'ph': 'M', 'name': 'process_name', 'pid': 1, 'tid': 0, 'args': {'name': 'python'}},
+            {'ph': 'M', 'name': 'thread_name', 'pid': 1, 'tid': 2, 'args': {'name': 'thread 2'}}
+        ]
+        for i in range(500):
+            ts = rng.randrange(0, 10000)
+            if i % 10 == 0:
+                self.events.append({'ph': 'i', 's': 't', 'name': 'instant', 'pid': 1, 'tid': 2, 'ts': ts})
+            else:
+                self.events.append({'ph': 'X', 'cat': 'Operator', 'name': 'op{}'.format(i), 'pid': 1, 'tid': 2,
+                                    'ts': ts, 'dur': rng.randrange(0, 500), 'args': {'Input Dims': [[i]]}})
+        self.trace_json = {'schemaVersion': 1, 'traceEvents': self.events, 'displayTimeUnit': 'ms'}
+        self.path = os.path.join(self.temp_dir, 'worker0.pt.trace.json.gz')
+        with gzip.open(self.path, 'wt') as f:
+            f.write(json.dumps(self.trace_json))
+
+    def build(self, block_size):
+        old_block_size = trace_index._BLOCK_SIZE
+        trace_index._BLOCK_SIZE = block_size
+        try:
+            return TraceIndex.build(self.path, os.path.join(self.temp_dir, 'index'))
+        finally:
+            trace_index._BLOCK_SIZE = old_block_size
+
+    def window(self, index, start_ts, end_ts):
+        return json.loads(gzip.decompress(b''.join(index.iter_window(start_ts, end_ts))))
+
+    def test_iter_window(self):
+        for block_size in (1, 1000, 1024 * 1024):
+            index = self.build(block_size)
+            self.assertEqual(len(index), len(self.events))
+            self.assertEqual(self.window(index, None, None), self.trace_json)
+
+            for start_ts, end_ts in ((2000, 3000), (0, 1), (5000, None), (None, 100), (20000, 30000)):
+                expected = [e for e in self.events if e['ph'] == 'M' or (
+                    (end_ts is None or e['ts'] < end_ts)
+                    and (start_ts is None or e['ts'] + e.get('dur', 0) >= start_ts))]
+                trace_json = self.window(index, start_ts, end_ts)
+                self.assertEqual(trace_json['traceEvents'], expected)
+                self.assertEqual(trace_json['displayTimeUnit'], 'ms')
+
+    def test_empty_trace(self):
+        with gzip.open(self.path, 'wt') as f:
+            f.write(json.dumps({'traceEvents': []}))
+        index = self.build(1000)
+        self.assertEqual(self.window(index, 0, 100), {'traceEvents': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
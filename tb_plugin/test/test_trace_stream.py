@@ -0,0 +1,213 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from json.decoder import JSONDecodeError
+from unittest.mock import patch
+
+from torch_tb_profiler import json_codec
+from torch_tb_profiler.profiler.data import RunProfileData
+from torch_tb_profiler.profiler.trace_stream import (_JsonStream,
+                                                     append_trace_events,
+                                                     iter_trace_events,
+                                                     write_trace_body)
+
+
+def get_samples_dir():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), '../samples')
+
+
+class TestTraceStream(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def write_trace(self, content: str, name='worker0.pt.trace.json.gz'):
+        path = os.path.join(self.temp_dir, name)
+        with gzip.open(path, 'wt') as f:
+            f.write(content)
+        return path
+
+    def test_iter_trace_events(self):
+        trace_json = {
+            'schemaVersion': 1,
+            'deviceProperties': [{'id': 0, 'name': 'GPU é', 'totalGlobalMem': 34084028416}],
+            'traceEvents': [{'ph': 'X', 'cat': 'Operator', 'name': 'aten::to{}'.format(i), 'ts': 1623142623460016 + i,
+                             'dur': 12345678, 'args': {'External id': i}} for i in range(100)],
+            'Framework': 'pytorch-lightning',
+            'displayTimeUnit': 'ms'
+        }
+        path = self.write_trace(json.dumps(trace_json, indent=2))
+
+        # a tiny chunk size to split the values at all kinds of positions.
+        for chunk_size in (1, 7, 64, 4096):
+            metadata = {}
+            events = iter_trace_events(path, metadata, chunk_size)
+            self.assertEqual(metadata, {'schemaVersion': 1, 'deviceProperties': trace_json['deviceProperties']})
+            self.assertEqual(list(events), trace_json['traceEvents'])
+            self.assertEqual(metadata['Framework'], 'pytorch-lightning')
+            self.assertEqual(metadata['displayTimeUnit'], 'ms')
+
+    def test_iter_trace_events_invalid_json(self):
+        path = self.write_trace('{"traceEvents": [{"ph": "X", "args": {"Input Dims": N/A}}, {"ph": "X"}]}')
+        with self.assertRaises(JSONDecodeError):
+            list(iter_trace_events(path, {}, 8))
+
+    def test_iter_trace_events_chunk_boundary(self):
+        events = [{'ph': 'X', 'name': 'aten::addmm é', 'ts': i, 'dur': 1.5e-7,
+                   'args': {'Input Dims': [[i, 2], [], [3, 4]], 'Call stack': 'a.py(1): f\\nb.py(2): g},{',
+                            'e': {'f': {}, 'g': True, 'h': None, 'i': float('-inf')}}}
+                  for i in range(5)]
+        content = json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
+        path = self.write_trace(content)
+        invalid_path = self.write_trace(content.replace('"dur": 1.5e-07', '"dur": 1.5e-07.', 1), 'invalid.json.gz')
+        # every position of the values is at a chunk boundary with some chunk size.
+        for chunk_size in range(1, 80):
+            self.assertEqual(list(iter_trace_events(path, {}, chunk_size)), events)
+            with self.assertRaises(JSONDecodeError):
+                list(iter_trace_events(invalid_path, {}, chunk_size))
+
+    def test_iter_trace_events_fail_fast(self):
+        # the invalid value is reported without reading the rest of the file.
+        content = '{"traceEvents": [{"ph": "X", "args": {"Input Dims": N/A}}' + ', {"ph": "X"}' * 100000 + ']}'
+        path = os.path.join(self.temp_dir, 'invalid.json')
+        with open(path, 'w') as f:
+            f.write(content)
+        with open(path, 'rb') as f:
+            stream = _JsonStream(f, 64)
+            stream.expect('{')
+            stream.value()
+            stream.expect(':')
+            stream.expect('[')
+            with self.assertRaises(JSONDecodeError):
+                stream.value()
+            self.assertLess(f.tell(), 1024)
+
+        # a long value is read in growing chunks.
+        content = json.dumps({'traceEvents': [{'args': {'Call stack': 'a' * 1000000}}]})
+        with open(path, 'w') as f:
+            f.write(content)
+        with patch.object(_JsonStream, '_read_more', autospec=True, side_effect=_JsonStream._read_more) as read_more:
+            self.assertEqual(list(iter_trace_events(path, {}, 64)), json.loads(content)['traceEvents'])
+        self.assertLess(read_more.call_count, 50)
+
+    def test_iter_trace_events_backends(self):
+        events = [{'ph': 'X', 'name': 'aten::to', 'ts': i, 'dur': 1, 'args': {'Call stack': 'a.py},\x01'}}
+                  for i in range(100)]
+        path = self.write_trace(json.dumps({'traceEvents': events}))
+        for name, backend in json_codec.available_backends().items():
+            with self.subTest(backend=name):
+                with patch.object(json_codec, '_backend', backend), \
+                        patch.object(json_codec, 'loads', wraps=json_codec.loads) as loads:
+                    self.assertEqual(list(iter_trace_events(path, {}, 1024 * 1024)), events)
+                # all events but the last one which is followed by ']' are decoded in one batch.
+                self.assertEqual(loads.call_count, 1)
+                self.assertEqual(len(json.loads(loads.call_args.args[0])), len(events) - 1)
+
+    def test_parse_pytorch_lightning(self):
+        events = [
+            {'ph': 'X', 'cat': 'Operator', 'name': 'ProfilerStep#1', 'pid': 1, 'tid': 1, 'ts': 100, 'dur': 200,
+             'args': {'External id': 1}},
+            {'ph': 'X', 'cat': 'Operator', 'name': '[pl][profile]run_training_batch', 'pid': 1, 'tid': 1, 'ts': 110,
+             'dur': 150, 'args': {'External id': 2}},
+            {'ph': 'X', 'cat': 'Operator', 'name': '[pl][module]torch.nn.Linear: fc', 'pid': 1, 'tid': 1, 'ts': 120,
+             'dur': 100, 'args': {'External id': 3}},
+            {'ph': 'X', 'cat': 'Operator', 'name': 'aten::addmm', 'pid': 1, 'tid': 1, 'ts': 130, 'dur': 50,
+             'args': {'External id': 4, 'Input Dims': [[2, 2]]}},
+            {'ph': 'X', 'cat': 'python_function', 'name': 'nn.Module: Linear', 'pid': 1, 'tid': 1, 'ts': 125,
+             'dur': 80, 'args': {'Python id': 1, 'Python parent id': 0, 'Python module id': 0}}
+        ]
+        # 'Framework' follows 'traceEvents', so it is unknown while the events are streamed.
+        path = self.write_trace(json.dumps({'schemaVersion': 1, 'traceEvents': events,
+                                            'Framework': 'pytorch-lightning'}))
+        stream_profile = RunProfileData.parse('worker0', 0, path, self.temp_dir)
+        os.environ['TORCH_PROFILER_STREAMING_PARSE'] = '0'
+        try:
+            profile = RunProfileData.parse('worker0', 0, path, self.temp_dir)
+        finally:
+            del os.environ['TORCH_PROFILER_STREAMING_PARSE']
+
+        self.assertTrue(stream_profile.is_pytorch_lightning)
+        self.assertEqual([(e.type, e.name) for e in stream_profile.events],
+                         [(e.type, e.name) for e in profile.events])
+        self.assertEqual([e.type for e in stream_profile.events],
+                         ['ProfilerStep', 'pl_profile', 'pl_module', 'Operator'])
+        self.assertEqual(stream_profile.events.event(3).input_shape, [[2, 2]])
+        self.assertEqual(len(stream_profile.pl_tid2tree), len(profile.pl_tid2tree))
+
+    def test_parse_invalid_json(self):
+        content = """{"traceEvents": [
+            {"ph": "X", "cat": "Operator", "name": "ProfilerStep#1", "pid": 1, "tid": 1, "ts": 100, "dur": 200,
+             "args": {"Input Dims": N/A, "External id": 1}},
+            {"ph": "X", "cat": "Operator", "name": "aten::to", "pid": 1, "tid": 1, "ts": 150, "dur": 50,
+             "args": {"Input Dims": [], "External id": 2}}
+        ]}"""
+        path = self.write_trace(content)
+        profile = RunProfileData.parse('worker0', 0, path, self.temp_dir)
+        self.assertEqual(len(profile.events), 2)
+        # re-encoded by the fallback of loading the whole file.
+        self.assertNotEqual(profile.trace_file_path, path)
+
+    def test_parse_record_window_end(self):
+        events = [
+            {'ph': 'X', 'cat': 'Operator', 'name': 'ProfilerStep#1', 'pid': 1, 'tid': 1, 'ts': 100, 'dur': 200,
+             'args': {'External id': 1}},
+            {'name': 'Iteration Start: PyTorch Profiler', 'ph': 'i', 's': 'g', 'pid': 'Traces', 'tid': '', 'ts': 100},
+            {'name': 'Record Window End', 'ph': 'i', 's': 'g', 'pid': '', 'tid': '', 'ts': 100 + 25 * 3600 * 1000}
+        ]
+        path = self.write_trace(json.dumps({'schemaVersion': 1, 'traceEvents': events}))
+        profile = RunProfileData.parse('worker0', 0, path, self.temp_dir)
+        self.assertNotEqual(profile.trace_file_path, path)
+        with gzip.open(profile.trace_file_path, 'rt') as f:
+            trace_json = json.load(f)
+        self.assertEqual(trace_json['schemaVersion'], 1)
+        self.assertEqual(trace_json['traceEvents'], events[:2])
+
+    def test_append_trace_events(self):
+        trace_json = {
+            'schemaVersion': 1,
+            'traceEvents': [{'ph': 'X', 'name': 'aten::to', 'ts': i, 'dur': 1, 'args': {'Input Dims': [[i]]}}
+                            for i in range(100)],
+            'displayTimeUnit': 'ms'
+        }
+        counters = [json.dumps({'ph': 'C', 'name': 'GPU 0 Utilization', 'pid': 0, 'ts': i,
+                                'args': {'GPU Utilization': 0.5}}) for i in range(3)]
+        for content in (json.dumps(trace_json, indent=2), json.dumps(dict(trace_json, traceEvents=[]))):
+            path = self.write_trace(content)
+            for chunk_size in (1, 64, 4096):
+                output = os.path.join(self.temp_dir, 'output.json.gz')
+                with open(output, 'wb') as f:
+                    tail, has_events = write_trace_body(path, f, chunk_size)
+                    body_size = f.tell()
+                    append_trace_events(f, counters, tail, has_events)
+
+                with open(output, 'rb') as f:
+                    data = f.read()
+                # the counters are a separate gzip member following the body.
+                self.assertTrue(gzip.decompress(data[body_size:]).endswith(b']' + content.rsplit(']', 1)[1].encode()))
+                appended_json = json.loads(gzip.decompress(data))
+                expected_json = json.loads(content)
+                expected_json['traceEvents'].extend(json.loads(c) for c in counters)
+                self.assertEqual(appended_json, expected_json)
+
+    def test_stream_same_as_load(self):
+        path = os.path.join(get_samples_dir(), 'resnet50_num_workers_0', 'worker0.1623143089861.pt.trace.json.gz')
+        stream_profile = RunProfileData.parse('worker0', 0, path, self.temp_dir)
+        os.environ['TORCH_PROFILER_STREAMING_PARSE'] = '0'
+        try:
+            profile = RunProfileData.parse('worker0', 0, path, self.temp_dir)
+        finally:
+            del os.environ['TORCH_PROFILER_STREAMING_PARSE']
+
+        self.assertEqual(stream_profile.trace_file_path, path)
+        self.assertEqual(len(stream_profile.events), len(profile.events))
+        self.assertEqual(stream_profile.device_props, profile.device_props)
+        self.assertEqual(stream_profile.profiler_start_ts, profile.profiler_start_ts)
+        self.assertEqual(stream_profile.forward_backward_events, profile.forward_backward_events)
+        self.assertEqual([c.costs for c in stream_profile.steps_costs], [c.costs for c in profile.steps_costs])
+        self.assertEqual(stream_profile.recommendations, profile.recommendations)
+
+
+if __name__ == '__main__':
+    unittest.main()
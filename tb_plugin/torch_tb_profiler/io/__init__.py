@@ -1,4 +1,5 @@
 from .cache import Cache
-from .file import (BaseFileSystem, StatData, abspath, basename, download_file,
-                   exists, get_filesystem, glob, isdir, join, listdir,
-                   makedirs, read, register_filesystem, relpath, walk)
+from .file import (BaseFileSystem, File, StatData, abspath, basename,
+                   download_file, exists, get_filesystem, glob, is_local, isdir,
+                   join, listdir, makedirs, read, register_filesystem, relpath,
+                   stat, walk)
@@ -0,0 +1,140 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+"""The json encoding/decoding used by the plugin.
+
+orjson or simdjson is used when installed, otherwise the stdlib json module.
+The backend can be forced with the environment variable TORCH_PROFILER_JSON_BACKEND.
+"""
+import gc
+import json
+import os
+from typing import Any, Dict, Union
+
+import numpy as np
+
+from . import utils
+
+logger = utils.get_logger()
+
+__all__ = ['loads', 'dumps', 'backend_name', 'available_backends', 'get_backend']
+
+
+def _default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(obj).__name__))
+
+
+class JsonBackend:
+    """The stdlib json module, which is always available."""
+    name = 'json'
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        # The decoded trace has millions of containers but no reference cycle, pause the garbage
+        # collector which would otherwise be triggered again and again while they are allocated.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._loads(data)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _loads(self, data: Union[bytes, str]) -> Any:
+        # strict=False to accept the control characters exported by some Kineto versions.
+        return json.loads(data, strict=False)
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, default=_default).encode('utf-8')
+
+
+class OrjsonBackend(JsonBackend):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._dumps_option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def _loads(self, data: Union[bytes, str]) -> Any:
+        try:
+            return self._orjson.loads(data)
+        except self._orjson.JSONDecodeError:
+            # orjson rejects the raw control characters in strings and NaN that the stdlib accepts.
+            # Let the stdlib decoder try again and report the error if any.
+            return super()._loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._orjson.dumps(obj, default=_default, option=self._dumps_option)
+
+
+class SimdjsonBackend(JsonBackend):
+    """pysimdjson only decodes, the encoding is done by the stdlib."""
+    name = 'simdjson'
+
+    def __init__(self):
+        import simdjson
+        self._simdjson = simdjson
+
+    def _loads(self, data: Union[bytes, str]) -> Any:
+        try:
+            return self._simdjson.loads(data)
+        except ValueError:
+            return super()._loads(data)
+
+
+_BACKEND_CLASSES = [OrjsonBackend, SimdjsonBackend, JsonBackend]
+
+
+def get_backend(name: str) -> JsonBackend:
+    """Return the backend with the given name. Raise ImportError if it is not installed."""
+    for cls in _BACKEND_CLASSES:
+        if cls.name == name:
+            return cls()
+    raise ValueError('Unknown json backend {}'.format(name))
+
+
+def available_backends() -> Dict[str, JsonBackend]:
+    backends = {}
+    for cls in _BACKEND_CLASSES:
+        try:
+            backends[cls.name] = cls()
+        except ImportError:
+            pass
+    return backends
+
+
+def _select_backend() -> JsonBackend:
+    name = os.environ.get('TORCH_PROFILER_JSON_BACKEND', '').lower()
+    if name:
+        try:
+            return get_backend(name)
+        except (ImportError, ValueError) as e:
+            logger.warning('Cannot use the json backend %s: %s, fall back to the default one' % (name, e))
+
+    for cls in _BACKEND_CLASSES:
+        try:
+            return cls()
+        except ImportError:
+            pass
+
+
+_backend = _select_backend()
+logger.debug('Use the json backend %s' % _backend.name)
+
+
+def backend_name() -> str:
+    return _backend.name
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode the json document. Raise JSONDecodeError if it is invalid."""
+    return _backend.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode the object as utf-8 json. numpy scalars and arrays are converted to python objects."""
+    return _backend.dumps(obj)
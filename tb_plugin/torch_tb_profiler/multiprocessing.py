@@ -3,11 +3,32 @@
 # -------------------------------------------------------------------------
 import multiprocessing as mp
 import os
+from typing import Optional
 
 
 def get_start_method():
     return os.getenv('TORCH_PROFILER_START_METHOD', 'spawn')
 
 
+def get_num_processes() -> int:
+    """The max number of processes to load the trace files in parallel, the number of CPUs by default."""
+    try:
+        num_processes = int(os.getenv('TORCH_PROFILER_NUM_PROCESSES', ''))
+    except ValueError:
+        num_processes = 0
+    if num_processes <= 0:
+        num_processes = os.cpu_count() or 1
+    return num_processes
+
+
+def get_memory_budget() -> Optional[int]:
+    """The memory in bytes which the trace files being loaded may take together, unlimited by default."""
+    try:
+        budget_mb = int(os.getenv('TORCH_PROFILER_MEMORY_BUDGET_MB', ''))
+    except ValueError:
+        return None
+    return budget_mb * 1024 * 1024 if budget_mb > 0 else None
+
+
 __all__ = [x for x in dir(mp.get_context(get_start_method())) if not x.startswith('_')]
 globals().update((name, getattr(mp.get_context(get_start_method()), name)) for name in __all__)
@@ -3,23 +3,26 @@
 # --------------------------------------------------------------------------
 import atexit
 import gzip
-import json
 import os
 import shutil
 import sys
 import tempfile
 import threading
 import time
+import zlib
 from collections import OrderedDict
 from queue import Queue
+from typing import Any, Callable
 
 import werkzeug
 from tensorboard.plugins import base_plugin
-from werkzeug import exceptions, wrappers
+from werkzeug import exceptions, wrappers, wsgi
 
-from . import consts, io, utils
-from .profiler import RunLoader
-from .run import DistributedRunProfile, Run, RunProfile
+from . import consts, io, json_codec, utils
+from .profiler import RunLoader, trace_stream
+from .profiler.trace_index import TraceIndex
+from .response_cache import ResponseCache
+from .run import MEMORY_CURVE_POINTS, DistributedRunProfile, Run, RunProfile
 
 logger = utils.get_logger()
 
@@ -41,6 +44,7 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
     plugin_name = consts.PLUGIN_NAME
     headers = [('X-Content-Type-Options', 'nosniff')]
     CONTENT_TYPE = 'application/json'
+    FILE_CHUNK_SIZE = 1024 * 1024
 
     def __init__(self, context: base_plugin.TBContext):
         """Instantiates TorchProfilerPlugin.
@@ -65,7 +69,11 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
         self._temp_dir = tempfile.mkdtemp()
         self._cache = io.Cache(self._temp_dir)
         self._queue = Queue()
-        self._gpu_metrics_file_dict = {}
+        # the gzip files of the traces which are compressed or appended the GPU metrics on request.
+        self._trace_file_dict = {}
+        # the TraceIndex of the traces which are not indexed at load time.
+        self._trace_index_dict = {}
+        self._trace_file_lock = threading.Lock()
         monitor_runs = threading.Thread(target=self._monitor_runs, name='monitor_runs', daemon=True)
         monitor_runs.start()
 
@@ -73,6 +81,7 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
         receive_runs.start()
 
         self.diff_run_cache = {}
+        self._response_cache = ResponseCache.from_env()
         self.diff_run_flatten_cache = {}
 
         def clean():
@@ -111,6 +120,7 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
             '/kernel/table': self.kernel_table_route,
             '/kernel/tc_pie': self.kernel_tc_route,
             '/trace': self.trace_route,
+            '/trace/counters': self.trace_counters_route,
             '/distributed/gpuinfo': self.dist_gpu_info_route,
             '/distributed/overlap': self.comm_overlap_route,
             '/distributed/waittime': self.comm_wait_route,
@@ -167,17 +177,20 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
         profile = self._get_profile_for_request(request)
         name = request.args.get('run')
         run = self._get_run(name)
-        data = profile.overview
-        is_gpu_used = profile.has_runtime or profile.has_kernel or profile.has_memcpy_or_memset
-        normal_workers = [worker for worker in run.workers if worker != 'All']
-        data['environments'] = [{'title': 'Number of Worker(s)', 'value': str(len(normal_workers))},
-                                {'title': 'Device Type', 'value': 'GPU' if is_gpu_used else 'CPU'}]
-        if profile.gpu_summary and profile.gpu_tooltip:
-            data['gpu_metrics'] = {'title': 'GPU Summary',
-                                   'data': profile.gpu_summary,
-                                   'tooltip': profile.gpu_tooltip}
 
-        return self.respond_as_json(data)
+        def get_overview():
+            data = profile.overview
+            is_gpu_used = profile.has_runtime or profile.has_kernel or profile.has_memcpy_or_memset
+            normal_workers = [worker for worker in run.workers if worker != 'All']
+            data['environments'] = [{'title': 'Number of Worker(s)', 'value': str(len(normal_workers))},
+                                    {'title': 'Device Type', 'value': 'GPU' if is_gpu_used else 'CPU'}]
+            if profile.gpu_summary and profile.gpu_tooltip:
+                data['gpu_metrics'] = {'title': 'GPU Summary',
+                                       'data': profile.gpu_summary,
+                                       'tooltip': profile.gpu_tooltip}
+            return data
+
+        return self.respond_as_cached_json(request, profile, get_overview)
 
     @wrappers.Request.application
     def operation_pie_route(self, request: werkzeug.Request):
@@ -185,9 +198,9 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
 
         group_by = request.args.get('group_by')
         if group_by == 'OperationAndInputShape':
-            return self.respond_as_json(profile.operation_pie_by_name_input)
+            return self.respond_as_cached_json(request, profile, lambda: profile.operation_pie_by_name_input)
         else:
-            return self.respond_as_json(profile.operation_pie_by_name)
+            return self.respond_as_cached_json(request, profile, lambda: profile.operation_pie_by_name)
 
     @wrappers.Request.application
     def operation_table_route(self, request: werkzeug.Request):
@@ -195,9 +208,9 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
 
         group_by = request.args.get('group_by')
         if group_by == 'OperationAndInputShape':
-            return self.respond_as_json(profile.operation_table_by_name_input)
+            return self.respond_as_table(request, profile, 'operation_table_by_name_input')
         else:
-            return self.respond_as_json(profile.operation_table_by_name)
+            return self.respond_as_table(request, profile, 'operation_table_by_name')
 
     @wrappers.Request.application
     def operation_stack_route(self, request: werkzeug.Request):
@@ -208,15 +221,16 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
         group_by = request.args.get('group_by')
         input_shape = request.args.get('input_shape')
         if group_by == 'OperationAndInputShape':
-            return self.respond_as_json(profile.operation_stack_by_name_input[str(op_name)+'###'+str(input_shape)])
+            return self.respond_as_cached_json(
+                request, profile, lambda: profile.operation_stack_by_name_input[str(op_name)+'###'+str(input_shape)])
         else:
-            return self.respond_as_json(profile.operation_stack_by_name[str(op_name)])
+            return self.respond_as_cached_json(request, profile, lambda: profile.operation_stack_by_name[str(op_name)])
 
     @wrappers.Request.application
     def kernel_pie_route(self, request: werkzeug.Request):
         profile = self._get_profile_for_request(request)
 
-        return self.respond_as_json(profile.kernel_pie)
+        return self.respond_as_cached_json(request, profile, lambda: profile.kernel_pie)
 
     @wrappers.Request.application
     def kernel_table_route(self, request: werkzeug.Request):
@@ -224,65 +238,67 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
 
         group_by = request.args.get('group_by')
         if group_by == 'Kernel':
-            return self.respond_as_json(profile.kernel_table)
+            return self.respond_as_table(request, profile, 'kernel_table')
         else:
-            return self.respond_as_json(profile.kernel_op_table)
+            return self.respond_as_table(request, profile, 'kernel_op_table')
 
     @wrappers.Request.application
     def kernel_tc_route(self, request: werkzeug.Request):
         profile = self._get_profile_for_request(request)
 
-        return self.respond_as_json(profile.tc_pie)
+        return self.respond_as_cached_json(request, profile, lambda: profile.tc_pie)
 
     @wrappers.Request.application
     def trace_route(self, request: werkzeug.Request):
         profile = self._get_profile_for_request(request)
-
-        if not profile.has_kernel:  # Pure CPU.
-            raw_data = self._cache.read(profile.trace_file_path)
-            if not profile.trace_file_path.endswith('.gz'):
-                raw_data = gzip.compress(raw_data, 1)
-        else:
-            file_with_gpu_metrics = self._gpu_metrics_file_dict.get(profile.trace_file_path)
-            if file_with_gpu_metrics:
-                raw_data = io.read(file_with_gpu_metrics)
-            else:
-                raw_data = self._cache.read(profile.trace_file_path)
-                if profile.trace_file_path.endswith('.gz'):
-                    raw_data = gzip.decompress(raw_data)
-                raw_data = profile.append_gpu_metrics(raw_data)
-
-                # write the data to temp file
-                fp = tempfile.NamedTemporaryFile('w+b', suffix='.json.gz', dir=self._temp_dir, delete=False)
-                fp.close()
-                # Already compressed, no need to gzip.open
-                with open(fp.name, mode='wb') as file:
-                    file.write(raw_data)
-                self._gpu_metrics_file_dict[profile.trace_file_path] = fp.name
-
         headers = [('Content-Encoding', 'gzip')]
         headers.extend(TorchProfilerPlugin.headers)
-        return werkzeug.Response(raw_data, content_type=TorchProfilerPlugin.CONTENT_TYPE, headers=headers)
+
+        step = request.args.get('step', None)
+        start_ts = request.args.get('start_ts', None, type=float)
+        end_ts = request.args.get('end_ts', None, type=float)
+        if step is not None:
+            step_range = profile.get_step_range(step)
+            if step_range is None:
+                raise exceptions.NotFound('could not find the step %s' % step)
+            start_ts, end_ts = step_range
+        if start_ts is None and end_ts is None:
+            return self.respond_with_file(request, self._get_trace_file(profile), headers)
+
+        # only the events within the window.
+        trace_index = self._get_trace_index(profile)
+        return werkzeug.Response(trace_index.iter_window(start_ts, end_ts),
+                                 content_type=TorchProfilerPlugin.CONTENT_TYPE, headers=headers)
+
+    @wrappers.Request.application
+    def trace_counters_route(self, request: werkzeug.Request):
+        profile = self._get_profile_for_request(request)
+        # the window and resolution of the visible part of the trace view, the whole trace by default.
+        start = request.args.get('start', None, type=float)
+        end = request.args.get('end', None, type=float)
+        resolution = request.args.get('resolution', None, type=int)
+        return self.respond_as_cached_json(
+            request, profile, lambda: {'traceEvents': profile.get_gpu_counters(start, end, resolution)})
 
     @wrappers.Request.application
     def dist_gpu_info_route(self, request: werkzeug.Request):
         profile = self._get_distributed_profile_for_request(request)
-        return self.respond_as_json(profile.gpu_info)
+        return self.respond_as_cached_json(request, profile, lambda: profile.gpu_info)
 
     @wrappers.Request.application
     def comm_overlap_route(self, request: werkzeug.Request):
         profile = self._get_distributed_profile_for_request(request)
-        return self.respond_as_json(profile.steps_to_overlap)
+        return self.respond_as_cached_json(request, profile, lambda: profile.steps_to_overlap)
 
     @wrappers.Request.application
     def comm_wait_route(self, request: werkzeug.Request):
         profile = self._get_distributed_profile_for_request(request)
-        return self.respond_as_json(profile.steps_to_wait)
+        return self.respond_as_cached_json(request, profile, lambda: profile.steps_to_wait)
 
     @wrappers.Request.application
     def comm_ops_route(self, request: werkzeug.Request):
         profile = self._get_distributed_profile_for_request(request)
-        return self.respond_as_json(profile.comm_ops)
+        return self.respond_as_cached_json(request, profile, lambda: profile.comm_ops)
 
     @wrappers.Request.application
     def memory_route(self, request: werkzeug.Request):
@@ -295,16 +311,24 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
         if end_ts is not None:
             end_ts = int(end_ts)
 
-        return self.respond_as_json(
-            profile.get_memory_stats(start_ts=start_ts, end_ts=end_ts, memory_metric=memory_metric), True)
+        return self.respond_as_cached_json(
+            request, profile,
+            lambda: profile.get_memory_stats(start_ts=start_ts, end_ts=end_ts, memory_metric=memory_metric))
 
     @wrappers.Request.application
     def memory_curve_route(self, request: werkzeug.Request):
         profile = self._get_profile_for_request(request)
         time_metric = request.args.get('time_metric', 'ms')
         memory_metric = request.args.get('memory_metric', 'MB')
-        return self.respond_as_json(
-            profile.get_memory_curve(time_metric=time_metric, memory_metric=memory_metric), True)
+        # the zoomed in range of the curve, which is sampled from the full resolution curve.
+        start_ts = request.args.get('start_ts', None, type=int)
+        end_ts = request.args.get('end_ts', None, type=int)
+        points = request.args.get('points', MEMORY_CURVE_POINTS, type=int)
+        if points <= 0:
+            raise exceptions.BadRequest('Unexpected points %s in request url' % points)
+        return self.respond_as_cached_json(
+            request, profile, lambda: profile.get_memory_curve(
+                time_metric=time_metric, memory_metric=memory_metric, start_ts=start_ts, end_ts=end_ts, points=points))
 
     @wrappers.Request.application
     def memory_events_route(self, request: werkzeug.Request):
@@ -318,27 +342,29 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
         if end_ts is not None:
             end_ts = int(end_ts)
 
-        return self.respond_as_json(
-            profile.get_memory_events(start_ts, end_ts, time_metric=time_metric,
-                                      memory_metric=memory_metric), True)
+        return self.respond_as_cached_json(
+            request, profile,
+            lambda: profile.get_memory_events(start_ts, end_ts, time_metric=time_metric, memory_metric=memory_metric))
 
     @wrappers.Request.application
     def module_route(self, request: werkzeug.Request):
         profile = self._get_profile_for_request(request)
-        content = profile.get_module_view()
-        if content:
-            return self.respond_as_json(content, True)
-        else:
-            name = request.args.get('run')
-            worker = request.args.get('worker')
-            span = request.args.get('span')
-            raise exceptions.NotFound('could not find the run for %s/%s/%s' % (name, worker, span))
+
+        def get_module_view():
+            content = profile.get_module_view()
+            if not content:
+                name = request.args.get('run')
+                worker = request.args.get('worker')
+                span = request.args.get('span')
+                raise exceptions.NotFound('could not find the run for %s/%s/%s' % (name, worker, span))
+            return content
+
+        return self.respond_as_cached_json(request, profile, get_module_view)
 
     @wrappers.Request.application
     def op_tree_route(self, request: werkzeug.Request):
         profile = self._get_profile_for_request(request)
-        content = profile.get_operator_tree()
-        return self.respond_as_json(content, True)
+        return self.respond_as_cached_json(request, profile, profile.get_operator_tree)
 
     @wrappers.Request.application
     def diff_run_route(self, request: werkzeug.Request):
@@ -380,14 +406,78 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
             contents, content_type=mimetype, headers=TorchProfilerPlugin.headers
         )
 
+    @staticmethod
+    def respond_with_file(request: werkzeug.Request, path: str, headers) -> werkzeug.Response:
+        """Stream the file chunk by chunk, with the support of the conditional and range requests."""
+        f = open(path, 'rb')
+        st = os.fstat(f.fileno())
+        data = wsgi.wrap_file(request.environ, f, TorchProfilerPlugin.FILE_CHUNK_SIZE)
+        response = werkzeug.Response(data, content_type=TorchProfilerPlugin.CONTENT_TYPE, headers=headers,
+                                     direct_passthrough=True)
+        response.content_length = st.st_size
+        response.last_modified = int(st.st_mtime)
+        response.set_etag('{}-{}-{}'.format(st.st_mtime_ns, st.st_size, zlib.adler32(path.encode('utf-8'))))
+        try:
+            return response.make_conditional(request, accept_ranges=True, complete_length=st.st_size)
+        except exceptions.RequestedRangeNotSatisfiable:
+            f.close()
+            raise
+
+    def respond_as_table(self, request: werkzeug.Request, profile: RunProfile, view_name: str):
+        """Respond the table view, or only a page of it if any of offset, limit, sort_by and search is given.
+        The rows are sorted by sort_by in the order 'desc' (the default) or 'asc', and filtered by the search
+        string in the search_by column, the name by default.
+        """
+        args = request.args
+        if not any(name in args for name in ('offset', 'limit', 'sort_by', 'search')):
+            return self.respond_as_cached_json(request, profile, lambda: getattr(profile, view_name))
+
+        order = args.get('order', 'desc')
+        if order not in ('asc', 'desc'):
+            raise exceptions.BadRequest('Unexpected order %s in request url' % order)
+        offset = args.get('offset', 0, type=int)
+        limit = args.get('limit', None, type=int)
+        sort_by = args.get('sort_by')
+        search_by = args.get('search_by')
+        index = profile.get_table_index(view_name)
+        if index:
+            for column in (sort_by, search_by):
+                if column is not None and column not in index.keys:
+                    raise exceptions.BadRequest('Unexpected column %s in request url' % column)
+        return self.respond_as_cached_json(request, profile, lambda: profile.get_table_page(
+            view_name, sort_by, order == 'desc', args.get('search'), search_by, offset, limit))
+
+    def respond_as_cached_json(self, request: werkzeug.Request, profile, get_content: Callable[[], Any]):
+        """Respond the json of get_content(), which is cached gzipped for the profile and the request url.
+        It is sent gzipped only if the client accepts the gzip encoding.
+        """
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        cached = self._response_cache.get(key, profile)
+        if cached is None:
+            cached = self._response_cache.put(key, profile, json_codec.dumps(get_content()))
+        data, etag = cached
+
+        headers = [('Vary', 'Accept-Encoding')]
+        headers.extend(TorchProfilerPlugin.headers)
+        if request.accept_encodings['gzip']:
+            headers.append(('Content-Encoding', 'gzip'))
+            # the representations of different encodings have different strong etags.
+            etag += '-gzip'
+        else:
+            data = gzip.decompress(data)
+        response = werkzeug.Response(data, content_type=TorchProfilerPlugin.CONTENT_TYPE, headers=headers)
+        response.set_etag(etag)
+        # let the browser revalidate it every time, the run could have been reloaded.
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
     @staticmethod
     def respond_as_json(obj, compress: bool = False):
-        content = json.dumps(obj)
+        content = json_codec.dumps(obj)
         headers = []
         headers.extend(TorchProfilerPlugin.headers)
         if compress:
-            content_bytes = content.encode('utf-8')
-            raw_data = gzip.compress(content_bytes, 1)
+            raw_data = gzip.compress(content, 1)
             headers.append(('Content-Encoding', 'gzip'))
             return werkzeug.Response(raw_data, content_type=TorchProfilerPlugin.CONTENT_TYPE, headers=headers)
         else:
@@ -529,6 +619,47 @@ class TorchProfilerPlugin(base_plugin.TBPlugin):
             name = io.relpath(run_dir, logdir)
         return name
 
+    def _get_trace_file(self, profile: RunProfile) -> str:
+        """Return the local gzip file of the trace sent to the trace view."""
+        trace_file = self._cache.get_remote_cache(profile.trace_file_path)
+        if profile.trace_has_gpu_metrics or (not profile.has_kernel and profile.trace_file_path.endswith('.gz')):
+            return trace_file
+
+        with self._trace_file_lock:
+            file = self._trace_file_dict.get(profile.trace_file_path)
+        if file is not None:
+            return file
+
+        fd, file = tempfile.mkstemp(suffix='.json.gz', dir=self._temp_dir)
+        with os.fdopen(fd, 'wb') as f:
+            if profile.has_kernel:
+                # the GPU metrics were not appended at load time.
+                tail, has_events = trace_stream.write_trace_body(trace_file, f)
+                trace_stream.append_trace_events(f, profile.gpu_metrics, tail, has_events)
+            else:
+                with open(trace_file, 'rb') as fin, gzip.GzipFile(fileobj=f, mode='wb', compresslevel=1) as fzip:
+                    shutil.copyfileobj(fin, fzip, TorchProfilerPlugin.FILE_CHUNK_SIZE)
+        with self._trace_file_lock:
+            self._trace_file_dict[profile.trace_file_path] = file
+        return file
+
+    def _get_trace_index(self, profile: RunProfile) -> TraceIndex:
+        if profile.trace_index is not None:
+            return profile.trace_index
+
+        trace_file = self._get_trace_file(profile)
+        with self._trace_file_lock:
+            trace_index = self._trace_index_dict.get(trace_file)
+        if trace_index is not None:
+            return trace_index
+
+        fd, data_path = tempfile.mkstemp(suffix='.trace.index', dir=self._temp_dir)
+        os.close(fd)
+        trace_index = TraceIndex.build(trace_file, data_path)
+        with self._trace_file_lock:
+            self._trace_index_dict[trace_file] = trace_index
+        return trace_index
+
     def _get_profile_for_request(self, request: werkzeug.Request) -> RunProfile:
         name = request.args.get('run')
         span = request.args.get('span')
@@ -3,25 +3,25 @@
 # --------------------------------------------------------------------------
 import gzip
 import io as sysio
-import json
+import os
 import re
 import tempfile
 from json.decoder import JSONDecodeError
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Optional, Tuple
 
-from .. import io, utils
+from .. import io, json_codec, utils
 from ..utils import href
-from . import trace
+from . import trace, trace_stream
 from .communication import analyze_communication_nodes
 from .event_parser import CommLibTypes, EventParser, ProfileRole
+from .event_table import EventTable
 from .gpu_metrics_parser import GPUMetricsParser
 from .kernel_parser import KernelParser
-from .memory_parser import MemoryParser, MemorySnapshot
+from .memory_parser import MemoryParser, MemoryRecord, MemorySnapshot
 from .node import OperatorNode
 from .op_agg import ModuleAggregator
 from .overall_parser import OverallParser
 from .tensor_cores_parser import TensorCoresParser
-from .trace import BaseEvent, EventTypes, MemoryEvent
 
 logger = utils.get_logger()
 
@@ -32,26 +32,23 @@ class RunProfileData:
         self.span = span
 
         # metadatas
-        self.is_pytorch_lightning = trace_json.get('Framework', None) == 'pytorch-lightning'
-        self.data_schema_version = trace_json.get('schemaVersion', None)
-        self.distributed_info = trace_json.get('distributedInfo', None)
-        self.device_props = trace_json.get('deviceProperties', None)
-
-        self.profiler_start_ts = float('inf')
-        self.events: List[BaseEvent] = []
+        self._set_metadata(trace_json)
+        self.events = EventTable(self.is_pytorch_lightning)
 
+        # trace_body may be a generator which streams the events from the trace file.
         trace_body = trace_json['traceEvents']
         fwd_bwd_events = []
         for data in trace_body:
             if data.get('cat') == 'forward_backward':
                 fwd_bwd_events.append(data)
             else:
-                event = trace.create_event(data, self.is_pytorch_lightning)
-                if event is not None:
-                    self.profiler_start_ts = min(self.profiler_start_ts, event.ts)
-                    self.events.append(event)
+                self.events.append(data)
 
-        self.events.sort(key=lambda e: e.ts)
+        # When streaming, the metadata after 'traceEvents' is only available after all events are read,
+        # the events appended before 'Framework' is known are changed to the pytorch-lightning ones by finish.
+        self._set_metadata(trace_json)
+        self.events.finish(self.is_pytorch_lightning)
+        self.profiler_start_ts = self.events.start_ts
         self.forward_backward_events = trace.create_association_events(fwd_bwd_events)
 
         self.trace_file_path: str = None
@@ -69,6 +66,7 @@ class RunProfileData:
         self.has_memcpy_or_memset: bool = False
         self.role_ranges = None
         self.steps_costs = None
+        self.steps = None
         self.steps_names = None
         self.avg_costs = None
 
@@ -96,22 +94,101 @@ class RunProfileData:
         # recommendation based on analysis result.
         self.recommendations = []
 
+    def _set_metadata(self, trace_json: Dict):
+        self.is_pytorch_lightning = trace_json.get('Framework', None) == 'pytorch-lightning'
+        self.data_schema_version = trace_json.get('schemaVersion', None)
+        self.distributed_info = trace_json.get('distributedInfo', None)
+        self.device_props = trace_json.get('deviceProperties', None)
+
     @staticmethod
     def parse(worker, span, path, cache_dir):
-        trace_path, trace_json = RunProfileData._preprocess_file(path, cache_dir)
+        profile = None
+        if os.environ.get('TORCH_PROFILER_STREAMING_PARSE', '1') == '1':
+            try:
+                trace_path, profile = RunProfileData._parse_stream(worker, span, path, cache_dir)
+            except JSONDecodeError as e:
+                # fall back to load the whole file, which could re-encode the invalid json.
+                logger.warning('Failed to stream the trace file %s: %s, load the whole file instead' % (path, e.msg))
+
+        if profile is None:
+            trace_path, trace_json = RunProfileData._preprocess_file(path, cache_dir)
+            profile = RunProfileData(worker, span, trace_json)
+            del trace_json
 
-        profile = RunProfileData.from_json(worker, span, trace_json)
         profile.trace_file_path = trace_path
+        profile._process_and_analyze()
         return profile
 
     @staticmethod
     def from_json(worker, span, trace_json: Dict):
         profile = RunProfileData(worker, span, trace_json)
-        with utils.timing('Data processing'):
-            profile.process()
-        profile.analyze()
+        profile._process_and_analyze()
         return profile
 
+    def _process_and_analyze(self):
+        with utils.timing('Data processing'):
+            self.process()
+        self.analyze()
+
+    @staticmethod
+    def _parse_stream(worker, span, trace_path, cache_dir):
+        """Create the events while decompressing and decoding the trace file chunk by chunk,
+        so that the whole json never exists in memory."""
+        if not io.exists(trace_path):
+            raise FileNotFoundError(trace_path)
+
+        # the events to check the 'Record Window End' work-around.
+        markers = []
+
+        def stream_events(trace_json: Dict):
+            events = trace_stream.iter_trace_events(trace_path, trace_json)
+            for i, data in enumerate(events):
+                name = data.get('name', '')
+                if name == 'Record Window End' or name.startswith('Iteration Start:'):
+                    markers.append((i, data))
+                yield data
+
+        with utils.timing('Stream trace events'):
+            trace_json = {}
+            trace_json['traceEvents'] = stream_events(trace_json)
+            profile = RunProfileData(worker, span, trace_json)
+
+        end_index = RunProfileData._find_record_window_end(reversed(markers))
+        if end_index is not None:
+            metadata = {k: v for k, v in trace_json.items() if k != 'traceEvents'}
+            fp = tempfile.NamedTemporaryFile('w+b', suffix='.json.gz', dir=cache_dir, delete=False)
+            fp.close()
+            with gzip.open(fp.name, mode='wb') as fzip:
+                events = trace_stream.iter_trace_events(trace_path, {})
+                trace_stream.dump_trace(fzip, metadata, (e for i, e in enumerate(events) if i != end_index))
+            trace_path = fp.name
+
+        return trace_path, profile
+
+    @staticmethod
+    def _find_record_window_end(indexed_events: Iterable[Tuple[int, Dict]]) -> Optional[int]:
+        """work-around to remove the 'Record Window End' events to avoid the huge end timestamp.
+        indexed_events: the (index, event) in the reversed order of 'traceEvents'.
+        Return the index of the event to be removed.
+        """
+        end_event = None
+        start_event = None
+        end_index = None
+        for i, event in indexed_events:
+            if event['name'] == 'Record Window End':
+                end_index = i
+                end_event = event
+            elif event['name'].startswith('Iteration Start:'):
+                start_event = event
+            if start_event is not None and end_event is not None:
+                break
+
+        if start_event is not None and end_event is not None:
+            dur = end_event['ts'] - start_event['ts']
+            if dur > 24 * 3600 * 1000:
+                return end_index
+        return None
+
     @staticmethod
     def _preprocess_file(trace_path, cache_dir):
         if not io.exists(trace_path):
@@ -123,44 +200,30 @@ class RunProfileData:
 
         json_reencode = False
         try:
-            trace_json = json.loads(data)
+            # Kineto may export json file with non-ascii code, json_codec decodes it with strict=False.
+            trace_json = json_codec.loads(data)
         except JSONDecodeError as e:
-            # Kineto may export json file with non-ascii code. before this is fixed, use a workaround
-            # to handle JSONDecodeError, re-encode it and save to a temp file
-            try:
-                trace_json = json.loads(data, strict=False)
-            except JSONDecodeError:
-                with sysio.StringIO() as fout:
-                    str_data = data.decode('utf-8')
-                    # only replace the N/A without surrounding double quote
-                    fout.write(re.sub(r'(?<!")N/A(?!")', "\"N/A\"", str_data))
-                    trace_json = json.loads(fout.getvalue())
-                    logger.warning('Get JSONDecodeError: %s, Re-encode it to temp file' % e.msg)
-                    json_reencode = True
-
-        # work-around to remove the 'Record Window End' events to avoid the huge end timestamp
-        event_list = trace_json['traceEvents']
-        end_index = None
-        start_index = None
-        for i in reversed(range(len(event_list))):
-            if event_list[i]['name'] == 'Record Window End':
-                end_index = i
-            elif event_list[i]['name'].startswith('Iteration Start:'):
-                start_index = i
-            if start_index is not None and end_index is not None:
-                break
-
-        if start_index is not None and end_index is not None:
-            dur = event_list[end_index]['ts'] - event_list[start_index]['ts']
-            if dur > 24 * 3600 * 1000:
-                del trace_json['traceEvents'][end_index]
+            # before this is fixed, use a workaround to handle JSONDecodeError, re-encode it and save to a temp file
+            with sysio.StringIO() as fout:
+                str_data = data.decode('utf-8')
+                # only replace the N/A without surrounding double quote
+                fout.write(re.sub(r'(?<!")N/A(?!")', "\"N/A\"", str_data))
+                trace_json = json_codec.loads(fout.getvalue())
+                logger.warning('Get JSONDecodeError: %s, Re-encode it to temp file' % e.msg)
                 json_reencode = True
 
+        event_list = trace_json['traceEvents']
+        end_index = RunProfileData._find_record_window_end(
+            (i, event_list[i]) for i in reversed(range(len(event_list))))
+        if end_index is not None:
+            del trace_json['traceEvents'][end_index]
+            json_reencode = True
+
         if json_reencode:
-            fp = tempfile.NamedTemporaryFile('w+t', suffix='.json.gz', dir=cache_dir, delete=False)
+            fp = tempfile.NamedTemporaryFile('w+b', suffix='.json.gz', dir=cache_dir, delete=False)
             fp.close()
-            with gzip.open(fp.name, mode='wt') as fzip:
-                fzip.write(json.dumps(trace_json))
+            with gzip.open(fp.name, mode='wb') as fzip:
+                fzip.write(json_codec.dumps(trace_json))
             trace_path = fp.name
 
         return trace_path, trace_json
@@ -173,6 +236,7 @@ class RunProfileData:
         self.has_runtime = parser.has_runtime
         self.has_kernel = parser.has_kernel
         self.has_memcpy_or_memset = parser.has_memcpy_or_memset
+        self.steps = parser.steps
         self.steps_names = parser.steps_names
         self.used_devices = sorted(list(parser.used_devices))
         self.use_dp = parser.use_dp
@@ -220,9 +284,9 @@ class RunProfileData:
             self.kernel_stat = kernel_parser.kernel_stat
             self.tc_used_ratio = kernel_parser.tc_used_ratio
 
-        memory_events = self._memory_events()
-        if memory_events:
-            memory_parser = MemoryParser(memory_events)
+        memory_records = MemoryRecord.from_table(self.events)
+        if memory_records:
+            memory_parser = MemoryParser(memory_records)
             self.memory_snapshot = memory_parser.find_memory_nodes(self.tid2tree)
 
     def analyze(self):
@@ -308,11 +372,6 @@ class RunProfileData:
                 f"convergence and accuracy. For such case, you may want to evaluate {href('LAMB optimizer', lamb_url)}."
             )
 
-    def _memory_events(self) -> List[MemoryEvent]:
-        memory_events = [e for e in self.events if e.type == EventTypes.MEMORY]
-        memory_events.sort(key=lambda e: e.ts)
-        return memory_events
-
     def _analyze_gpu_metrics(self):
         def get_gpus_str(gpus):
             gpu_list_str = str(gpus[0])
@@ -4,15 +4,18 @@
 import sys
 from collections import defaultdict
 from enum import IntEnum
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
 from .. import utils
 from .communication import generate_communication_nodes
+from .event_table import TYPE_CODES, EventTable
 from .node import (CommunicationNode, DeviceNode, ModuleNode, OperatorNode, PLModuleNode, PLProfileNode,
                    ProfilerStepNode, RuntimeNode, create_operator_node)
 from .op_tree import OpTreeBuilder
-from .range_utils import merge_ranges
-from .trace import BaseEvent, DurationEvent, EventTypes, KernelEvent, NcclOpNameSet, GlooOpNameSet
+from .range_utils import IntervalSet
+from .trace import DurationEvent, EventTypes, NcclOpNameSet, GlooOpNameSet
 
 logger = utils.get_logger()
 
@@ -46,7 +49,7 @@ class NodeParserMixin:
         self.use_ddp = False
         self.comm_lib = set()
 
-    def parse_nodes(self, events: Iterable[BaseEvent]):
+    def parse_nodes(self, events: EventTable):
         # For OperatorNode and ProfilerStepNode:
         #   Use time interval containing relationship to build father-child correlation,
         #   which is consistent with autograd profiler.
@@ -65,9 +68,7 @@ class NodeParserMixin:
         corrid_to_runtime: Dict[int, RuntimeNode] = {}  # value is a RuntimeNode
         externalid_to_runtime: Dict[int, List[RuntimeNode]] = defaultdict(list)  # value is a list of RuntimeNode
 
-        for event in events:
-            if event.type == EventTypes.MEMORY:
-                continue
+        for event in events.iter_events(exclude=[EventTypes.MEMORY]):
             self._parse_node(
                 event,
                 corrid_to_device,
@@ -78,9 +79,10 @@ class NodeParserMixin:
                 tid2zero_rt_list)
 
         if CommLibTypes.Nccl in self.comm_lib:
-            for event in events:
-                if event.type == EventTypes.KERNEL:
-                    self._update_communication_node(event)
+            rows = events.rows([EventTypes.KERNEL])
+            for external_id, ts, dur in zip(events.external_id[rows].tolist(), events.ts[rows].tolist(),
+                                            events.duration[rows].tolist()):
+                self._update_communication_node(external_id, ts, dur)
 
         # associate CUDA Runtimes with CPU events
         for op_list in tid2list.values():
@@ -108,13 +110,10 @@ class NodeParserMixin:
 
         return tid2list, tid2zero_rt_list, staled_device_nodes, pl_tid2list
 
-    def _update_communication_node(self, event: KernelEvent):
-        """Update the communication node by using the TraceEvent instance"""
-        external_id = event.external_id
+    def _update_communication_node(self, external_id: int, ts: int, dur: int):
+        """Update the communication node by the kernel launched by it"""
         comm_node = self.communication_data.get(external_id)
         if comm_node:
-            ts = event.ts
-            dur = event.duration
             comm_node.kernel_ranges.append((ts, ts + dur))
             comm_node.total_time += dur
 
@@ -221,15 +220,62 @@ class StepParser:
         self.global_start_ts = sys.maxsize
         self.global_end_ts = -sys.maxsize - 1
 
-    def parse_steps(self, events: Iterable[DurationEvent], comm_nodes: Dict[int, CommunicationNode]):
-        for event in events:
-            if event.type == EventTypes.MEMORY:
-                continue
+    def parse_steps(self, events: EventTable, comm_nodes: Dict[int, CommunicationNode]):
+        rows = events.rows(exclude=[EventTypes.MEMORY])
+        types = events.type[rows]
+        names = events.name[rows]
+        ts = events.ts[rows]
+        end_ts = ts + events.duration[rows]
+
+        def is_type(*event_types):
+            return np.isin(types, [TYPE_CODES[t] for t in event_types])
+
+        def name_mask(predicate):
+            return np.array([predicate(name) for name in events.names], dtype=bool)[names]
+
+        role_masks = [np.zeros(len(rows), dtype=bool) for _ in self.role_ranges]
+
+        def add_ranges(role: ProfileRole, mask: np.ndarray):
+            role_masks[role] |= mask
+
+        is_kernel = is_type(EventTypes.KERNEL)
+        is_comm_kernel = is_kernel & np.isin(events.external_id[rows], list(comm_nodes.keys()))
+        add_ranges(ProfileRole.Communication, is_comm_kernel)
+        add_ranges(ProfileRole.Kernel, is_kernel & ~is_comm_kernel)
+        add_ranges(ProfileRole.Memcpy, is_type(EventTypes.MEMCPY))
+        add_ranges(ProfileRole.Memset, is_type(EventTypes.MEMSET))
+        add_ranges(ProfileRole.Runtime, is_type(EventTypes.RUNTIME))
+
+        is_dataloader = is_type(EventTypes.OPERATOR, EventTypes.USER_ANNOTATION) & name_mask(
+            lambda name: (name.startswith('enumerate(DataLoader)#') and name.endswith('.__next__'))
+            or name.startswith('enumerate(DataPipe)#'))
+        add_ranges(ProfileRole.DataLoader, is_dataloader)
+
+        is_step = is_type(EventTypes.PROFILER_STEP)
+        self.steps.extend(zip(ts[is_step].tolist(), end_ts[is_step].tolist()))
+        # torch.profiler.profile.step will invoke record_function with name like 'ProfilerStep#5'
+        self.steps_names.extend(str(int(events.names[name].split('#')[1])) for name in names[is_step].tolist())
+
+        is_op = is_type(EventTypes.PYTHON, EventTypes.OPERATOR, EventTypes.USER_ANNOTATION) & ~is_dataloader
+        is_comm_op = is_op & name_mask(lambda name: name in GlooOpNameSet or name in NcclOpNameSet)
+        add_ranges(ProfileRole.Communication, is_comm_op)
+        add_ranges(ProfileRole.CpuOp, is_op & ~is_comm_op)
 
-            self._parse_step(event, comm_nodes)
-            if event.type == EventTypes.TRACE and event.name == 'PyTorch Profiler (0)':
-                self.global_start_ts = event.ts
-                self.global_end_ts = event.ts + event.duration
+        # Record host side min and max time.
+        is_cpu = is_type(EventTypes.PYTHON, EventTypes.OPERATOR, EventTypes.PROFILER_STEP)
+        if is_cpu.any():
+            self.cpu_min_ts = min(self.cpu_min_ts, ts[is_cpu].min().item())
+            self.cpu_max_ts = max(self.cpu_max_ts, end_ts[is_cpu].max().item())
+        # Record global wise min and max time.
+        if len(rows) > 0:
+            self.global_min_ts = min(self.global_min_ts, ts.min().item())
+            self.global_max_ts = max(self.global_max_ts, end_ts.max().item())
+
+        is_profiler = is_type(EventTypes.TRACE) & name_mask(lambda name: name == 'PyTorch Profiler (0)')
+        profiler_rows = np.flatnonzero(is_profiler)
+        if len(profiler_rows) > 0:
+            self.global_start_ts = ts[profiler_rows[-1]].item()
+            self.global_end_ts = end_ts[profiler_rows[-1]].item()
         if self.global_start_ts == sys.maxsize:
             self.global_start_ts = self.global_min_ts
         if self.global_end_ts == -sys.maxsize - 1:
@@ -239,8 +285,8 @@ class StepParser:
             self.steps.append((self.cpu_min_ts, self.cpu_max_ts))
             self.steps_names.append('0')
 
-        for i in range(len(self.role_ranges)):
-            self.role_ranges[i] = merge_ranges(self.role_ranges[i])
+        for i, mask in enumerate(role_masks):
+            self.role_ranges[i] = IntervalSet.from_arrays(ts[mask], end_ts[mask], is_sorted=True).to_list()
 
     def update_device_steps(self, runtime_node_list: List[RuntimeNode]):
         self._update_steps_duration(*self._find_device_steps(runtime_node_list))
@@ -261,42 +307,6 @@ class StepParser:
     def has_memcpy_or_memset(self):
         return bool(self.role_ranges[ProfileRole.Memcpy] or self.role_ranges[ProfileRole.Memset])
 
-    def _parse_step(self, event: DurationEvent, comm_nodes: Dict[int, CommunicationNode]):
-        ts = event.ts
-        dur = event.duration
-        evt_type = event.type
-        if evt_type == EventTypes.KERNEL:
-            if event.external_id in comm_nodes:
-                self.role_ranges[ProfileRole.Communication].append((ts, ts + dur))
-            else:
-                self.role_ranges[ProfileRole.Kernel].append((ts, ts + dur))
-        elif evt_type == EventTypes.MEMCPY:
-            self.role_ranges[ProfileRole.Memcpy].append((ts, ts + dur))
-        elif evt_type == EventTypes.MEMSET:
-            self.role_ranges[ProfileRole.Memset].append((ts, ts + dur))
-        elif evt_type == EventTypes.RUNTIME:
-            self.role_ranges[ProfileRole.Runtime].append((ts, ts + dur))
-        elif ((evt_type == EventTypes.OPERATOR or evt_type == EventTypes.USER_ANNOTATION) and (
-                (event.name.startswith('enumerate(DataLoader)#') and event.name.endswith('.__next__'))
-                or event.name.startswith('enumerate(DataPipe)#'))):
-            self.role_ranges[ProfileRole.DataLoader].append((ts, ts + dur))
-        elif event.type == EventTypes.PROFILER_STEP:
-            self.steps.append((ts, ts + dur))
-            self.steps_names.append(str(event.step))
-        elif evt_type in [EventTypes.PYTHON, EventTypes.OPERATOR, EventTypes.USER_ANNOTATION]:
-            if event.name in GlooOpNameSet or event.name in NcclOpNameSet:
-                self.role_ranges[ProfileRole.Communication].append((ts, ts + dur))
-            else:
-                self.role_ranges[ProfileRole.CpuOp].append((ts, ts + dur))
-
-        # Record host side min and max time.
-        if evt_type in [EventTypes.PYTHON, EventTypes.OPERATOR, EventTypes.PROFILER_STEP]:
-            self.cpu_min_ts = min(self.cpu_min_ts, ts)
-            self.cpu_max_ts = max(self.cpu_max_ts, ts + dur)
-        # Record global wise min and max time.
-        self.global_min_ts = min(self.global_min_ts, ts)
-        self.global_max_ts = max(self.global_max_ts, ts + dur)
-
     def _find_device_steps(self, runtime_node_list: List[RuntimeNode]):
         """return steps associated with device nodes.
         """
@@ -415,7 +425,7 @@ class EventParser(NodeParserMixin, StepParser):
         super().__init__()
         self.comm_node_list: Dict[CommunicationNode] = None
 
-    def parse(self, events: Iterable[BaseEvent], fwd_bwd_map: Dict[int, int]) -> Dict[int, List[OperatorNode]]:
+    def parse(self, events: EventTable, fwd_bwd_map: Dict[int, int]) -> Dict[int, List[OperatorNode]]:
         with utils.timing('EventParser: parse nodes'):
             tid2list, tid2zero_rt_list, staled_device_nodes, pl_tid2list = self.parse_nodes(events)
 
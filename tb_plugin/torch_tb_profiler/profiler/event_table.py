@@ -0,0 +1,336 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+from array import array
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+
+from .. import utils
+from .trace import BaseEvent, EventTypes, create_event_of_type, get_event_type
+
+__all__ = ['EventTable', 'filter_events']
+
+logger = utils.get_logger()
+
+# The event types in the order of their codes in EventTable.type.
+EVENT_TYPES = [
+    EventTypes.TRACE,
+    EventTypes.OPERATOR,
+    EventTypes.PROFILER_STEP,
+    EventTypes.RUNTIME,
+    EventTypes.KERNEL,
+    EventTypes.MEMCPY,
+    EventTypes.MEMSET,
+    EventTypes.PYTHON,
+    EventTypes.MEMORY,
+    EventTypes.PYTHON_FUNCTION,
+    EventTypes.MODULE,
+    EventTypes.PL_PROFILE,
+    EventTypes.PL_MODULE,
+    EventTypes.USER_ANNOTATION
+]
+TYPE_CODES = {t: i for i, t in enumerate(EVENT_TYPES)}
+
+_OPERATOR_ARGS = ['Call stack', 'Input type', 'Input Dims']
+
+# The args kept for each event type, which are read by the event classes in trace.py.
+# 'external id' and 'correlation' are stored as columns for all types.
+_TYPE_ARGS = {
+    EventTypes.OPERATOR: _OPERATOR_ARGS,
+    EventTypes.PROFILER_STEP: _OPERATOR_ARGS,
+    EventTypes.PYTHON: _OPERATOR_ARGS,
+    EventTypes.USER_ANNOTATION: _OPERATOR_ARGS,
+    EventTypes.KERNEL: ['est. achieved occupancy %', 'blocks per SM', 'grid', 'block', 'registers per thread',
+                        'shared memory', 'device'],
+    EventTypes.PYTHON_FUNCTION: ['Python id', 'Python parent id'],
+    EventTypes.MODULE: ['Python id', 'Python parent id', 'Python module id'],
+    EventTypes.MEMORY: ['Device Id', 'Device Type', 'Addr', 'Bytes', 'Total Allocated', 'Total Reserved'],
+}
+
+_NO_ID = -1
+_MIN_ID = -2 ** 63
+_MAX_ID = 2 ** 63 - 1
+
+
+class _Column:
+    """An int64 column which turns into float64 once a float value is appended."""
+
+    def __init__(self):
+        self.data = array('q')
+
+    def append(self, value):
+        if self.data.typecode == 'q':
+            if isinstance(value, int):
+                self.data.append(value)
+                return
+            self.data = array('d', self.data)
+        self.data.append(value)
+
+    def to_numpy(self) -> np.ndarray:
+        return np.frombuffer(self.data, dtype=np.int64 if self.data.typecode == 'q' else np.float64).copy()
+
+
+class EventTable:
+    """The trace events in columnar layout.
+
+    The common fields of the events are NumPy arrays indexed by the row of the event: ``type`` holds the
+    code of the event type (see EVENT_TYPES), ``name`` and ``category`` the indices into the interned
+    ``names`` and ``categories`` tables, ``pid`` and ``tid`` the indices into ``ids``. ``external_id`` and
+    ``correlation_id`` are -1 when absent. The args used by a few event types only, e.g. the kernel launch
+    parameters, are kept in per-type lists, see type_args.
+
+    The rows are sorted by timestamp once finish() is called. Use event() or iter_events() where the event
+    objects of trace.py are needed.
+    """
+
+    def __init__(self, is_pytorch_lightning: bool = False):
+        self.is_pytorch_lightning = is_pytorch_lightning
+        self.names: List[str] = []
+        self.categories: List[str] = []
+        self.ids: List[Union[int, str]] = []
+        self._interned: Dict[Any, int] = {}
+
+        self._type = array('B')
+        self._name = array('i')
+        self._category = array('i')
+        self._pid = array('i')
+        self._tid = array('i')
+        self._ts = _Column()
+        self._duration = _Column()
+        self._external_id = array('q')
+        self._correlation_id = array('q')
+        # the position of the row in the lists of _type_args
+        self._args_index = array('i')
+        self._type_args: Dict[str, List[List]] = {t: [[] for _ in keys] for t, keys in _TYPE_ARGS.items()}
+        self._type_args_count = {t: 0 for t in _TYPE_ARGS}
+        self._scopes: List[str] = []
+        # the number of the external ids and correlation ids which are not integers.
+        self._invalid_ids = 0
+
+        self._finished = False
+        # the rows of the sets of more than one type, by the type codes.
+        self._type_rows: Dict[FrozenSet[int], np.ndarray] = {}
+
+    def append(self, data: Dict) -> bool:
+        """Add the raw trace event. Return False if the event is not used by the profiler."""
+        try:
+            type = get_event_type(data, self.is_pytorch_lightning)
+            if type is None:
+                return False
+            self._append(type, data)
+        except Exception as ex:
+            logger.warning('Failed to parse profile event. Exception=%s. Event=%s', ex, data, exc_info=True)
+            raise
+        return True
+
+    def _intern(self, table: List, value) -> int:
+        # names, categories and ids are interned separately, the key carries the table.
+        key = (id(table), value)
+        index = self._interned.get(key)
+        if index is None:
+            index = len(table)
+            table.append(value)
+            self._interned[key] = index
+        return index
+
+    def _id_value(self, value) -> int:
+        """Return the int of the external id or correlation id, _NO_ID if it is absent or not an integer."""
+        if value is None:
+            return _NO_ID
+        if not isinstance(value, int) or isinstance(value, bool):
+            try:
+                number = float(value)
+                value = int(number) if number.is_integer() else None
+            except (TypeError, ValueError, OverflowError):
+                value = None
+        if value is None or not _MIN_ID <= value <= _MAX_ID:
+            self._invalid_ids += 1
+            return _NO_ID
+        return value
+
+    def _append(self, type: str, data: Dict):
+        args = data.get('args', {})
+        self._ts.append(data.get('ts'))
+        self._duration.append(data.get('dur', 0) if type != EventTypes.MEMORY else 0)
+        self._type.append(TYPE_CODES[type])
+        self._name.append(self._intern(self.names, data.get('name')))
+        self._category.append(self._intern(self.categories, data.get('cat', '')))
+        self._pid.append(self._intern(self.ids, data.get('pid')))
+        self._tid.append(self._intern(self.ids, data.get('tid')))
+
+        external_id = args.get('external id')
+        if external_id is None:
+            external_id = args.get('External id')
+        correlation_id = args.get('correlation')
+        self._external_id.append(self._id_value(external_id))
+        self._correlation_id.append(self._id_value(correlation_id))
+
+        keys = _TYPE_ARGS.get(type)
+        if keys is None:
+            self._args_index.append(_NO_ID)
+            return
+
+        self._args_index.append(self._type_args_count[type])
+        self._type_args_count[type] += 1
+        for key, values in zip(keys, self._type_args[type]):
+            values.append(args.get(key))
+        if keys is _OPERATOR_ARGS:
+            # keep the same fallback as OperatorEvent.
+            shape = args.get('Input Dims')
+            if shape is None:
+                self._type_args[type][2][-1] = args.get('Input dims', [])
+        if type == EventTypes.MEMORY:
+            self._scopes.append(data.get('s', ''))
+
+    def finish(self, is_pytorch_lightning: Optional[bool] = None):
+        """Convert the columns to NumPy arrays sorted by timestamp.
+        is_pytorch_lightning: whether the trace is from pytorch-lightning if it is only known after the events
+        are appended, e.g. the 'Framework' of a streamed trace file follows 'traceEvents'.
+        """
+        if self._finished:
+            return
+        if self._invalid_ids:
+            logger.warning('%d external ids or correlation ids are not integers and are ignored', self._invalid_ids)
+        ts = self._ts.to_numpy()
+        types = np.frombuffer(self._type, dtype=np.uint8)
+        args_index = np.frombuffer(self._args_index, dtype=np.int32)
+        order = np.argsort(ts, kind='stable')
+        if is_pytorch_lightning and not self.is_pytorch_lightning:
+            types, args_index, kept = self._to_pytorch_lightning(types, args_index)
+            order = order[kept[order]]
+            self.is_pytorch_lightning = True
+        self.ts = ts[order]
+        self.duration = self._duration.to_numpy()[order]
+        self.type = types[order]
+        self.name = np.frombuffer(self._name, dtype=np.int32)[order]
+        self.category = np.frombuffer(self._category, dtype=np.int32)[order]
+        self.pid = np.frombuffer(self._pid, dtype=np.int32)[order]
+        self.tid = np.frombuffer(self._tid, dtype=np.int32)[order]
+        self.external_id = np.frombuffer(self._external_id, dtype=np.int64)[order]
+        self.correlation_id = np.frombuffer(self._correlation_id, dtype=np.int64)[order]
+        self.args_index = args_index[order]
+        # the rows of every type in timestamp order are the slices of one stable sort by type.
+        self._type_order = np.argsort(self.type, kind='stable')
+        self._type_offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(self.type, minlength=len(EVENT_TYPES))))).tolist()
+
+        del self._ts, self._duration, self._type, self._name, self._category, self._pid, self._tid
+        del self._external_id, self._correlation_id, self._args_index, self._interned
+        self._finished = True
+
+    def _to_pytorch_lightning(self, types: np.ndarray, args_index: np.ndarray):
+        """Change the types of the rows appended as not pytorch-lightning to the ones get_event_type returns
+        for pytorch-lightning. Return the types, the args_index and the mask of the rows which are kept.
+        """
+        types = types.copy()
+        args_index = args_index.copy()
+        names = np.frombuffer(self._name, dtype=np.int32)
+        operators = types == TYPE_CODES[EventTypes.OPERATOR]
+        for prefix, type in (('[pl][profile]', EventTypes.PL_PROFILE), ('[pl][module]', EventTypes.PL_MODULE)):
+            matched = np.array([isinstance(n, str) and n.startswith(prefix) for n in self.names], dtype=bool)
+            rows = operators & matched[names]
+            types[rows] = TYPE_CODES[type]
+            # the pytorch-lightning events have no args.
+            args_index[rows] = _NO_ID
+        # the python function events are not used for pytorch-lightning.
+        kept = (types != TYPE_CODES[EventTypes.PYTHON_FUNCTION]) & (types != TYPE_CODES[EventTypes.MODULE])
+        return types, args_index, kept
+
+    def __len__(self):
+        return len(self.ts) if self._finished else len(self._type)
+
+    def __iter__(self) -> Iterator[BaseEvent]:
+        return self.iter_events()
+
+    @property
+    def start_ts(self):
+        """The minimum timestamp of the events, or inf if there is no event."""
+        return self.ts[0].item() if len(self.ts) else float('inf')
+
+    def rows(self, types: Optional[Iterable[str]] = None, exclude: Optional[Iterable[str]] = None) -> np.ndarray:
+        """Return the rows of the given event types in timestamp order.
+        types: the EventTypes to include, all types if None.
+        exclude: the EventTypes to skip.
+        """
+        if types is None:
+            types = EVENT_TYPES
+        if exclude:
+            types = [t for t in types if t not in exclude]
+        codes = [TYPE_CODES[t] for t in types]
+        if len(codes) == len(EVENT_TYPES):
+            return np.arange(len(self.ts))
+        if len(codes) == 1:
+            return self._type_order[self._type_offsets[codes[0]]:self._type_offsets[codes[0] + 1]]
+        key = frozenset(codes)
+        rows = self._type_rows.get(key)
+        if rows is None:
+            selected = np.zeros(len(EVENT_TYPES), dtype=bool)
+            selected[codes] = True
+            rows = np.flatnonzero(selected[self.type])
+            self._type_rows[key] = rows
+        return rows
+
+    def names_of(self, rows: np.ndarray) -> np.ndarray:
+        """Return the names of the rows as an object array."""
+        return np.array(self.names, dtype=object)[self.name[rows]]
+
+    def ids_of(self, codes: np.ndarray) -> np.ndarray:
+        """Return the values of the interned pid or tid codes as an object array."""
+        return np.array(self.ids, dtype=object)[codes]
+
+    def type_args(self, type: str, key: str, rows: Optional[np.ndarray] = None) -> List:
+        """Return the value of the arg of the event type for each row, in the order of rows(type) if rows is None.
+        None is returned for the events without the arg."""
+        if rows is None:
+            rows = self.rows([type])
+        values = self._type_args[type][_TYPE_ARGS[type].index(key)]
+        return [values[i] for i in self.args_index[rows].tolist()]
+
+    def scopes_of(self, rows: np.ndarray) -> List[str]:
+        """Return the scope of each row of the memory events."""
+        return [self._scopes[i] for i in self.args_index[rows].tolist()]
+
+    def event(self, row: int) -> BaseEvent:
+        return next(self._create_events(np.array([row])))
+
+    def iter_events(self, types: Optional[Iterable[str]] = None,
+                    exclude: Optional[Iterable[str]] = None) -> Iterator[BaseEvent]:
+        """Create the event objects of the given types, see rows()."""
+        rows = self.rows(types, exclude)
+        # create the events batch by batch to avoid the python lists of the whole columns.
+        batch_size = 65536
+        for start in range(0, len(rows), batch_size):
+            yield from self._create_events(rows[start:start + batch_size])
+
+    def _create_events(self, rows: np.ndarray) -> Iterator[BaseEvent]:
+        columns = zip(self.type[rows].tolist(), self.name[rows].tolist(), self.category[rows].tolist(),
+                      self.ts[rows].tolist(), self.duration[rows].tolist(), self.pid[rows].tolist(),
+                      self.tid[rows].tolist(), self.external_id[rows].tolist(), self.correlation_id[rows].tolist(),
+                      self.args_index[rows].tolist())
+        for type_code, name, category, ts, dur, pid, tid, external_id, correlation_id, args_index in columns:
+            type = EVENT_TYPES[type_code]
+            args = {}
+            if external_id != _NO_ID:
+                args['External id'] = external_id
+            if correlation_id != _NO_ID:
+                args['correlation'] = correlation_id
+            data = {'ph': 'X', 'cat': self.categories[category], 'name': self.names[name], 'pid': self.ids[pid],
+                    'tid': self.ids[tid], 'ts': ts, 'dur': dur, 'args': args}
+            if args_index != _NO_ID:
+                for key, values in zip(_TYPE_ARGS[type], self._type_args[type]):
+                    value = values[args_index]
+                    if value is not None:
+                        args[key] = value
+                if type == EventTypes.MEMORY:
+                    data['ph'] = 'i'
+                    data['s'] = self._scopes[args_index]
+                    del data['dur']
+            yield create_event_of_type(type, data)
+
+
+def filter_events(events: Union[EventTable, Iterable[BaseEvent]], types: Iterable[str]) -> List[BaseEvent]:
+    """Return the events of the given EventTypes from an EventTable or a list of events."""
+    if isinstance(events, EventTable):
+        return list(events.iter_events(types))
+    return [e for e in events if e.type in types]
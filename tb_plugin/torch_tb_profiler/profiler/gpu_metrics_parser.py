@@ -1,32 +1,57 @@
 # -------------------------------------------------------------------------
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # --------------------------------------------------------------------------
-from typing import Iterable, List
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
 from .. import consts, utils
-from .range_utils import (get_ranges_sum, intersection_ranges_lists,
-                          intersection_ranges_lists_with_value, merge_ranges,
+from .range_utils import (IntervalSet, coverage_with_value,
+                          intersection_ranges_lists_with_value,
                           merge_ranges_with_value)
-from .trace import BaseEvent, EventTypes, KernelEvent
+from .event_table import EventTable
+from .trace import EventTypes
 
 logger = utils.get_logger()
 
 
+class _CounterLevel:
+    """The GPU counters of the buckets [edges[i], edges[i + 1]) at one resolution."""
+    __slots__ = ['edges', 'gpu_util', 'sm_efficiency']
+
+    def __init__(self, edges: np.ndarray):
+        self.edges = edges
+        self.gpu_util: Dict[int, np.ndarray] = {}
+        self.sm_efficiency: Dict[int, np.ndarray] = {}
+
+
 # For calculating GPU utilization, and approximated SM efficiency.
 class GPUMetricsParser:
+    # The numbers of buckets over the whole trace of the precomputed counters, from the coarsest.
+    COUNTER_RESOLUTIONS = (100, 1000, 10000)
+
     def __init__(self):
         # All gpu ids that used by any kernel.
         self.gpu_ids = set()
         # For calculating GPU utilization.
         self.kernel_ranges_per_device = [[] for _ in range(consts.MAX_GPU_PER_NODE)]
+        # The merged kernel ranges, from which the utilization of any time range is calculated.
+        self.kernel_intervals_per_device: List[Optional[IntervalSet]] = [None] * consts.MAX_GPU_PER_NODE
         self.gpu_utilization = [None] * consts.MAX_GPU_PER_NODE
         self.gpu_util_timeline_unit_size = 0
         self.gpu_util_timeline_unit_name = ''
         self.gpu_util_buckets = [[] for _ in range(consts.MAX_GPU_PER_NODE)]
+        self.global_start_time = None
+        self.global_end_time = None
         # For calculating approximated SM efficiency.
         self.blocks_per_sm_per_device = [[] for _ in range(consts.MAX_GPU_PER_NODE)]
         self.avg_approximated_sm_efficiency_per_device = [None] * consts.MAX_GPU_PER_NODE
         self.approximated_sm_efficiency_ranges = [[] for _ in range(consts.MAX_GPU_PER_NODE)]
+        # The columns (starts, ends, values) of approximated_sm_efficiency_ranges.
+        self.sm_efficiency_per_device: List[Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]] = \
+            [None] * consts.MAX_GPU_PER_NODE
+        # The counters of the trace view at each of COUNTER_RESOLUTIONS.
+        self.counter_pyramid: List[_CounterLevel] = []
         self.gpu_sm_efficiency_json = None
         self.blocks_per_sm_count = [0] * consts.MAX_GPU_PER_NODE
         # For calculating averaged occupancy.
@@ -34,83 +59,144 @@ class GPUMetricsParser:
         self.avg_occupancy_per_device = [None] * consts.MAX_GPU_PER_NODE
         self.occupancy_count = [0] * consts.MAX_GPU_PER_NODE
 
-    def calculate_gpu_utilization(self, global_start_time, global_end_time, steps_start_time, steps_end_time):
-        # Make bucket_size to 10-power's of us, and number of buckets to (10, 100].
-        # 10-power's of us, in order to straight forward for user to understand.
-        # If number of buckets are too many, the value of gpu utilization will be either 0 or 1.
-        def get_bucket_info(range_micro_seconds):
-            max_buckets = 100
-            bucket_size = 1
-            while range_micro_seconds / bucket_size > max_buckets:
-                bucket_size *= 10
-            buckets = int(range_micro_seconds / bucket_size)
-            unit = bucket_size
-            unit_str = 'us'
+    @staticmethod
+    def get_bucket_info(range_micro_seconds):
+        """Make bucket_size to 10-power's of us, and number of buckets to (10, 100].
+        10-power's of us, in order to straight forward for user to understand.
+        If number of buckets are too many, the value of gpu utilization will be either 0 or 1.
+        """
+        max_buckets = 100
+        bucket_size = 1
+        while range_micro_seconds / bucket_size > max_buckets:
+            bucket_size *= 10
+        buckets = int(range_micro_seconds / bucket_size)
+        unit = bucket_size
+        unit_str = 'us'
+        if unit >= 1000:
+            unit /= 1000
+            unit_str = 'ms'
             if unit >= 1000:
                 unit /= 1000
-                unit_str = 'ms'
-                if unit >= 1000:
-                    unit /= 1000
-                    unit_str = 's'
-            return int(bucket_size), int(buckets), int(unit), unit_str
+                unit_str = 's'
+        return int(bucket_size), int(buckets), int(unit), unit_str
 
-        gpu_utilization_timeline = [[] for _ in range(consts.MAX_GPU_PER_NODE)]
+    def calculate_gpu_utilization(self, global_start_time, global_end_time, steps_start_time, steps_end_time):
+        self.global_start_time = global_start_time
+        self.global_end_time = global_end_time
         for gpu_id in self.gpu_ids:
-            self.kernel_ranges_per_device[gpu_id] = merge_ranges(self.kernel_ranges_per_device[gpu_id])
+            kernel_intervals = IntervalSet.from_ranges(self.kernel_ranges_per_device[gpu_id])
+            self.kernel_intervals_per_device[gpu_id] = kernel_intervals
 
             # Top-level number still consider steps, to be consistent with overview's breakdown.
-            kernel_ranges_all_steps = intersection_ranges_lists(
-                self.kernel_ranges_per_device[gpu_id], [(steps_start_time, steps_end_time)])
-            ranges_sum = get_ranges_sum(kernel_ranges_all_steps)
+            ranges_sum = kernel_intervals.overlap([steps_start_time], [steps_end_time])[0].item()
             self.gpu_utilization[gpu_id] = ranges_sum / (steps_end_time - steps_start_time)
 
             # The timeline will use 'PyTorch Profiler (0)' as start,
             # in order to draw previous step's kernels' gpu utilization.
             bucket_size, buckets, self.gpu_util_timeline_unit_size, self.gpu_util_timeline_unit_name = \
-                get_bucket_info(global_end_time - global_start_time)
-            buckets_ranges = []
-            for i in range(buckets):
-                buckets_ranges.append((global_start_time + i * bucket_size,
-                                       global_start_time + (i + 1) * bucket_size if i < buckets - 1
-                                       else global_end_time))  # The last bucket may be longer.
-            gpu_utilization_timeline[gpu_id] = [0] * buckets
-            if len(self.kernel_ranges_per_device[gpu_id]) > 0:
-                current_range_index = 0
-                current_range = self.kernel_ranges_per_device[gpu_id][current_range_index]
-                current_bucket_index = 0
-                current_bucket = buckets_ranges[0]
-                while (current_range_index < len(self.kernel_ranges_per_device[gpu_id])
-                       and current_bucket_index < buckets):
-                    if current_bucket[1] <= current_range[0]:
-                        current_bucket_index += 1
-                        current_bucket = buckets_ranges[current_bucket_index] if current_bucket_index < buckets \
-                            else None
-                    elif current_bucket[0] >= current_range[1]:
-                        current_range_index += 1
-                        if current_range_index < len(self.kernel_ranges_per_device[gpu_id]):
-                            current_range = self.kernel_ranges_per_device[gpu_id][current_range_index]
-                    else:
-                        left_bound = max(current_range[0], current_bucket[0])
-                        right_bound = min(current_range[1], current_bucket[1])
-                        gpu_utilization_timeline[gpu_id][current_bucket_index] += (right_bound - left_bound)
-                        if current_bucket[1] < current_range[1]:
-                            current_bucket_index += 1
-                            current_bucket = buckets_ranges[current_bucket_index] if current_bucket_index < buckets \
-                                else None
-                        else:
-                            current_range_index += 1
-                            if current_range_index < len(self.kernel_ranges_per_device[gpu_id]):
-                                current_range = self.kernel_ranges_per_device[gpu_id][current_range_index]
-                for i_bucket in range(buckets):
-                    bucket_size = buckets_ranges[i_bucket][1] - buckets_ranges[i_bucket][0]
-                    gpu_utilization_timeline[gpu_id][i_bucket] /= bucket_size
-                    start_time = buckets_ranges[i_bucket][0]
-                    self.gpu_util_buckets[gpu_id].append((start_time, gpu_utilization_timeline[gpu_id][i_bucket]))
-                start_time = buckets_ranges[-1][1]
-                self.gpu_util_buckets[gpu_id].append((start_time, 0))
+                self.get_bucket_info(global_end_time - global_start_time)
+            if len(kernel_intervals) > 0 and buckets > 0:
+                edges = [global_start_time + i * bucket_size for i in range(buckets)]
+                edges.append(global_end_time)  # The last bucket may be longer.
+                self.gpu_util_buckets[gpu_id] = self.get_gpu_util_timeline(gpu_id, edges)
 
         self.kernel_ranges_per_device = None  # Release memory.
 
+    def get_gpu_util_timeline(self, gpu_id: int, edges: List[int]) -> List[Tuple[int, float]]:
+        """Return the GPU utilization of the buckets [edges[i], edges[i + 1]) of any number and sizes,
+        as the list of (bucket start time, utilization), followed by (last edge, 0).
+        """
+        kernel_intervals = self.kernel_intervals_per_device[gpu_id]
+        if kernel_intervals is None or len(edges) < 2:
+            return []
+        edges = np.asarray(edges)
+        busy_time = np.diff(kernel_intervals.coverage(edges))
+        utilization = busy_time / np.diff(edges)
+        buckets = list(zip(edges[:-1].tolist(), utilization.tolist()))
+        buckets.append((edges[-1].item(), 0))
+        return buckets
+
+    def _get_bucket_counters(self, gpu_id: int, edges: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Return the GPU utilization and the time-weighted Est. SM efficiency of the buckets between the edges."""
+        durations = np.diff(edges)
+        gpu_util = np.diff(self.kernel_intervals_per_device[gpu_id].coverage(edges)) / durations
+        sm_efficiency = None
+        if self.sm_efficiency_per_device[gpu_id] is not None:
+            sm_efficiency = np.diff(coverage_with_value(*self.sm_efficiency_per_device[gpu_id], edges)) / durations
+        return gpu_util, sm_efficiency
+
+    @staticmethod
+    def _get_bucket_edges(start_time, end_time, buckets: int) -> np.ndarray:
+        offsets = np.arange(buckets + 1) * (end_time - start_time)
+        if np.issubdtype(offsets.dtype, np.integer):
+            edges = start_time + offsets // buckets
+        else:
+            edges = start_time + offsets / buckets
+        # the buckets of a range shorter than their number would be empty.
+        return np.unique(edges)
+
+    def build_counter_pyramid(self):
+        """Precompute the counters of the trace view at each of COUNTER_RESOLUTIONS from the merged ranges."""
+        self.counter_pyramid = []
+        if not self.gpu_ids or self.global_end_time <= self.global_start_time:
+            return
+        for resolution in self.COUNTER_RESOLUTIONS:
+            level = _CounterLevel(self._get_bucket_edges(self.global_start_time, self.global_end_time, resolution))
+            for gpu_id in self.gpu_ids:
+                level.gpu_util[gpu_id], sm_efficiency = self._get_bucket_counters(gpu_id, level.edges)
+                if sm_efficiency is not None:
+                    level.sm_efficiency[gpu_id] = sm_efficiency
+            self.counter_pyramid.append(level)
+
+    def get_gpu_counters(self, start_time=None, end_time=None, resolution: int = COUNTER_RESOLUTIONS[0]) -> List[Dict]:
+        """Return the 'GPU Utilization' and 'Est. SM Efficiency' counter events of the trace view within the
+        window [start_time, end_time), with at least resolution buckets in the window if possible.
+        The buckets come from the coarsest level of counter_pyramid which is fine enough, or are calculated
+        from the merged ranges if the window is zoomed in beyond the finest level.
+        """
+        if not self.counter_pyramid:
+            return []
+        start_time = self.global_start_time if start_time is None else max(start_time, self.global_start_time)
+        end_time = self.global_end_time if end_time is None else min(end_time, self.global_end_time)
+        if end_time <= start_time:
+            return []
+        resolution = min(max(resolution, 1), self.COUNTER_RESOLUTIONS[-1])
+
+        for level in self.counter_pyramid:
+            # the buckets [first, last) overlap the window.
+            first = max(np.searchsorted(level.edges, start_time, side='right') - 1, 0)
+            last = min(np.searchsorted(level.edges, end_time, side='left'), len(level.edges) - 1)
+            if last - first >= resolution:
+                edges = level.edges[first:last + 1]
+                gpu_util = {gpu_id: util[first:last] for gpu_id, util in level.gpu_util.items()}
+                sm_efficiency = {gpu_id: value[first:last] for gpu_id, value in level.sm_efficiency.items()}
+                break
+        else:
+            edges = self._get_bucket_edges(start_time, end_time, resolution)
+            gpu_util, sm_efficiency = {}, {}
+            for gpu_id in self.gpu_ids:
+                gpu_util[gpu_id], value = self._get_bucket_counters(gpu_id, edges)
+                if value is not None:
+                    sm_efficiency[gpu_id] = value
+
+        edges = edges.tolist()
+
+        def add_counters(name, arg_name, gpu_id, values, counters: List):
+            # Adding 1 as baseline. To avoid misleading virtualization when the max value is less than 1.
+            timeline = [(edges[0], 1), (edges[0], 0)]
+            timeline.extend(zip(edges, values.tolist()))
+            timeline.append((edges[-1], 0))
+            for ts, value in timeline:
+                counters.append({'ph': 'C', 'name': name.format(gpu_id), 'pid': gpu_id, 'ts': ts,
+                                 'args': {arg_name: value}})
+
+        counters = []
+        for gpu_id in sorted(gpu_util):
+            add_counters('GPU {} Utilization', 'GPU Utilization', gpu_id, gpu_util[gpu_id], counters)
+        for gpu_id in sorted(sm_efficiency):
+            add_counters('GPU {} Est. SM Efficiency', 'Est. SM Efficiency', gpu_id, sm_efficiency[gpu_id], counters)
+        return counters
+
     def calculate_approximated_sm_efficiency(self, steps_start_time, steps_end_time):
         def calculate_avg(approximated_sm_efficiency_ranges, total_dur):
             total_weighted_sm_efficiency = 0.0
@@ -135,6 +221,8 @@ class GPUMetricsParser:
             # The timeline still uses all kernels including out of steps scope's.
             if len(approximated_sm_efficiency_ranges) > 0:
                 self.approximated_sm_efficiency_ranges[gpu_id] = approximated_sm_efficiency_ranges
+                self.sm_efficiency_per_device[gpu_id] = tuple(
+                    np.asarray(column) for column in zip(*approximated_sm_efficiency_ranges))
 
         self.blocks_per_sm_per_device = None  # Release memory.
 
@@ -154,49 +242,56 @@ class GPUMetricsParser:
             if total_time > 0:
                 self.avg_occupancy_per_device[gpu_id] = total_occupancy / total_time
 
+        self.occupancy_per_device = None  # Release memory.
+
     @classmethod
     def parse_events(cls,
-                     events: Iterable[BaseEvent],
+                     events: EventTable,
                      global_start_time: int,
                      global_end_time: int,
                      steps_start_time: int,
                      steps_end_time: int):
         parser = GPUMetricsParser()
         logger.debug('GPU Metrics, parse events')
-        for event in events:
-            if event.type == EventTypes.KERNEL:
-                parser.parse_event(event)
+        rows = events.rows([EventTypes.KERNEL])
+        kernels = zip(events.ts[rows].tolist(),
+                      events.duration[rows].tolist(),
+                      events.ids_of(events.pid[rows]).tolist(),
+                      events.type_args(EventTypes.KERNEL, 'device', rows),
+                      events.type_args(EventTypes.KERNEL, 'blocks per SM', rows),
+                      events.type_args(EventTypes.KERNEL, 'est. achieved occupancy %', rows))
+        for kernel in kernels:
+            parser.parse_kernel(*kernel)
 
         parser.calculate_gpu_utilization(global_start_time, global_end_time, steps_start_time, steps_end_time)
         parser.calculate_approximated_sm_efficiency(steps_start_time, steps_end_time)
         parser.calculate_occupancy(steps_start_time, steps_end_time)
+        parser.build_counter_pyramid()
         return parser
 
-    def parse_event(self, event: KernelEvent):
-        ts = event.ts
-        dur = event.duration
-        gpu_id = event.device_id
-        if gpu_id != event.pid:
+    def parse_kernel(self, ts: int, dur: int, pid: int, gpu_id: Optional[int],
+                     blocks_per_sm: Optional[float], occupancy: Optional[float]):
+        if gpu_id != pid:
             logger.warning("pid '{}' is not equal to args.device '{}' on event with ts '{}'".format(
-                event.pid, gpu_id, event.ts))
+                pid, gpu_id, ts))
         if gpu_id is not None:
             if gpu_id not in self.gpu_ids:
                 self.gpu_ids.add(gpu_id)
             self.kernel_ranges_per_device[gpu_id].append((ts, ts + dur))
-            if event.blocks_per_sm is not None:
-                if event.blocks_per_sm > 0.0:
-                    self.blocks_per_sm_per_device[gpu_id].append((ts, ts + dur, event.blocks_per_sm))
+            if blocks_per_sm is not None:
+                if blocks_per_sm > 0.0:
+                    self.blocks_per_sm_per_device[gpu_id].append((ts, ts + dur, blocks_per_sm))
                     self.blocks_per_sm_count[gpu_id] += 1
                 else:
                     # Workaround for negative value input.
-                    logger.warning('blocks per SM {} with ts {} is not positive!'.format(event.blocks_per_sm, ts))
-            if event.occupancy is not None:
-                if event.occupancy >= 0.0:
-                    self.occupancy_per_device[gpu_id].append((ts, ts + dur, event.occupancy))
+                    logger.warning('blocks per SM {} with ts {} is not positive!'.format(blocks_per_sm, ts))
+            if occupancy is not None:
+                if occupancy >= 0.0:
+                    self.occupancy_per_device[gpu_id].append((ts, ts + dur, occupancy))
                     self.occupancy_count[gpu_id] += 1
                 else:
                     # Workaround for negative value input.
-                    logger.warning('est. achieved occupancy % {} with ts {} is negative!'.format(event.occupancy, ts))
+                    logger.warning('est. achieved occupancy % {} with ts {} is negative!'.format(occupancy, ts))
 
     def get_gpu_metrics_columns(self):
         columns = []
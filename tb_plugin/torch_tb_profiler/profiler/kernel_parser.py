@@ -6,6 +6,7 @@ from typing import Optional
 import numpy as np
 import pandas as pd
 
+from .event_table import EventTable
 from .tensor_core import TC_Allowlist
 from .trace import EventTypes
 
@@ -15,11 +16,20 @@ class KernelParser:
         self.kernel_stat: Optional[pd.DataFrame] = None
         self.tc_used_ratio = 0.0
 
-    def parse_events(self, events):
-        events = [vars(event) for event in events if event.type == EventTypes.KERNEL]
-        events = pd.DataFrame(events)
-        events = events.astype({'type': 'category', 'name': 'string'}, copy=False)
-        events['tc_used'] = events['name'].map(lambda name: name in TC_Allowlist)
+    def parse_events(self, events: EventTable):
+        rows = events.rows([EventTypes.KERNEL])
+
+        def float_args(key):
+            return np.array([np.nan if v is None else v for v in events.type_args(EventTypes.KERNEL, key, rows)],
+                            dtype=float)
+
+        tc_used = np.array([name in TC_Allowlist for name in events.names], dtype=bool)
+        events = pd.DataFrame({
+            'name': pd.array(events.names_of(rows), dtype='string'),
+            'duration': events.duration[rows],
+            'blocks_per_sm': float_args('blocks per SM'),
+            'occupancy': float_args('est. achieved occupancy %'),
+            'tc_used': tc_used[events.name[rows]]})
 
         def weighted_avg(x: pd.Series):
             try:
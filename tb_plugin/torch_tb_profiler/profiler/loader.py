@@ -5,25 +5,48 @@
 import bisect
 import os
 import sys
-from collections import defaultdict
-from typing import List, Tuple
+import tempfile
+import time
+from collections import defaultdict, deque
+from multiprocessing.connection import Connection, wait
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from .. import consts, io, utils
-from ..multiprocessing import Process, Queue
+from ..multiprocessing import Pipe, Process, get_memory_budget, get_num_processes
 from ..run import Run, RunProfile
+from . import shared_file, trace_stream
 from .data import DistributedRunProfileData, RunProfileData
 from .node import CommunicationNode
+from .profile_cache import ProfileCache
 from .run_generator import DistributedRunGenerator, RunGenerator
+from .trace_index import TraceIndex
 
 logger = utils.get_logger()
 
+# The memory taken to load a trace file is estimated from its size on disk.
+_GZIP_MEMORY_RATIO = 100
+_JSON_MEMORY_RATIO = 4
+# The time to wait for the loading processes to exit once the files are loaded.
+_JOIN_SECONDS = 10
+# The trace files of at least this size are indexed at load time, the others on the first request of a window.
+_TRACE_INDEX_MB = 64
+
+
+def _get_trace_index_size() -> Optional[int]:
+    """The minimum size in bytes of the trace files indexed at load time, None if disabled."""
+    try:
+        size_mb = int(os.getenv('TORCH_PROFILER_TRACE_INDEX_MB', _TRACE_INDEX_MB))
+    except ValueError:
+        size_mb = _TRACE_INDEX_MB
+    return size_mb * 1024 * 1024 if size_mb >= 0 else None
+
 
 class RunLoader:
     def __init__(self, name, run_dir, caches: io.Cache):
         self.run_name = name
         self.run_dir = run_dir
         self.caches = caches
-        self.queue = Queue()
+        self.profile_cache = ProfileCache.from_env()
 
     def load(self):
         workers = []
@@ -49,22 +72,17 @@ class RunLoader:
             for i, span in enumerate(span_array, 1):
                 span_index_map[(worker, span)] = i
 
+        tasks = []
         for worker, span, path in workers:
             # convert the span timestamp to the index.
             span_index = None if span is None else span_index_map[(worker, span)]
-            p = Process(target=self._process_data, args=(worker, span_index, path))
-            p.start()
-        logger.info('started all processing')
+            tasks.append((worker, span_index, path))
 
         distributed_run = Run(self.run_name, self.run_dir)
         run = Run(self.run_name, self.run_dir)
-        num_items = len(workers)
-        while num_items > 0:
-            item: Tuple[RunProfile, DistributedRunProfileData] = self.queue.get()
-            num_items -= 1
-            r, d = item
+        for r, d in self._process_tasks(tasks):
             if r or d:
-                logger.debug('Loaded profile via mp.Queue')
+                logger.debug('Loaded profile via mp.Pipe')
             if r is not None:
                 run.add_profile(r)
             if d is not None:
@@ -75,34 +93,193 @@ class RunLoader:
             if d is not None:
                 run.add_profile(d)
 
-        # for no daemon process, no need to join them since it will automatically join
         return run
 
-    def _process_data(self, worker, span, path):
+    def _process_tasks(self, tasks: List[Tuple[str, Optional[int], str]]) \
+            -> Iterator[Tuple[Optional[RunProfile], Optional[DistributedRunProfileData]]]:
+        """Load the trace files by a pool of processes, yield the results in the order of completion.
+
+        A file is sent to an idle process through its own pipe, and only when its estimated memory fits into
+        the budget together with the files being loaded. The pipes are not shared, so a process which exits
+        while loading a file, e.g. killed for out of memory, only loses that file and is replaced.
+        """
+        num_processes = min(get_num_processes(), len(tasks))
+        memory_budget = get_memory_budget()
+        idle = [self._start_process() for _ in range(num_processes)]
+        logger.info('started %d processes to load %d files' % (num_processes, len(tasks)))
+
+        pending = deque((task, self._estimate_memory(task[2]) if memory_budget else 0) for task in tasks)
+        # the process, the path and the estimated memory of the file being loaded by the pipe of the process.
+        running: Dict[Connection, Tuple[Process, str, int]] = {}
+
+        def submit():
+            while pending and idle:
+                task, memory = pending[0]
+                if running and memory_budget and sum(m for _, _, m in running.values()) + memory > memory_budget:
+                    logger.debug('Postpone %s to keep the memory in the budget' % task[2])
+                    break
+                pending.popleft()
+                process, conn = idle.pop()
+                if not process.is_alive():
+                    conn.close()
+                    process, conn = self._start_process()
+                running[conn] = (process, task[2], memory)
+                try:
+                    conn.send(task)
+                except OSError:
+                    # the process has just exited, the pipe is reported at the end of file by wait.
+                    pass
+
+        try:
+            submit()
+            while running:
+                for conn in wait(list(running)):
+                    process, path, _ = running.pop(conn)
+                    try:
+                        result_file = conn.recv()
+                    except EOFError:
+                        conn.close()
+                        process.join()
+                        logger.error('The process loading %s of run %s exited with code %s, the file is not loaded'
+                                     % (path, self.run_name, process.exitcode))
+                        idle.append(self._start_process())
+                        submit()
+                        yield None, None
+                        continue
+
+                    idle.append((process, conn))
+                    submit()
+                    if result_file is None:
+                        yield None, None
+                        continue
+                    try:
+                        yield shared_file.load(result_file, remove=True)
+                    except Exception as ex:
+                        logger.warning('Failed to receive the profile data of %s. Exception=%s',
+                                       path, ex, exc_info=True)
+                        yield None, None
+        finally:
+            workers = idle + [(process, conn) for conn, (process, _, _) in running.items()]
+            for _, conn in workers:
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+                conn.close()
+            # the idle processes exit on None, the busy ones are only left if the load is abandoned.
+            deadline = time.monotonic() + _JOIN_SECONDS
+            for process, _ in workers:
+                process.join(max(deadline - time.monotonic(), 0))
+                if process.is_alive():
+                    logger.warning('Terminate the process %d which does not exit' % process.pid)
+                    process.terminate()
+                    process.join()
+
+    def _start_process(self) -> Tuple[Process, Connection]:
+        conn, child_conn = Pipe()
+        process = Process(target=self._process_loop, args=(child_conn,))
+        process.start()
+        child_conn.close()
+        return process, conn
+
+    def _estimate_memory(self, path: str) -> int:
+        try:
+            size = io.stat(io.join(self.run_dir, path)).length
+        except Exception:
+            return 0
+        return size * (_GZIP_MEMORY_RATIO if path.endswith('.gz') else _JSON_MEMORY_RATIO)
+
+    def _process_loop(self, conn: Connection):
+        while True:
+            try:
+                task = conn.recv()
+            except EOFError:
+                # the main process exited.
+                break
+            if task is None:
+                break
+            conn.send(self._process_data(*task))
+
+    def _process_data(self, worker, span, path) -> Optional[str]:
+        """Load the trace file, return the path of the file which has the profile data, None if it failed."""
         import absl.logging
         absl.logging.use_absl_handler()
 
         try:
             logger.debug('Parse trace, run_dir=%s, worker=%s', self.run_dir, path)
             local_file = self.caches.get_remote_cache(io.join(self.run_dir, path))
-            data = RunProfileData.parse(worker, span, local_file, self.caches.cache_dir)
-            if data.trace_file_path != local_file:
-                self.caches.add_file(local_file, data.trace_file_path)
+            cache_key = None
+            cached = None
+            if self.profile_cache is not None:
+                cache_key = self.profile_cache.key(worker, span, io.join(self.run_dir, path), local_file)
+                cached = self.profile_cache.get(cache_key, local_file)
+
+            if cached is not None:
+                logger.debug('Load profile from the profile cache, worker=%s', path)
+                profile, dist_data = cached
+            else:
+                data = RunProfileData.parse(worker, span, local_file, self.caches.cache_dir)
+                generator = RunGenerator(worker, span, data)
+                profile = generator.generate_run_profile()
+                dist_data = DistributedRunProfileData(data)
+                if profile.has_kernel:
+                    self._append_gpu_metrics(profile, local_file)
+                index_size = _get_trace_index_size()
+                if index_size is not None and os.path.getsize(local_file) >= index_size:
+                    self._build_trace_index(profile)
+                if cache_key is not None:
+                    self.profile_cache.put(cache_key, profile, dist_data, local_file)
 
-            generator = RunGenerator(worker, span, data)
-            profile = generator.generate_run_profile()
-            dist_data = DistributedRunProfileData(data)
+            if profile.trace_file_path != local_file:
+                self.caches.add_file(local_file, profile.trace_file_path)
 
-            logger.debug('Sending back profile via mp.Queue')
-            self.queue.put((profile, dist_data))
+            # only the path of the file is sent through the pipe, see shared_file.
+            fd, result_file = tempfile.mkstemp(prefix='profile_', suffix='.tmp', dir=self.caches.cache_dir)
+            with os.fdopen(fd, 'wb') as f:
+                shared_file.dump((profile, dist_data), f)
+            logger.debug('Sending back profile via mp.Pipe')
+            return result_file
         except KeyboardInterrupt:
             logger.warning('tb_plugin receive keyboard interrupt signal, process %d will exit' % (os.getpid()))
             sys.exit(1)
         except Exception as ex:
             logger.warning('Failed to parse profile data for Run %s on %s. Exception=%s',
                            self.run_name, worker, ex, exc_info=True)
-            self.queue.put((None, None))
-        logger.debug('finishing process data')
+            return None
+
+    def _append_gpu_metrics(self, profile: RunProfile, local_file: str):
+        """Write the trace file served to the trace view, which has the GPU metrics counters appended,
+        so that the first request of the trace only reads the file.
+        """
+        fd, trace_file = tempfile.mkstemp(suffix='.json.gz', dir=self.caches.cache_dir)
+        try:
+            with utils.timing('Append GPU metrics'), os.fdopen(fd, 'wb') as f:
+                tail, has_events = trace_stream.write_trace_body(profile.trace_file_path, f)
+                # not through profile.gpu_metrics, which would keep the counters in memory.
+                counters = profile.view_generator.generate_view('gpu_metrics')
+                trace_stream.append_trace_events(f, counters, tail, has_events)
+        except Exception as ex:
+            # leave it to the first request of the trace.
+            logger.warning('Failed to append the GPU metrics to %s. Exception=%s', profile.trace_file_path, ex)
+            os.remove(trace_file)
+            return
+
+        if profile.trace_file_path != local_file:
+            # the temporary file re-encoded by RunProfileData.parse.
+            os.remove(profile.trace_file_path)
+        profile.trace_file_path = trace_file
+        profile.trace_has_gpu_metrics = True
+
+    def _build_trace_index(self, profile: RunProfile):
+        fd, data_path = tempfile.mkstemp(suffix='.trace.index', dir=self.caches.cache_dir)
+        os.close(fd)
+        try:
+            with utils.timing('Build trace index'):
+                profile.trace_index = TraceIndex.build(profile.trace_file_path, data_path)
+        except Exception as ex:
+            # the windows of the trace are served by the index built on request.
+            logger.warning('Failed to index the trace file %s. Exception=%s', profile.trace_file_path, ex)
+            os.remove(data_path)
 
     def _process_spans(self, distributed_run: Run):
         spans = distributed_run.get_spans()
@@ -5,10 +5,13 @@ from collections import defaultdict
 from enum import IntEnum
 from typing import Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
+
 from .. import utils
 from .node import OperatorNode, is_operator_node
-from .op_agg import aggregate_ops
-from .trace import DeviceType, MemoryEvent
+from .op_index import OperatorIndex
+from .event_table import EventTable
+from .trace import DeviceType, EventTypes, MemoryEvent
 
 logger = utils.get_logger()
 
@@ -61,20 +64,393 @@ class MemoryRecord:
         return cls(event.scope, event.pid, event.tid, event.ts, event.device_type, event.device_id,
                    event.addr, event.bytes, event.total_allocated, event.total_reserved)
 
+    @classmethod
+    def from_table(cls, events: EventTable) -> List['MemoryRecord']:
+        """Create the records of the memory events of the table from its columns, in the order of time."""
+        rows = events.rows([EventTypes.MEMORY])
+
+        def args(key):
+            return events.type_args(EventTypes.MEMORY, key, rows)
+
+        def device_type(value):
+            try:
+                return DeviceType(value) if value is not None else None
+            except ValueError:
+                return None
+
+        nan = float('nan')
+        return [cls(scope, pid, tid, ts, device_type(dtype), device_id, addr,
+                    0 if size is None else size,
+                    nan if allocated is None else allocated,
+                    nan if reserved is None else reserved)
+                for scope, pid, tid, ts, dtype, device_id, addr, size, allocated, reserved in zip(
+                    events.scopes_of(rows), events.ids_of(events.pid[rows]).tolist(),
+                    events.ids_of(events.tid[rows]).tolist(), events.ts[rows].tolist(), args('Device Type'),
+                    args('Device Id'), args('Addr'), args('Bytes'), args('Total Allocated'), args('Total Reserved'))]
+
     def __repr__(self) -> str:
         return f"<{'+' if self.bytes>0 else ''}{self.bytes}B, addr: {self.addr}, ts: {self.ts}>"
 
 
+class MemoryRecordStore:
+    """The columnar store of the memory records, to answer the time window queries of the Memory view.
+
+    The records are kept in the order of time together with the NumPy columns of their time, bytes, address,
+    device and operator, a window is located by binary search. The records of every (operator, device) are
+    also kept as a time ordered segment with the prefix sums of their self metrics, so the self metrics of
+    an operator within a window are the differences of the prefix sums at the window boundaries.
+    """
+
+    def __init__(self, records: List[MemoryRecord], op_memory_table: Dict[OperatorNode, List[MemoryRecord]]):
+        """The records must be ordered by time, the op_memory_table maps an operator to its records."""
+        self.records = records
+        count = len(records)
+        self.ts = np.array([r.ts for r in records], dtype=np.float64)
+        self.bytes = np.array([r.bytes for r in records], dtype=np.int64)
+        # -1 for the records without address.
+        self.addr = np.array([-1 if r.addr is None else r.addr for r in records], dtype=np.int64)
+        # the index of the device name in device_names, -1 for the unknown devices.
+        self.device_names: List[str] = []
+        self.device = np.full(count, -1, dtype=np.int32)
+        device_codes: Dict[str, int] = {}
+        for i, r in enumerate(records):
+            name = r.device_name
+            if name is not None:
+                self.device[i] = device_codes.setdefault(name, len(device_codes))
+        self.device_names = list(device_codes)
+        # the index of the operator in ops, -1 for the records not associated with an operator.
+        self.ops: List[OperatorNode] = list(op_memory_table)
+        self.op = np.full(count, -1, dtype=np.int32)
+        positions = {id(r): i for i, r in enumerate(records)}
+        for op_index, op_records in enumerate(op_memory_table.values()):
+            self.op[[positions[id(r)] for r in op_records]] = op_index
+
+        self._build_op_segments()
+        self._pair_allocations()
+
+    def _build_op_segments(self):
+        selected = np.flatnonzero((self.op >= 0) & (self.device >= 0))
+        # the sort is stable, the records of a segment remain in the order of time.
+        order = selected[np.lexsort((self.device[selected], self.op[selected]))]
+        self._segment_ts = self.ts[order]
+        sizes = self.bytes[order]
+        is_allocation = sizes > 0
+
+        def prefix_sum(values):
+            return np.concatenate(([0], np.cumsum(values, dtype=np.int64)))
+
+        # the prefix sums of SelfIncreaseSize, SelfAllocationSize and SelfAllocationCount.
+        self._prefix_sums = np.stack((prefix_sum(sizes),
+                                      prefix_sum(np.where(is_allocation, sizes, 0)),
+                                      prefix_sum(is_allocation)))
+
+        ops = self.op[order]
+        devices = self.device[order]
+        starts = np.flatnonzero(np.diff(ops, prepend=-1) | np.diff(devices, prepend=-1))
+        ends = np.append(starts[1:], len(order))
+        self._op_segments: Dict[OperatorNode, List[Tuple[str, int, int]]] = {}
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            self._op_segments.setdefault(self.ops[ops[start]], []).append(
+                (self.device_names[devices[start]], start, end))
+
+    def _pair_allocations(self):
+        """Pair every release with the allocation of its address, which is the previous record of the address
+        if it is an allocation. A later allocation of the same address before the release replaces an earlier one.
+        """
+        count = len(self.records)
+        self.is_allocation = self.bytes > 0
+        with_addr = np.flatnonzero(self.addr >= 0)
+        # the records of every address in the order of time.
+        order = with_addr[np.lexsort((with_addr, self.addr[with_addr]))]
+        same = self.addr[order[1:]] == self.addr[order[:-1]]
+        # the previous and the next record of the same address, -1 and count if there is none.
+        self.previous = np.full(count, -1, dtype=np.int64)
+        self.previous[order[1:][same]] = order[:-1][same]
+        self.next = np.full(count, count, dtype=np.int64)
+        self.next[order[:-1][same]] = order[1:][same]
+
+        self._with_addr = self.addr >= 0
+        releases = np.flatnonzero(self._with_addr & ~self.is_allocation)
+        partners = self.previous[releases]
+        paired = partners >= 0
+        paired[paired] = self.is_allocation[partners[paired]]
+        # the allocation and release indices of the pairs in the order of release.
+        self.free_idx = releases[paired]
+        self.alloc_idx = partners[paired]
+
+    def get_allocations(self, start_ts: Optional[float] = None,
+                        end_ts: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Return the allocations and releases within [start_ts, end_ts] as record indices, paired only if
+        both of them are in the window: the allocation and release indices of the pairs in the order of
+        release, the unpaired allocations and the unpaired releases.
+
+        An address allocated again before its release keeps only the last allocation, an address released
+        more than once without allocation keeps only the last release. The unpaired records are ordered by
+        the first of the records their address kept in the window.
+        """
+        begin, end = self.window(start_ts, end_ts)
+        first, last = np.searchsorted(self.free_idx, [begin, end], side='left').tolist()
+        alloc_idx, free_idx = self.alloc_idx[first:last], self.free_idx[first:last]
+        in_window = alloc_idx >= begin
+
+        window_records = begin + np.flatnonzero(self._with_addr[begin:end])
+        allocations = window_records[self.is_allocation[window_records]]
+        allocations = allocations[self.next[allocations] >= end]
+        # the first allocation of the consecutive allocations of the address in the window.
+        firsts = allocations.copy()
+        while True:
+            previous = self.previous[firsts]
+            step = previous >= begin
+            step[step] = self.is_allocation[previous[step]]
+            if not step.any():
+                break
+            firsts[step] = previous[step]
+        allocations = allocations[np.argsort(firsts, kind='stable')]
+
+        releases = window_records[~self.is_allocation[window_records]]
+        partners = self.previous[releases]
+        paired = partners >= begin
+        paired[paired] = self.is_allocation[partners[paired]]
+        releases = releases[~paired]
+        addrs, first_releases, counts = np.unique(self.addr[releases], return_index=True, return_counts=True)
+        last_releases = len(releases) - 1 - np.unique(self.addr[releases][::-1], return_index=True)[1]
+        for addr, repeats in zip(addrs[counts > 1].tolist(), counts[counts > 1].tolist()):
+            for _ in range(repeats - 1):
+                logger.warning(f'Address {addr} is freed multiple times')
+        releases = releases[last_releases[np.argsort(first_releases, kind='stable')]]
+
+        return alloc_idx[in_window], free_idx[in_window], allocations, releases
+
+    def __len__(self):
+        return len(self.records)
+
+    def window(self, start_ts: Optional[float] = None, end_ts: Optional[float] = None) -> Tuple[int, int]:
+        """Return the [begin, end) range of the records within [start_ts, end_ts]."""
+        begin = 0 if start_ts is None else int(np.searchsorted(self.ts, start_ts, side='left'))
+        end = len(self.ts) if end_ts is None else int(np.searchsorted(self.ts, end_ts, side='right'))
+        return begin, max(begin, end)
+
+    def get_records(self, start_ts: Optional[float] = None, end_ts: Optional[float] = None) -> List[MemoryRecord]:
+        """Return the time ordered records within [start_ts, end_ts]."""
+        begin, end = self.window(start_ts, end_ts)
+        return self.records[begin:end]
+
+    def get_op_metrics(self, op: OperatorNode, start_ts: Optional[float] = None,
+                       end_ts: Optional[float] = None) -> Dict[str, List[int]]:
+        """Return the self metrics of the operator keyed by device name, in the order of SelfIncreaseSize,
+        SelfAllocationSize and SelfAllocationCount. Only the devices with records in the window are included.
+        """
+        metrics: Dict[str, List[int]] = {}
+        for device_name, start, end in self._op_segments.get(op, ()):
+            begin, stop = start, end
+            if start_ts is not None:
+                begin += int(np.searchsorted(self._segment_ts[start:end], start_ts, side='left'))
+            if end_ts is not None:
+                stop = start + int(np.searchsorted(self._segment_ts[start:end], end_ts, side='right'))
+            if begin < stop:
+                metrics[device_name] = (self._prefix_sums[:, stop] - self._prefix_sums[:, begin]).tolist()
+        return metrics
+
+
+class MemoryStatisticsIndex:
+    """The metrics of the Memory view statistics of every (device, operator name) within any time window.
+
+    A record contributes to the self metrics of the operator name it is associated with, and to the
+    metrics of the names of its operator and all the ancestor operators, counted once per ancestor. The
+    contributions of every (device, name) are kept in the order of time with their prefix sums, so the
+    statistics of a window come from two binary searches per (device, name) instead of a walk of the trees.
+    The calls of a name are the operators of it which overlap the window.
+    """
+
+    def __init__(self, record_store: MemoryRecordStore, tid2tree: Dict[int, OperatorNode],
+                 processed_nodes: Dict[OperatorNode, int],
+                 operator_indices: Optional[Dict[int, Optional[OperatorIndex]]] = None):
+        """operator_indices are the indices of the trees, the trees not in it are indexed here."""
+        self.tid2tree = tid2tree
+        self.names: List[str] = []
+        # the nodes which are not visited by the memory records, their children are not counted.
+        self.unreached_nodes: Dict[int, List[OperatorNode]] = defaultdict(list)
+
+        name_codes: Dict[str, int] = {}
+        op_indices = {op: i for i, op in enumerate(record_store.ops)}
+        # the name codes of each operator of the record store followed by its ancestor operators.
+        op_chains: List[List[int]] = [[] for _ in record_store.ops]
+        # the (name code, start, end) of the operators, the time range is limited by the ancestors.
+        calls: List[Tuple[int, float, float]] = []
+        for tid, root in tid2tree.items():
+            index = operator_indices.get(tid) if operator_indices is not None and tid in operator_indices \
+                else OperatorIndex.build(root)
+            if index is not None:
+                self._visit_index(tid, index, processed_nodes, name_codes, op_indices, op_chains, calls)
+                continue
+            # the tree which is not indexed is visited node by node.
+            stack = [(child, [], float('-inf'), float('inf')) for child in reversed(root.children)]
+            while stack:
+                node, chain, start, end = stack.pop()
+                start = max(start, node.start_time if node.start_time is not None else float('-inf'))
+                end = min(end, node.end_time if node.end_time is not None else float('inf'))
+                if is_operator_node(node):
+                    code = name_codes.setdefault(node.name, len(name_codes))
+                    calls.append((code, start, end))
+                    chain = [code] + chain
+                if node not in processed_nodes:
+                    self.unreached_nodes[tid].append(node)
+                    continue
+                op_index = op_indices.get(node)
+                if op_index is not None:
+                    op_chains[op_index] = chain
+                stack.extend((child, chain, start, end) for child in reversed(node.children))
+        self.names = list(name_codes)
+
+        self._build_contributions(record_store, op_chains)
+        self._build_calls(calls)
+
+    def _visit_index(self, tid: int, index: OperatorIndex, processed_nodes: Dict[OperatorNode, int],
+                     name_codes: Dict[str, int], op_indices: Dict[OperatorNode, int],
+                     op_chains: List[List[int]], calls: List[Tuple[int, float, float]]):
+        """Visit the nodes of an indexed tree below its root in pre-order, the descendants of the unreached
+        nodes are skipped as a range. The nodes are contained in their parents, so are their time ranges.
+        """
+        nodes = index.nodes
+        parents = index.parents.tolist()
+        starts = index.starts.tolist()
+        ends = index.ends.tolist()
+        subtree_ends = index.subtree_ends.tolist()
+        chains: List[List[int]] = [[]] * len(nodes)
+        i = 1
+        while i < len(nodes):
+            node = nodes[i]
+            chain = chains[parents[i]]
+            if is_operator_node(node):
+                code = name_codes.setdefault(node.name, len(name_codes))
+                calls.append((code, starts[i], ends[i]))
+                chain = [code] + chain
+            if node not in processed_nodes:
+                self.unreached_nodes[tid].append(node)
+                i = subtree_ends[i]
+                continue
+            op_index = op_indices.get(node)
+            if op_index is not None:
+                op_chains[op_index] = chain
+            chains[i] = chain
+            i += 1
+
+    def _build_contributions(self, record_store: MemoryRecordStore, op_chains: List[List[int]]):
+        self.device_names = record_store.device_names
+        chain_lengths = np.array([len(chain) for chain in op_chains] + [0], dtype=np.int64)
+        chain_offsets = np.concatenate(([0], np.cumsum(chain_lengths)))
+        chain_codes = np.array([code for chain in op_chains for code in chain], dtype=np.int64)
+
+        # the records of the known devices which are associated with the reached operators.
+        record_ops = record_store.op.astype(np.int64)
+        record_ops[record_ops < 0] = len(op_chains)
+        selected = np.flatnonzero((record_store.device >= 0) & (chain_lengths[record_ops] > 0))
+        repeats = chain_lengths[record_ops[selected]]
+        records = np.repeat(selected, repeats)
+        depths = np.arange(len(records)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        codes = chain_codes[np.repeat(chain_offsets[record_ops[selected]], repeats) + depths]
+        devices = record_store.device[records].astype(np.int64)
+
+        # the records are in the order of time, so is every (device, name) after the stable sort.
+        order = np.lexsort((codes, devices))
+        records, depths, codes, devices = records[order], depths[order], codes[order], devices[order]
+        self._ts = record_store.ts[records]
+        sizes = record_store.bytes[records]
+        is_allocation = sizes > 0
+        is_self = depths == 0
+
+        def prefix_sum(values):
+            return np.concatenate(([0], np.cumsum(values, dtype=np.int64)))
+
+        # the prefix sums in the order of MemoryMetrics.
+        self._prefix_sums = np.stack((prefix_sum(np.where(is_self, sizes, 0)),
+                                      prefix_sum(np.where(is_self & is_allocation, sizes, 0)),
+                                      prefix_sum(is_self & is_allocation),
+                                      prefix_sum(sizes),
+                                      prefix_sum(np.where(is_allocation, sizes, 0)),
+                                      prefix_sum(is_allocation)))
+
+        starts = np.flatnonzero(np.diff(codes, prepend=-1) | np.diff(devices, prepend=-1))
+        self._segment_starts = starts
+        self._segment_ends = np.append(starts[1:], len(codes))
+        self._segment_devices = devices[starts]
+        self._segment_codes = codes[starts]
+
+    def _build_calls(self, calls: List[Tuple[int, float, float]]):
+        codes = np.array([c[0] for c in calls], dtype=np.int64)
+        starts = np.array([c[1] for c in calls], dtype=np.float64)
+        ends = np.array([c[2] for c in calls], dtype=np.float64)
+        # the operators with an empty time range, e.g. out of their parents, are counted one by one.
+        empty = ends < starts
+        self._empty_calls = (codes[empty], starts[empty], ends[empty])
+
+        # the start and end time of every name in separate orders.
+        order = np.lexsort((starts, codes))
+        self._call_codes = codes[order]
+        self._call_starts = starts[order]
+        self._call_ends = ends[np.lexsort((ends, codes))]
+        self._call_offsets = np.searchsorted(self._call_codes, np.arange(len(self.names) + 1))
+
+    def get_calls(self, code: int, start_ts: Optional[float], end_ts: Optional[float]) -> int:
+        """Return the number of the operators of the name whose time range overlaps [start_ts, end_ts]."""
+        begin, end = self._call_offsets[code], self._call_offsets[code + 1]
+        calls = end - begin
+        if end_ts is not None:
+            calls -= end - begin - np.searchsorted(self._call_starts[begin:end], end_ts, side='right')
+        if start_ts is not None:
+            calls -= np.searchsorted(self._call_ends[begin:end], start_ts, side='left')
+        if start_ts is not None and end_ts is not None:
+            # the operators excluded twice.
+            codes, starts, ends = self._empty_calls
+            calls += np.count_nonzero((codes == code) & (starts > end_ts) & (ends < start_ts))
+        return int(calls)
+
+    def get_statistics(self, start_ts=None, end_ts=None) -> Dict[str, Dict[str, List[int]]]:
+        """Return the metrics of the operator names keyed by the device name and then by the operator name.
+        The metrics are indexed by MemoryMetrics, followed by the calls. Only the metrics of the records
+        within [start_ts, end_ts] are counted, the names without any memory metrics are not included.
+        """
+        begins = self._segment_starts.copy()
+        ends = self._segment_ends.copy()
+        for i, (begin, end) in enumerate(zip(self._segment_starts.tolist(), self._segment_ends.tolist())):
+            if start_ts is not None:
+                begins[i] = begin + np.searchsorted(self._ts[begin:end], start_ts, side='left')
+            if end_ts is not None:
+                ends[i] = begin + np.searchsorted(self._ts[begin:end], end_ts, side='right')
+        ends = np.maximum(begins, ends)
+        metrics = (self._prefix_sums[:, ends] - self._prefix_sums[:, begins]).T
+
+        result: Dict[str, Dict[str, List[int]]] = defaultdict(defaultdict)
+        calls: Dict[int, int] = {}
+        for device, code, values in zip(self._segment_devices.tolist(), self._segment_codes.tolist(),
+                                        metrics.tolist()):
+            if any(values):
+                if code not in calls:
+                    calls[code] = self.get_calls(code, start_ts, end_ts)
+                result[self.device_names[device]][self.names[code]] = values + [calls[code]]
+        return result
+
+
 class MemorySnapshot:
-    def __init__(self, memory_records: Iterable[MemoryRecord],
+    def __init__(self, memory_records: List[MemoryRecord],
                  op_memory_table: Dict[OperatorNode, List[MemoryRecord]],
                  processed_nodes: Dict[OperatorNode, int]) -> None:
         self.memory_records = memory_records
         self.op_memory_table = op_memory_table
+        self.record_store = MemoryRecordStore(memory_records, op_memory_table)
+        # the releases are associated with the operators of their allocations.
+        for alloc_i, free_i in zip(self.record_store.alloc_idx.tolist(), self.record_store.free_idx.tolist()):
+            alloc_r, free_r = memory_records[alloc_i], memory_records[free_i]
+            free_r.op_name = alloc_r.op_name
+            free_r.parent_op_name = alloc_r.parent_op_name
         # the visited node times from parent to child
         # troubleshooting issue purpose.
         self.processed_node = processed_nodes
         self.unreached_node = defaultdict(list)
+        # the index of the statistics of the operator names, built along with the snapshot.
+        self.statistics_index: Optional[MemoryStatisticsIndex] = None
+        # the full resolution memory curves of the devices, built on the first use.
+        self.memory_curves: Optional[Dict[str, np.ndarray]] = None
 
     def get_peak_memory(self) -> Dict[Tuple[DeviceType, int], int]:
         peaks = defaultdict(int)
@@ -83,112 +459,70 @@ class MemorySnapshot:
                 peaks[(r.device_type, r.device_id)] = max(peaks[(r.device_type, r.device_id)], r.total_allocated)
         return peaks
 
+    def get_memory_curves(self) -> Dict[str, np.ndarray]:
+        """Return the memory curves of the devices at full resolution, each row is
+        [Timestamp, Total Allocated, Total Reserved] of a record in the raw units.
+
+        For example:
+        ```py
+        {
+            'CPU': [# Timestamp, Total Allocated, Total Reserved
+                [1, 4, 4],
+                [2, 16, 16],
+                [4, 4, 16],
+            ],
+            'GPU0': ...
+        }
+        ```"""
+        if self.memory_curves is None:
+            rows = defaultdict(list)
+            for r in self.memory_records:
+                if r.addr is None or r.device_name is None:
+                    continue
+                ta = r.total_allocated
+                tr = r.total_reserved
+                if ta != ta or tr != tr:  # isnan
+                    continue
+                rows[r.device_name].append((r.ts, ta, tr))
+            self.memory_curves = {dev: np.array(curve, dtype=np.float64) for dev, curve in rows.items()}
+        return self.memory_curves
+
+    def get_statistics_index(self, tid2tree: Dict[int, OperatorNode],
+                             operator_indices: Optional[Dict[int, Optional[OperatorIndex]]] = None
+                             ) -> MemoryStatisticsIndex:
+        if self.statistics_index is None or self.statistics_index.tid2tree is not tid2tree:
+            self.statistics_index = MemoryStatisticsIndex(self.record_store, tid2tree, self.processed_node,
+                                                          operator_indices)
+            self.unreached_node = self.statistics_index.unreached_nodes
+        return self.statistics_index
+
     def get_memory_statistics(self,
                               tid2tree: Dict[int, OperatorNode],
                               start_ts=None, end_ts=None) -> Dict[str, Dict[str, List[int]]]:
-        metric_length = len(MemoryMetrics)
-        self_metric_length = metric_length // 2
-
-        def dict_factory():
-            return defaultdict(lambda: [0] * metric_length)
-
-        # traverse outputs
-        op_list: List[OperatorNode] = []
-        # two level keys dictionary
-        # first keyed by node, then keyed by device (CPU/GPU0/GPU1/etc.)
-        memory_metrics_keyed_by_node: Dict[OperatorNode, Dict[str, List[int]]] = defaultdict(dict_factory)
-
-        def traverse_node_memory(node: OperatorNode):
-            if start_ts is not None and node.end_time < start_ts:
-                return
-            if end_ts is not None and node.start_time > end_ts:
-                return
-
-            is_op = is_operator_node(node)
-            if is_op:
-                op_list.append(node)
-
-            if node not in self.processed_node:
-                self.unreached_node[tid].append(node)
-                # since the node has not been visited for insert memory records, just ignore all childrens
-                return
-            elif is_op:
-                node_memory_metrics = self.get_memory_metrics(node, start_ts, end_ts)
-                for device, metrics in node_memory_metrics.items():
-                    # device is name of device like: CPU/GPU0
-                    # metrics is an arrary [SelfIncreaseSize, SelfAllocationSize, SelfAllocationCount]
-                    for i, value in enumerate(metrics):
-                        memory_metrics_keyed_by_node[node][device][i] = value
-                        memory_metrics_keyed_by_node[node][device][i + self_metric_length] += value
-            else:
-                logger.debug('node {}:{} is not operator node, will skip its self metrics processing'.format(
-                    node.name, node.start_time))
-
-            # recursive the children nodes
-            for child in node.children:
-                traverse_node_memory(child)
-                # sum up the child metrics
-                for device, metrics in memory_metrics_keyed_by_node[child].items():
-                    for i in range(self_metric_length, metric_length):
-                        memory_metrics_keyed_by_node[node][device][i] += metrics[i]
-
-        for tid, root in tid2tree.items():
-            for child in root.children:
-                traverse_node_memory(child)
-
-        # keyed first by device name like CPU/GPU0 etc, then keyed by operator name.
-        # the value is array [items indexed by MemoryMetrics]
-        memory_metrics_keyed_by_nodename: Dict[str, Dict[str, List[int]]] = defaultdict(dict_factory)
-        # node: the instance, device_keyed_metrics: dictionary keyed by device name like CPU/GPU0
-        for node, device_keyed_metrics in memory_metrics_keyed_by_node.items():
-            if not is_operator_node(node):
-                # skip the node like Optimizer.step, DataLoader, ProfilerStep#1 etc.
-                continue
-
-            for device, metrics in device_keyed_metrics.items():
-                for i, metric in enumerate(metrics):
-                    memory_metrics_keyed_by_nodename[device][node.name][i] += metric
-
-        # get the op_calls dictionary from module parser result.
-        op_calls: Dict[str, int] = defaultdict(int)
-        agg_result = aggregate_ops(op_list, [lambda op: op.name])
-        for op_name, op_agg in agg_result[0].items():
-            op_calls[op_name] += op_agg.calls
-
-        result: Dict[str, Dict[str, List[int]]] = defaultdict(defaultdict)
-        for device, node_metrics in memory_metrics_keyed_by_nodename.items():
-            for node, values in node_metrics.items():
-                if any(values):
-                    result[device][node] = values + [op_calls[node]]
-
-        return result
+        return self.get_statistics_index(tid2tree).get_statistics(start_ts, end_ts)
 
     def get_memory_metrics(self, op: OperatorNode, start_ts, end_ts):
         metrics_count = len([e.name for e in MemoryMetrics if e.name.startswith('Self')])
         memory_metrics: Dict[str, List[int]] = defaultdict(lambda: [0] * metrics_count)
-        for record in self.op_memory_table[op]:
-            if start_ts is not None and record.ts < start_ts:
-                continue
-            if end_ts is not None and record.ts > end_ts:
-                continue
-            name = record.device_name
-            if name is None:
-                continue
+        memory_metrics.update(self.record_store.get_op_metrics(op, start_ts, end_ts))
+        return memory_metrics
 
-            memory_metrics[name][MemoryMetrics.SelfIncreaseSize] += record.bytes
-            if record.bytes > 0:
-                memory_metrics[name][MemoryMetrics.SelfAllocationSize] += record.bytes
-                memory_metrics[name][MemoryMetrics.SelfAllocationCount] += 1
+    def get_records(self, start_ts=None, end_ts=None) -> List[MemoryRecord]:
+        """Returns time-ordered memory records within [start_ts, end_ts]"""
+        return self.record_store.get_records(start_ts, end_ts)
 
-        return memory_metrics
+    def get_allocations(self, start_ts=None, end_ts=None):
+        """Returns the record indices of the allocations and releases within [start_ts, end_ts],
+        see MemoryRecordStore.get_allocations"""
+        return self.record_store.get_allocations(start_ts, end_ts)
 
 
 class MemoryParser:
-    def __init__(self, memory_events: Iterable[MemoryEvent]):
+    def __init__(self, memory_records: Iterable[MemoryRecord]):
         # statistics purpose
         self.staled_records: List[MemoryRecord] = []
         self.processed_records: List[MemoryRecord] = []
-        self.memory_records: List[MemoryRecord] = [MemoryRecord.from_event(e) for e in memory_events]
+        self.memory_records: List[MemoryRecord] = list(memory_records)
 
     def find_memory_nodes(self, tid2tree: Dict[int, OperatorNode]) -> MemorySnapshot:
         records_by_tid: Dict[int, List[MemoryRecord]] = defaultdict(list)
@@ -198,98 +532,14 @@ class MemoryParser:
         op_memory_table: Dict[OperatorNode, List[MemoryRecord]] = defaultdict(list)
         processed_node = defaultdict(int)
 
+        # the trees are indexed once for both the attribution and the statistics.
+        operator_indices = {tid: OperatorIndex.build(root) for tid, root in tid2tree.items()}
         tree_height = 0
         for tid, records in records_by_tid.items():
             if not records:
                 continue
-
-            # each item is (parent_node, child_index) that it is visiting.
-            node_stack: List[Tuple[OperatorNode, int]] = []
-
-            record_index = 0
-            current_node: OperatorNode = tid2tree.get(tid)
-            child_index = 0
-
-            if current_node:
-                processed_node[current_node] += 1
-
-            while record_index < len(records):
-                """In the loop, one pass will process one record. The basic logic is:
-                It will search from the node that last visited since both the records and tree is ordered already
-                1. it current node contains the records, then find the exactly child which just embrace it.
-                2. otherwise, find the parent node and set the child_index, so that the parent node could continue from previous visited node. # noqa: E501
-                3. if there is not any node contains the records, then all remaining records will be ignored.
-                """
-                record = records[record_index]
-
-                if len(node_stack) > tree_height:
-                    tree_height = len(node_stack)
-
-                if current_node is None or current_node.start_time is None or current_node.end_time is None:
-                    # 3. Ignore all remaining records.
-                    logger.debug(
-                        'could not find the node for tid %d, timestamp: %d, record index: %d, total records: %d' % (
-                            record.tid, record.ts, record_index, len(records)))
-                    self.staled_records.append(records[record_index])
-                    record_index += 1
-                    continue
-
-                if record.ts < current_node.start_time:
-                    # this should only happens for root node.
-                    logger.debug('record timestamp %d is less that the start time of %s' %
-                                 (record.ts, current_node.name))
-                    # This record has no chance to be appended to following tree node.
-                    self.staled_records.append(record)
-                    record_index += 1
-                    continue
-                elif record.ts >= current_node.end_time:
-                    # 2. pop parent node and update the child_index accordingly.
-                    if len(node_stack) > 0:
-                        current_node, child_index = node_stack.pop()
-                        child_index += 1
-                    else:
-                        # if there is not item in stack, set it to None
-                        current_node = None
-                    continue
-
-                # 1. find the real node embrace the record.
-                # Find the node which contains the records from top to downmost.
-                while child_index < len(current_node.children):
-                    if record.ts < current_node.children[child_index].start_time:
-                        # if current record timestamp is less than the current child's startime,
-                        # we will break the search and keep the child_index not change. So that next time
-                        # we can continue from here.
-                        # there is no any child contains the record.timestamp
-                        # child_find is False at this case.
-                        break
-                    elif record.ts >= current_node.children[child_index].end_time:
-                        # if the record timestamp is greater than the children end time, increment to next child
-                        # until find one contains the record
-                        child_index += 1
-                    else:
-                        # current children contains the record
-                        processed_node[current_node.children[child_index]] += 1
-
-                        # push child index which will be visited, then continue the loop
-                        node_stack.append((current_node, child_index))
-                        current_node = current_node.children[child_index]
-                        child_index = 0
-
-                # the current_node is the one contains the record at this moment.
-                if is_operator_node(current_node):
-                    op_memory_table[current_node].append(record)
-                    # NOTE: only allocation record can be associated with op. Because deallocation happens at the end
-                    # of a tensor's lifetime which is not deterministic.
-                    if record.is_allocation:
-                        record.op_name = current_node.name
-                        if len(node_stack) > 0:
-                            record.parent_op_name = node_stack[-1][0].name
-                    self.processed_records.append(record)
-                else:
-                    self.staled_records.append(record)
-
-                # the record is processed
-                record_index += 1
+            tree_height = max(tree_height, self._attribute_records(
+                records, tid2tree.get(tid), operator_indices.get(tid), op_memory_table, processed_node))
 
         # show summary information
         if len(self.staled_records) > 0 and len(self.memory_records) > 0:
@@ -298,31 +548,159 @@ class MemoryParser:
         if tree_height > 0:
             logger.debug('max tree height is {}'.format(tree_height))
 
-        all_records = self.get_preprocessed_records()
-        return MemorySnapshot(all_records, op_memory_table, processed_node)
-
-    def get_preprocessed_records(self):
-        memory_records = sorted(self.memory_records, key=lambda r: r.ts)
+        all_records = sorted(self.memory_records, key=lambda r: r.ts)
+        snapshot = MemorySnapshot(all_records, op_memory_table, processed_node)
+        snapshot.get_statistics_index(tid2tree, operator_indices)
+        return snapshot
+
+    def _attribute_records(self, records: List[MemoryRecord], root: Optional[OperatorNode],
+                           index: Optional[OperatorIndex], op_memory_table: Dict[OperatorNode, List[MemoryRecord]],
+                           processed_node: Dict[OperatorNode, int]) -> int:
+        """Attribute the time ordered records of a thread to the deepest nodes of its tree which contain them.
+        Return the height of the visited tree.
+
+        The deepest nodes are located in the index of the tree by a binary search on the starts followed by
+        walking up the ancestors level by level. It is the same as visiting the tree record by record, which
+        is done by _walk_records for the trees which are not indexed.
+        """
+        ts = np.array([r.ts for r in records], dtype=np.float64)
+        if index is None or np.any(ts[1:] < ts[:-1]):
+            return self._walk_records(records, root, op_memory_table, processed_node)
+
+        nodes, parents = index.nodes, index.parents
+        processed_node[root] += 1
+        # the index of the deepest node which contains each record, -1 for the records out of the tree.
+        found = index.locate(ts)
+
+        # the nodes from the root to the found nodes are visited.
+        visited = np.zeros(len(nodes), dtype=bool)
+        found_nodes = np.unique(found[found >= 0])
+        frontier = found_nodes[found_nodes > 0]
+        while len(frontier) > 0:
+            visited[frontier] = True
+            frontier = parents[frontier]
+            frontier = np.unique(frontier[(frontier > 0) & ~visited[frontier]])
+        for node_id in np.flatnonzero(visited).tolist():
+            processed_node[nodes[node_id]] += 1
+
+        is_op = np.array([is_operator_node(node) for node in nodes] + [False])
+        processed = np.flatnonzero(is_op[found])
+        staled = np.ones(len(records), dtype=bool)
+        staled[processed] = False
+        self.staled_records.extend([records[i] for i in np.flatnonzero(staled).tolist()])
+        self.processed_records.extend([records[i] for i in processed.tolist()])
+
+        # the records of every operator in the order of its first record.
+        processed_nodes = found[processed]
+        order = np.argsort(processed_nodes, kind='stable')
+        node_ids, firsts, counts = np.unique(processed_nodes[order], return_index=True, return_counts=True)
+        for first_record, node_id, first, count in sorted(zip(order[firsts].tolist(), node_ids.tolist(),
+                                                              firsts.tolist(), counts.tolist())):
+            node = nodes[node_id]
+            parent_name = nodes[parents[node_id]].name if node_id > 0 else None
+            node_records = [records[i] for i in processed[order[first:first + count]].tolist()]
+            op_memory_table[node].extend(node_records)
+            # NOTE: only allocation record can be associated with op. Because deallocation happens at the end
+            # of a tensor's lifetime which is not deterministic.
+            for record in node_records:
+                if record.bytes > 0:
+                    record.op_name = node.name
+                    record.parent_op_name = parent_name
+
+        # the height of the visited tree is the depth of the deepest found node.
+        return int(index.depths[found_nodes].max()) if len(found_nodes) > 0 else 0
+
+    def _walk_records(self, records: List[MemoryRecord], root: Optional[OperatorNode],
+                      op_memory_table: Dict[OperatorNode, List[MemoryRecord]],
+                      processed_node: Dict[OperatorNode, int]) -> int:
+        """Attribute the records to the nodes by visiting the tree record by record."""
+        tree_height = 0
+        # each item is (parent_node, child_index) that it is visiting.
+        node_stack: List[Tuple[OperatorNode, int]] = []
+
+        record_index = 0
+        current_node: OperatorNode = root
+        child_index = 0
+
+        if current_node:
+            processed_node[current_node] += 1
+
+        while record_index < len(records):
+            """In the loop, one pass will process one record. The basic logic is:
+            It will search from the node that last visited since both the records and tree is ordered already
+            1. it current node contains the records, then find the exactly child which just embrace it.
+            2. otherwise, find the parent node and set the child_index, so that the parent node could continue from previous visited node. # noqa: E501
+            3. if there is not any node contains the records, then all remaining records will be ignored.
+            """
+            record = records[record_index]
+
+            if len(node_stack) > tree_height:
+                tree_height = len(node_stack)
+
+            if current_node is None or current_node.start_time is None or current_node.end_time is None:
+                # 3. Ignore all remaining records.
+                logger.debug(
+                    'could not find the node for tid %d, timestamp: %d, record index: %d, total records: %d' % (
+                        record.tid, record.ts, record_index, len(records)))
+                self.staled_records.append(records[record_index])
+                record_index += 1
+                continue
 
-        alloc = {}  # allocation events may or may not have paired free event
-        prev_ts = float('-inf')  # ensure ordered memory records is ordered
-        for i, r in enumerate(memory_records):
-            if r.addr is None:
-                # profile json data prior to pytorch 1.10 do not have addr
-                # we should ignore them
+            if record.ts < current_node.start_time:
+                # this should only happens for root node.
+                logger.debug('record timestamp %d is less that the start time of %s' %
+                             (record.ts, current_node.name))
+                # This record has no chance to be appended to following tree node.
+                self.staled_records.append(record)
+                record_index += 1
                 continue
-            assert prev_ts <= r.ts
-            prev_ts = r.ts
-            addr = r.addr
-            size = r.bytes
-            if size > 0:
-                # Allocation event, to be matched with a Release event
-                alloc[addr] = i
+            elif record.ts >= current_node.end_time:
+                # 2. pop parent node and update the child_index accordingly.
+                if len(node_stack) > 0:
+                    current_node, child_index = node_stack.pop()
+                    child_index += 1
+                else:
+                    # if there is not item in stack, set it to None
+                    current_node = None
+                continue
+
+            # 1. find the real node embrace the record.
+            # Find the node which contains the records from top to downmost.
+            while child_index < len(current_node.children):
+                if record.ts < current_node.children[child_index].start_time:
+                    # if current record timestamp is less than the current child's startime,
+                    # we will break the search and keep the child_index not change. So that next time
+                    # we can continue from here.
+                    # there is no any child contains the record.timestamp
+                    # child_find is False at this case.
+                    break
+                elif record.ts >= current_node.children[child_index].end_time:
+                    # if the record timestamp is greater than the children end time, increment to next child
+                    # until find one contains the record
+                    child_index += 1
+                else:
+                    # current children contains the record
+                    processed_node[current_node.children[child_index]] += 1
+
+                    # push child index which will be visited, then continue the loop
+                    node_stack.append((current_node, child_index))
+                    current_node = current_node.children[child_index]
+                    child_index = 0
+
+            # the current_node is the one contains the record at this moment.
+            if is_operator_node(current_node):
+                op_memory_table[current_node].append(record)
+                # NOTE: only allocation record can be associated with op. Because deallocation happens at the end
+                # of a tensor's lifetime which is not deterministic.
+                if record.is_allocation:
+                    record.op_name = current_node.name
+                    if len(node_stack) > 0:
+                        record.parent_op_name = node_stack[-1][0].name
+                self.processed_records.append(record)
             else:
-                # Processing a Release event
-                if addr in alloc:
-                    alloc_r = memory_records[alloc[addr]]
-                    r.op_name = alloc_r.op_name
-                    r.parent_op_name = alloc_r.parent_op_name
-                    del alloc[addr]
-        return memory_records
+                self.staled_records.append(record)
+
+            # the record is processed
+            record_index += 1
+
+        return tree_height
@@ -4,6 +4,7 @@
 from collections import namedtuple
 from typing import Dict, Generator, Iterable, List, Optional, Set, Tuple, Union
 
+from .event_table import EventTable, filter_events
 from .node import (DataLoaderNode, ModuleNode, OperatorNode, OptimizerNode,
                    PLModuleNode, ProfilerStepNode, is_operator_node)
 from .trace import BaseEvent, EventTypes, PLModuleEvent, PythonFunctionEvent
@@ -60,7 +61,8 @@ Stats = namedtuple('Stats', [
     'children'])
 
 
-def aggegate_module_view(tid2tree: Dict[int, OperatorNode], events: List[BaseEvent]) -> Optional[List[Stats]]:
+def aggegate_module_view(tid2tree: Dict[int, OperatorNode],
+                         events: Union[EventTable, List[BaseEvent]]) -> Optional[List[Stats]]:
     roots = _build_module_hierarchy(events)
     modules = _get_node_list(tid2tree, ModuleNode)
     if modules and roots:
@@ -69,7 +71,8 @@ def aggegate_module_view(tid2tree: Dict[int, OperatorNode], events: List[BaseEve
         return None
 
 
-def aggegate_pl_module_view(tid2tree: Dict[int, OperatorNode], events: List[BaseEvent]) -> Optional[List[Stats]]:
+def aggegate_pl_module_view(tid2tree: Dict[int, OperatorNode],
+                            events: Union[EventTable, List[BaseEvent]]) -> Optional[List[Stats]]:
     roots = _build_module_hierarchy_from_name(events)
     modules = _get_node_list(tid2tree, PLModuleNode)
     if modules and roots:
@@ -79,7 +82,7 @@ def aggegate_pl_module_view(tid2tree: Dict[int, OperatorNode], events: List[Base
 
 
 def _build_module_hierarchy_from_name(events: List[PLModuleEvent]) -> List[Module]:
-    pl_module_events = [e for e in events if e.type == EventTypes.PL_MODULE]
+    pl_module_events = filter_events(events, [EventTypes.PL_MODULE])
     name2module: Dict[str, Module] = {}
     no_root: Set[str] = set()
 
@@ -101,7 +104,7 @@ def _build_module_hierarchy_from_name(events: List[PLModuleEvent]) -> List[Modul
 def _build_module_hierarchy(events: List[PythonFunctionEvent]) -> List[Module]:
     """Get the module hierarchy from the chome trace events
     """
-    python_events = [e for e in events if e.type in (EventTypes.PYTHON_FUNCTION, EventTypes.MODULE)]
+    python_events = filter_events(events, [EventTypes.PYTHON_FUNCTION, EventTypes.MODULE])
     id_to_event = {e.python_id: e for e in python_events}
 
     # Extract Python function topology.
@@ -16,6 +16,8 @@ ExcludeOpName = ['DataParallel.forward', 'DistributedDataParallel.forward']
 
 
 class BaseNode(ABC):
+    __slots__ = ('name', 'start_time', 'end_time', 'type', 'tid', 'external_id')
+
     def __init__(self, name: str, start_time: int, end_time: int, type: str, tid: int,
                  external_id: Optional[int] = None):
         self.name = name
@@ -49,6 +51,9 @@ class BaseNode(ABC):
 
 
 class CommunicationNode(BaseNode):
+    __slots__ = ('input_shape', 'input_type', 'kernel_ranges', 'real_time_ranges', 'total_time', 'real_time',
+                 'step_name')
+
     def __init__(self, input_shape: List[List[int]], input_type: List[str], **kwargs):
         super().__init__(**kwargs)
         self.input_shape = input_shape
@@ -66,12 +71,17 @@ class CommunicationNode(BaseNode):
 
 
 class HostNode(BaseNode):
+    __slots__ = ('device_duration',)
+
     def __init__(self, device_duration: int = 0, **kwargs):
         super().__init__(**kwargs)
         self.device_duration = device_duration  # Total time of Kernel, GPU Memcpy, GPU Memset. TODO: parallel multi-stream? # noqa: E501
 
 
 class OperatorNode(HostNode):
+    __slots__ = ('children', 'runtimes', 'input_shape', 'input_type', 'callstack', 'self_host_duration',
+                 'self_device_duration', 'tc_eligible', 'tc_self_duration', 'tc_total_duration')
+
     # Don't use [] as default parameters
     # https://stackoverflow.com/questions/1132941/least-astonishment-and-the-mutable-default-argument?page=1&tab=votes#tab-top
     # https://web.archive.org/web/20200221224620/http://effbot.org/zone/default-values.htm
@@ -92,13 +102,29 @@ class OperatorNode(HostNode):
         self.tc_total_duration = 0  # Time of TC kernels launched by this op including its children operators.
 
     def fill_stats(self):
-        # TODO: Replace recursive by using a stack, in case of too deep callstack.
+        """Fill the statistics of the subtree, the children before their parent. The subtree is walked with
+        an explicit stack, so a deep call stack does not hit the recursion limit.
+        """
+        # each item is (node, whether its children are filled).
+        stack: List[Tuple[OperatorNode, bool]] = [(self, False)]
+        while stack:
+            node, children_filled = stack.pop()
+            if children_filled:
+                node._fill_self_stats()
+            else:
+                stack.append((node, True))
+                # the children are filled in order of their start time.
+                stack.extend((child, False) for child in reversed(node._sort_children()))
+
+    def _sort_children(self) -> List['OperatorNode']:
+        """Sort the children and runtimes by time, return the children to be filled before this node."""
         self.children.sort(key=lambda x: (x.start_time, -x.end_time))
         self.runtimes.sort(key=lambda x: (x.start_time, -x.end_time)
                            if x.start_time and x.end_time else (sys.maxsize, -sys.maxsize - 1))
+        return self.children
 
-        for child in self.children:
-            child.fill_stats()
+    def _fill_self_stats(self):
+        """Fill the statistics of this node from its filled children and its runtimes."""
         for rt in self.runtimes:
             rt.fill_stats(self)
 
@@ -145,19 +171,23 @@ class OperatorNode(HostNode):
 
 
 class ProfilerStepNode(OperatorNode):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
 
 class ModuleNode(OperatorNode):
+    __slots__ = ('module_id', 'python_id', 'python_parent_id')
+
     def __init__(self, module_id: int, python_id: int, python_parent_id: int, **kwargs):
         super().__init__(**kwargs)
         self.module_id = module_id
         self.python_id = python_id
         self.python_parent_id = python_parent_id
 
-    def fill_stats(self):
-        super().fill_stats()
+    def _fill_self_stats(self):
+        super()._fill_self_stats()
         self.self_device_duration += get_chilren_self_device_time(self)
 
     @classmethod
@@ -173,13 +203,19 @@ class ModuleNode(OperatorNode):
 
 
 class BackwardNode(OperatorNode):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-    def fill_stats(self):
+    def _sort_children(self) -> List[OperatorNode]:
+        """The children of a BackwardNode are filled in the backward tree already."""
+        self.children.sort(key=lambda x: (x.start_time, -x.end_time))
+        return []
+
+    def _fill_self_stats(self):
         """Override the timestamps and duration for BackwardNode only
         """
-        self.children.sort(key=lambda x: (x.start_time, -x.end_time))
         self.start_time = self.children[0].start_time
         self.end_time = self.children[-1].end_time
 
@@ -194,6 +230,8 @@ class BackwardNode(OperatorNode):
 
 
 class PLProfileNode(OperatorNode):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -204,12 +242,14 @@ class PLProfileNode(OperatorNode):
 
 
 class PLModuleNode(OperatorNode):
+    __slots__ = ('module_id',)
+
     def __init__(self, module_id: int, **kwargs):
         super().__init__(**kwargs)
         self.module_id = module_id
 
-    def fill_stats(self):
-        super().fill_stats()
+    def _fill_self_stats(self):
+        super()._fill_self_stats()
         self.self_device_duration += get_chilren_self_device_time(self)
 
     @classmethod
@@ -220,16 +260,22 @@ class PLModuleNode(OperatorNode):
 
 
 class DataLoaderNode(OperatorNode):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
 
 class OptimizerNode(OperatorNode):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
 
 class RuntimeNode(HostNode):
+    __slots__ = ('device_nodes', 'tc_duration')
+
     def __init__(self, device_nodes: Optional[List['DeviceNode']] = None, **kwargs):
         super().__init__(**kwargs)
         # One runtime could trigger more than one kernel, such as cudaLaunchCooperativeKernelMultiDevice.
@@ -259,6 +305,9 @@ class RuntimeNode(HostNode):
 
 
 class DeviceNode(BaseNode):
+    __slots__ = ('op_tc_eligible', 'op_name', 'blocks_per_sm', 'occupancy', 'grid', 'block', 'regs_per_thread',
+                 'shared_memory', 'tc_used', 'device_id')
+
     def __init__(self,
                  blocks_per_sm: Optional[float] = None,
                  occupancy: int = None,
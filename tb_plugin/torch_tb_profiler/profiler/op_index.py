@@ -0,0 +1,130 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# -------------------------------------------------------------------------
+"""The index of an operator tree by time, to find the operators which contain a timestamp or overlap a window.
+
+The tree is flattened in pre-order into the arrays of the start, end, parent and subtree end of the nodes.
+Only the trees whose children are sorted by start time, contained in their parent and disjoint are indexed,
+so the starts are sorted, the nodes which contain a timestamp are the last node starting before it and some
+of its ancestors, and the descendants of a node are the nodes after it up to its subtree end.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .. import utils
+from .node import OperatorNode
+
+logger = utils.get_logger()
+
+__all__ = ['OperatorIndex']
+
+
+class OperatorIndex:
+    def __init__(self, nodes: List[OperatorNode], starts: np.ndarray, ends: np.ndarray, parents: np.ndarray):
+        """The nodes are in pre-order, parents are the indices of the parents, -1 for the root."""
+        self.nodes = nodes
+        self.starts = starts
+        self.ends = ends
+        self.parents = parents
+        parent_list = parents.tolist()
+        sizes = [1] * len(nodes)
+        depths = [0] * len(nodes)
+        for i in range(len(nodes) - 1, 0, -1):
+            sizes[parent_list[i]] += sizes[i]
+        for i in range(1, len(nodes)):
+            depths[i] = depths[parent_list[i]] + 1
+        # one past the last descendant of every node.
+        self.subtree_ends = np.arange(len(nodes), dtype=np.int64) + np.array(sizes, dtype=np.int64)
+        self.depths = np.array(depths, dtype=np.int64)
+        self._positions: Optional[Dict[int, int]] = None
+
+    @staticmethod
+    def build(root: OperatorNode) -> Optional['OperatorIndex']:
+        """Index the tree of the root, return None if the children are not sorted, contained in their parent
+        and disjoint, or any node has no time.
+        """
+        nodes: List[OperatorNode] = []
+        parents: List[int] = []
+        stack = [(root, -1)]
+        while stack:
+            node, parent = stack.pop()
+            index = len(nodes)
+            nodes.append(node)
+            parents.append(parent)
+            if node.children:
+                stack.extend([(child, index) for child in reversed(node.children)])
+
+        starts = [node.start_time for node in nodes]
+        ends = [node.end_time for node in nodes]
+        if None in starts or None in ends:
+            return None
+        starts = np.array(starts, dtype=np.float64)
+        ends = np.array(ends, dtype=np.float64)
+        parents = np.array(parents, dtype=np.int64)
+        # the children of a node are in the pre-order, so are the adjacent ones after the stable sort.
+        siblings = np.argsort(parents[1:], kind='stable') + 1
+        adjacent = parents[siblings[1:]] == parents[siblings[:-1]]
+        if (np.any(starts[1:] < starts[parents[1:]]) or np.any(ends[1:] > ends[parents[1:]])
+                or np.any(ends[siblings[:-1]][adjacent] > starts[siblings[1:]][adjacent])
+                or np.any(starts[1:] < starts[:-1])):
+            return None
+        return OperatorIndex(nodes, starts, ends, parents)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def index_of(self, node: OperatorNode) -> int:
+        if self._positions is None:
+            self._positions = {id(n): i for i, n in enumerate(self.nodes)}
+        return self._positions[id(node)]
+
+    def locate(self, ts: np.ndarray) -> np.ndarray:
+        """Return the index of the deepest node which contains each timestamp within [start, end),
+        -1 for the timestamps out of the root.
+        """
+        ts = np.asarray(ts, dtype=np.float64)
+        found = np.full(len(ts), -1, dtype=np.int64)
+        inside = (ts >= self.starts[0]) & (ts < self.ends[0])
+        inside_ts = ts[inside]
+        candidates = np.searchsorted(self.starts, inside_ts, side='right') - 1
+        # the candidates which end before the timestamps are replaced by their parents.
+        while True:
+            ended = np.flatnonzero(self.ends[candidates] <= inside_ts)
+            if len(ended) == 0:
+                break
+            candidates[ended] = self.parents[candidates[ended]]
+        found[inside] = candidates
+        return found
+
+    def ancestors(self, index: int) -> List[int]:
+        """Return the indices of the node and its ancestors from the root."""
+        chain = []
+        while index >= 0:
+            chain.append(index)
+            index = int(self.parents[index])
+        return chain[::-1]
+
+    def containing(self, ts: float) -> List[OperatorNode]:
+        """Return the nodes which contain the timestamp within [start, end), from the root to the deepest."""
+        index = int(self.locate([ts])[0])
+        return [self.nodes[i] for i in self.ancestors(index)] if index >= 0 else []
+
+    def overlapping(self, start: float, end: float) -> List[OperatorNode]:
+        """Return the nodes which overlap [start, end] in pre-order."""
+        first = int(np.searchsorted(self.starts, start, side='left'))
+        last = int(np.searchsorted(self.starts, end, side='right'))
+        # the nodes starting before the window overlap it if they contain its start, they are the last node
+        # starting before it and its ancestors which end at or after the window start.
+        chain = []
+        index = first - 1
+        while index >= 0 and self.ends[index] < start:
+            index = int(self.parents[index])
+        if index >= 0:
+            chain = self.ancestors(index)
+        return [self.nodes[i] for i in chain] + self.nodes[first:max(first, last)]
+
+    def descendants(self, node: OperatorNode) -> List[OperatorNode]:
+        """Return the descendants of the node in pre-order."""
+        index = self.index_of(node)
+        return self.nodes[index + 1:int(self.subtree_ends[index])]
@@ -1,13 +1,17 @@
 # -------------------------------------------------------------------------
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # -------------------------------------------------------------------------
+import bisect
 import sys
 from collections import defaultdict
 from typing import Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
+
 from .. import utils
 from .node import (BackwardNode, DeviceNode, ModuleNode, OperatorNode,
                    ProfilerStepNode, RuntimeNode, is_operator_node)
+from .op_index import OperatorIndex
 from .trace import EventTypes
 
 logger = utils.get_logger()
@@ -143,20 +147,22 @@ class OpTreeBuilder:
         # Merge the consecutive calls to same function into one.
         # Just follow the same pattern in torch/autograd/profiler.py,
         # EventList._remove_dup_nodes
-        # TODO: Replace recursive by for loop, in case of too deep callstack.
-        def remove_dup_nodes(node: OperatorNode):
-            if node.type == EventTypes.RUNTIME:
-                return
-            if len(node.children) == 1:
-                child = node.children[0]
-                if node.name == child.name and node.type == EventTypes.OPERATOR and child.type == EventTypes.OPERATOR:
+        # The tree is walked with an explicit stack, in case of too deep callstack.
+        def remove_dup_nodes(root_node: OperatorNode):
+            stack = [root_node]
+            while stack:
+                node = stack.pop()
+                if node.type == EventTypes.RUNTIME:
+                    continue
+                # This node may have to merge with child's child.
+                while len(node.children) == 1:
+                    child = node.children[0]
+                    if not (node.name == child.name and node.type == EventTypes.OPERATOR
+                            and child.type == EventTypes.OPERATOR):
+                        break
                     node.children = child.children
                     node.runtimes = child.runtimes  # Keep consistent with autograd profiler.
-                    remove_dup_nodes(node)  # This node may have to merge with child's child.
-                    return
-
-            for child in node.children:
-                remove_dup_nodes(child)
+                stack.extend(reversed(node.children))
 
         root_node = build_tree_relationship(host_node_list, zero_rt_list, staled_device_nodes)
         remove_dup_nodes(root_node)
@@ -296,6 +302,71 @@ class OpTreeBuilder:
     def _insert_backward_modules(root: OperatorNode, backward_modules: List[BackwardNode]):
         backward_modules.sort(key=lambda x: (x.start_time, -x.end_time))
 
+        index = OperatorIndex.build(root)
+        parents = OpTreeBuilder._locate_backward_parents(index, backward_modules) if index is not None else None
+        if parents is None:
+            OpTreeBuilder._walk_backward_modules(root, backward_modules)
+            return
+
+        # the modules of every parent in order, each is inserted before the first child starting after it.
+        parent_modules: Dict[int, List[BackwardNode]] = defaultdict(list)
+        for module, parent in zip(backward_modules, parents):
+            if parent is not None:
+                parent_modules[parent].append(module)
+        for parent, modules in parent_modules.items():
+            children = index.nodes[parent].children
+            child_starts = [child.start_time for child in children]
+            merged: List[OperatorNode] = []
+            child_index = 0
+            for module in modules:
+                position = bisect.bisect_left(child_starts, module.start_time)
+                merged.extend(children[child_index:position])
+                merged.append(module)
+                child_index = position
+            merged.extend(children[child_index:])
+            children[:] = merged
+
+    @staticmethod
+    def _locate_backward_parents(index: OperatorIndex, backward_modules: List[BackwardNode]
+                                 ) -> Optional[List[Optional[int]]]:
+        """Return the index of the node each sorted module is inserted into, None for the staled modules.
+
+        A module is inserted into the deepest node reached by descending into the first child which overlaps
+        it. It is the same as _walk_backward_modules when the modules are disjoint and none of their start
+        and end time is equal to the start or end time of a node, otherwise None is returned.
+        """
+        if any(m.start_time is None or m.end_time is None for m in backward_modules):
+            return None
+        module_starts = np.array([m.start_time for m in backward_modules], dtype=np.float64)
+        module_ends = np.array([m.end_time for m in backward_modules], dtype=np.float64)
+        if (np.any(module_ends <= module_starts) or np.any(module_starts[1:] <= module_ends[:-1])
+                or np.any(np.isin(np.concatenate((module_starts, module_ends)),
+                                  np.concatenate((index.starts, index.ends))))):
+            return None
+
+        starts = index.starts.tolist()
+        subtree_ends = index.subtree_ends.tolist()
+        deepest = index.locate(module_starts).tolist()
+        firsts_after = np.searchsorted(index.starts, module_starts, side='right').tolist()
+        parents: List[Optional[int]] = []
+        for start, end, node, first_after in zip(module_starts.tolist(), module_ends.tolist(),
+                                                 deepest, firsts_after):
+            if end < starts[0] or start > index.ends[0]:
+                parents.append(None)
+                continue
+            # the first node starting after the module start is the first child of the deepest node
+            # containing the module start which may overlap it, so is the first child of that child.
+            node = max(node, 0)
+            child = max(first_after, node + 1)
+            while child < subtree_ends[node] and starts[child] < end:
+                node = child
+                child += 1
+            parents.append(node)
+        return parents
+
+    @staticmethod
+    def _walk_backward_modules(root: OperatorNode, backward_modules: List[BackwardNode]):
+        """Insert the sorted modules by walking the tree along with them."""
         # each item is (parent_node, child_index) that it is visiting.
         node_stack = []
         module_index = 0
@@ -3,10 +3,11 @@
 # --------------------------------------------------------------------------
 from typing import List, Tuple
 
+import numpy as np
+
 from .. import utils
 from .event_parser import ProfileRole
-from .range_utils import (get_ranges_sum, intersection_ranges_lists,
-                          merge_ranges, subtract_ranges_lists)
+from .range_utils import IntervalSet
 
 logger = utils.get_logger()
 
@@ -20,16 +21,8 @@ class OverallParser:
             else:
                 self.costs = costs
 
-        @classmethod
-        def create_from_statistics(cls, statistics: 'OverallParser.Statistics', total_duration: int):
-            costs = [0.] * len(ProfileRole)
-            for i in range(len(statistics.cost_ranges)):
-                costs[i] = get_ranges_sum(statistics.cost_ranges[i])
-            costs[ProfileRole.Total] = total_duration
-            return cls(costs)
-
     class Statistics:
-        def __init__(self, cost_ranges: List[List[Tuple[int, int]]]):
+        def __init__(self, cost_ranges: List[IntervalSet]):
             if not cost_ranges:
                 raise ValueError('the cost ranges is None')
 
@@ -39,28 +32,25 @@ class OverallParser:
         def create_from_range(cls, steps: List[Tuple[int, int]], role_ranges: List[List[Tuple[int, int]]]):
             assert len(role_ranges) == ProfileRole.Total - 1
 
-            cost_ranges: List[List[Tuple[int, int]]] = []
-            slots: List[Tuple[int, int]] = []
+            cost_ranges: List[IntervalSet] = []
+            slots: IntervalSet = None
             for role in role_ranges:
-                if slots:
-                    range = intersection_ranges_lists(slots, role)
+                role = IntervalSet.from_ranges(role, True)
+                if slots is not None:
+                    range = slots.intersection(role)
                 else:
                     range = role
-                    slots = merge_ranges(list(steps))
+                    slots = IntervalSet.from_ranges(steps)
                 cost_ranges.append(range)
-                slots = subtract_ranges_lists(slots, range)
+                slots = slots.subtract(range)
             # The last one is ProfileRole.Other
             cost_ranges.append(slots)
 
             return cls(cost_ranges)
 
-        def intersection_with_step(self, step: Tuple[int, int]):
-            cost_ranges: List[List[Tuple[int, int]]] = []
-            step = [step]
-            for range in self.cost_ranges:
-                cost_ranges.append(intersection_ranges_lists(step, range))
-
-            return OverallParser.Statistics(cost_ranges)
+        def steps_costs(self, step_starts: np.ndarray, step_ends: np.ndarray) -> List[np.ndarray]:
+            """Return the cost of each role within each step, in O(log n) per step."""
+            return [range.overlap(step_starts, step_ends) for range in self.cost_ranges]
 
     class StepCommunicationCosts:
         def __init__(self):
@@ -78,29 +68,31 @@ class OverallParser:
         logger.debug('Overall, statistics')
         global_stats = OverallParser.Statistics.create_from_range(steps, role_ranges)
         if role_ranges[ProfileRole.Kernel]:
-            comm_comp_overlap = intersection_ranges_lists(
-                role_ranges[ProfileRole.Kernel], role_ranges[ProfileRole.Communication])
+            computation = IntervalSet.from_ranges(role_ranges[ProfileRole.Kernel], True)
         else:
-            comm_comp_overlap = intersection_ranges_lists(
-                role_ranges[ProfileRole.CpuOp], role_ranges[ProfileRole.Communication])
+            computation = IntervalSet.from_ranges(role_ranges[ProfileRole.CpuOp], True)
+        communication = IntervalSet.from_ranges(role_ranges[ProfileRole.Communication], True)
+        comm_comp_overlap = computation.intersection(communication)
 
         logger.debug('Overall, aggregation')
+        step_starts = np.array([step[0] for step in steps])
+        step_ends = np.array([step[1] for step in steps])
+        role_costs = [costs.tolist() for costs in global_stats.steps_costs(step_starts, step_ends)]
+        overlap_costs = comm_comp_overlap.overlap(step_starts, step_ends).tolist()
+        computation_costs = computation.overlap(step_starts, step_ends).tolist()
+        communication_costs = communication.overlap(step_starts, step_ends).tolist()
+
         for i, step in enumerate(steps):
-            steps_stat = global_stats.intersection_with_step(step)
-            self.steps_costs.append(OverallParser.Costs.create_from_statistics(steps_stat, step[1] - step[0]))
+            costs = [role_cost[i] for role_cost in role_costs]
+            costs.append(step[1] - step[0])
+            self.steps_costs.append(OverallParser.Costs(costs))
             for cost_index in range(len(self.avg_costs.costs)):
                 self.avg_costs.costs[cost_index] += self.steps_costs[i].costs[cost_index]
 
             comm_costs = OverallParser.StepCommunicationCosts()
-            comm_costs.overlap = get_ranges_sum(intersection_ranges_lists([step], comm_comp_overlap))
-            if role_ranges[ProfileRole.Kernel]:
-                comm_costs.computation = get_ranges_sum(
-                    intersection_ranges_lists([step], role_ranges[ProfileRole.Kernel]))
-            else:
-                comm_costs.computation = get_ranges_sum(
-                    intersection_ranges_lists([step], role_ranges[ProfileRole.CpuOp]))
-            comm_costs.communication = get_ranges_sum(
-                intersection_ranges_lists([step], role_ranges[ProfileRole.Communication]))
+            comm_costs.overlap = overlap_costs[i]
+            comm_costs.computation = computation_costs[i]
+            comm_costs.communication = communication_costs[i]
             comm_costs.other = self.steps_costs[i].costs[ProfileRole.Total] +\
                 comm_costs.overlap - comm_costs.computation - comm_costs.communication
             self.communication_overlap.append(comm_costs)
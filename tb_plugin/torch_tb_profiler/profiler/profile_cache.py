@@ -0,0 +1,211 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# -------------------------------------------------------------------------
+"""The persistent cache of the parsed profiles.
+
+Parsing a trace file and generating its views is much slower than loading the result, so the RunProfile
+and the DistributedRunProfileData of every trace file are saved by shared_file in a cache directory which survives the
+restarts of TensorBoard. An entry is looked up by the path, size, modification time and content hash of the
+trace file together with the plugin version, so a changed file or a new plugin never reads a stale entry.
+The trace file re-encoded by the plugin and the data file of the TraceIndex are kept along with the entry.
+The least recently used entries are removed once the directory exceeds its size limit.
+
+The cache is disabled by default. It is enabled by setting the environment variable TORCH_PROFILER_CACHE_DIR
+to its directory, or TORCH_PROFILER_CACHE_SIZE_MB to a positive size limit, in which case the directory is
+~/.cache/torch_tb_profiler. The size limit is 1024 MB unless TORCH_PROFILER_CACHE_SIZE_MB is set.
+"""
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from typing import Optional, Tuple
+
+from .. import __version__, io, utils
+from ..run import RunProfile
+from . import shared_file
+from .data import DistributedRunProfileData
+
+logger = utils.get_logger()
+
+__all__ = ['ProfileCache']
+
+_DEFAULT_SIZE_MB = 1024
+_ENTRY_SUFFIX = '.profile.pkl'
+# the trace file re-encoded by RunProfileData.parse, stored along with its entry.
+_TRACE_SUFFIX = '.pt.trace.json.gz'
+# the data file of the TraceIndex of the profile.
+_INDEX_SUFFIX = '.trace.index'
+_SUFFIXES = (_ENTRY_SUFFIX, _TRACE_SUFFIX, _INDEX_SUFFIX)
+# the temporary files older than it are left by a killed process.
+_STALE_TEMP_SECONDS = 3600
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ProfileCache:
+    def __init__(self, cache_dir: str, max_size: int):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    @staticmethod
+    def from_env() -> Optional['ProfileCache']:
+        """Create the cache configured by the environment variables. Return None if it is disabled."""
+        cache_dir = os.getenv('TORCH_PROFILER_CACHE_DIR')
+        size = os.getenv('TORCH_PROFILER_CACHE_SIZE_MB')
+        if not cache_dir and not size:
+            return None
+        try:
+            size_mb = int(size) if size else _DEFAULT_SIZE_MB
+        except ValueError:
+            logger.warning('Invalid TORCH_PROFILER_CACHE_SIZE_MB %s, the profile cache is disabled' % size)
+            return None
+        if size_mb <= 0:
+            return None
+
+        if not cache_dir:
+            cache_home = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            cache_dir = os.path.join(cache_home, 'torch_tb_profiler')
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError as e:
+            logger.warning('Cannot create the profile cache directory %s: %s' % (cache_dir, e))
+            return None
+        return ProfileCache(cache_dir, size_mb * 1024 * 1024)
+
+    def key(self, worker: str, span: Optional[int], path: str, local_file: str) -> str:
+        """Return the key of the trace file at path, whose local copy is local_file.
+        The span index is part of the key since it depends on the other files of the run.
+        """
+        if io.is_local(path):
+            st = os.stat(path)
+            size, mtime = st.st_size, st.st_mtime_ns
+        else:
+            # the remote file systems don't report the modification time, the content hash covers it.
+            size, mtime = io.stat(path).length, 0
+
+        content_hash = hashlib.sha256()
+        with open(local_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+                content_hash.update(chunk)
+
+        key = hashlib.sha256()
+        for field in (__version__, worker, span, path, size, mtime, content_hash.hexdigest()):
+            key.update(repr(field).encode('utf-8'))
+            key.update(b'\0')
+        return key.hexdigest()
+
+    def _entry_path(self, key: str, suffix: str = _ENTRY_SUFFIX) -> str:
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def get(self, key: str, local_file: str) -> Optional[Tuple[RunProfile, DistributedRunProfileData]]:
+        """Return the cached profiles, or None if there is no valid entry of the key.
+        The trace_file_path of the profile points to local_file, or to the re-encoded trace kept in the cache.
+        """
+        entry = self._entry_path(key)
+        try:
+            profile, dist_data, has_trace = shared_file.load(entry)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # written by an incompatible version of the classes, or removed in the middle of reading.
+            logger.warning('Failed to read the profile cache %s: %s' % (entry, e))
+            self._remove(key)
+            return None
+
+        if has_trace:
+            trace_file = self._entry_path(key, _TRACE_SUFFIX)
+            if not os.path.exists(trace_file):
+                self._remove(key)
+                return None
+            profile.trace_file_path = trace_file
+        else:
+            profile.trace_file_path = local_file
+        if profile.trace_index is not None:
+            index_file = self._entry_path(key, _INDEX_SUFFIX)
+            if not os.path.exists(index_file):
+                self._remove(key)
+                return None
+            profile.trace_index.data_path = index_file
+
+        # mark the entry as recently used.
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return profile, dist_data
+
+    def put(self, key: str, profile: RunProfile, dist_data: DistributedRunProfileData, local_file: str):
+        """Save the profiles, then remove the least recently used entries beyond the size limit."""
+        has_trace = profile.trace_file_path != local_file
+        try:
+            if has_trace:
+                self._write(self._entry_path(key, _TRACE_SUFFIX), self._copy_from(profile.trace_file_path))
+            if profile.trace_index is not None:
+                self._write(self._entry_path(key, _INDEX_SUFFIX), self._copy_from(profile.trace_index.data_path))
+            self._write(self._entry_path(key), lambda f: shared_file.dump((profile, dist_data, has_trace), f))
+        except Exception as e:
+            logger.warning('Failed to save the profile cache of %s: %s' % (profile.trace_file_path, e))
+            return
+        self.evict()
+
+    @staticmethod
+    def _copy_from(path: str):
+        def copy(f):
+            with open(path, 'rb') as src:
+                shutil.copyfileobj(src, f)
+        return copy
+
+    def _write(self, path: str, write):
+        # write to a temporary file then rename it, so that a concurrent reader never sees a partial entry.
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def _remove(self, key: str):
+        for suffix in _SUFFIXES:
+            self._remove_file(self._entry_path(key, suffix))
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits into max_size."""
+        now = time.time()
+        entries = {}
+        total_size = 0
+        for path in glob.glob(os.path.join(self.cache_dir, '*')):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            name = os.path.basename(path)
+            if name.endswith('.tmp'):
+                if now - st.st_mtime > _STALE_TEMP_SECONDS:
+                    self._remove_file(path)
+                continue
+            total_size += st.st_size
+            for suffix in _SUFFIXES:
+                if name.endswith(suffix):
+                    key = name[:-len(suffix)]
+                    last_used, size = entries.get(key, (0, 0))
+                    # the access time of an entry is its pickle file's modification time.
+                    if suffix == _ENTRY_SUFFIX:
+                        last_used = st.st_mtime
+                    entries[key] = (last_used, size + st.st_size)
+
+        for key, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total_size <= self.max_size:
+                break
+            logger.debug('Remove the profile cache %s' % key)
+            self._remove(key)
+            total_size -= size
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
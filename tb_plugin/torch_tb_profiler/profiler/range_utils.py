@@ -3,155 +3,200 @@
 # -------------------------------------------------------------------------
 from typing import List, Tuple
 
+import numpy as np
+
+
+def _overlapping_pairs(starts1: np.ndarray, ends1: np.ndarray,
+                       starts2: np.ndarray, ends2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the indices (i, j) of the overlapping pairs of the intervals in the two lists, in sorted order.
+    Each list must be sorted and its intervals must not overlap each other, though they may touch.
+    """
+    # intervals2[lo[i]:hi[i]] overlap intervals1[i].
+    lo = np.searchsorted(ends2, starts1, side='right')
+    hi = np.searchsorted(starts2, ends1, side='left')
+    counts = np.maximum(hi - lo, 0)
+    total = counts.sum()
+    i = np.repeat(np.arange(len(starts1)), counts)
+    j = np.arange(total) - np.repeat(np.cumsum(counts) - counts - lo, counts)
+    return i, j
+
+
+def _columns(ranges) -> List[np.ndarray]:
+    """Return the columns of the list of tuples as arrays."""
+    array = np.array(ranges)
+    if array.dtype.kind == 'i':
+        return [array[:, i] for i in range(array.shape[1])]
+    # convert the columns one by one, so that the int columns are not turned into float by the others.
+    return [np.asarray(column) for column in zip(*ranges)]
+
+
+def _extreme_values(dtype) -> Tuple:
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return info.min, info.max
+    return -np.inf, np.inf
+
+
+class IntervalSet:
+    """A set of half-open time intervals [start, end) stored as two NumPy arrays.
+    The intervals are sorted, non-empty and separated from each other.
+    """
+    __slots__ = ['starts', 'ends']
+
+    def __init__(self, starts: np.ndarray = None, ends: np.ndarray = None):
+        """The arrays must already meet the invariant, use from_ranges or from_arrays otherwise."""
+        self.starts = np.empty(0, dtype=np.int64) if starts is None else starts
+        self.ends = np.empty(0, dtype=np.int64) if ends is None else ends
+
+    @classmethod
+    def from_ranges(cls, ranges, is_sorted: bool = False) -> 'IntervalSet':
+        """Create the set from a list of (start, end), merging the overlapping and touching ranges."""
+        if len(ranges) == 0:
+            return cls()
+        starts, ends = _columns(ranges)
+        return cls.from_arrays(starts, ends, is_sorted)
+
+    @classmethod
+    def from_arrays(cls, starts: np.ndarray, ends: np.ndarray, is_sorted: bool = False) -> 'IntervalSet':
+        """Create the set from the arrays of starts and ends, merging the overlapping and touching ranges."""
+        starts = np.asarray(starts)
+        ends = np.asarray(ends)
+        non_empty = ends > starts
+        if not non_empty.all():
+            starts = starts[non_empty]
+            ends = ends[non_empty]
+        if len(starts) == 0:
+            return cls(starts, ends)
+        if not is_sorted:
+            order = np.argsort(starts, kind='stable')
+            starts = starts[order]
+            ends = ends[order]
+
+        # a range begins a new interval if it starts after the end of all the ranges before it.
+        max_ends = np.maximum.accumulate(ends)
+        is_first = np.empty(len(starts), dtype=bool)
+        is_first[0] = True
+        np.greater(starts[1:], max_ends[:-1], out=is_first[1:])
+        first = np.flatnonzero(is_first)
+        last = np.append(first[1:] - 1, len(starts) - 1)
+        return cls(starts[first], max_ends[last])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def to_list(self) -> List[Tuple[int, int]]:
+        return list(zip(self.starts.tolist(), self.ends.tolist()))
+
+    def sum(self):
+        """The total length of the intervals."""
+        return (self.ends - self.starts).sum().item() if len(self) else 0
+
+    def coverage(self, times: np.ndarray) -> np.ndarray:
+        """Return the length of the intervals before each of the times, by prefix sums and binary search."""
+        times = np.asarray(times)
+        lengths = np.zeros(len(self) + 1, dtype=np.result_type(self.starts, self.ends))
+        np.cumsum(self.ends - self.starts, out=lengths[1:])
+        # the intervals [0, i) start no later than the time, the interval i - 1 may end after it.
+        i = np.searchsorted(self.starts, times, side='right')
+        last = np.maximum(i - 1, 0)
+        beyond = np.where(i > 0, np.maximum(self.ends[last] - times, 0), 0) if len(self) else 0
+        return lengths[i] - beyond
+
+    def overlap(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Return the length of the intervals within each of the ranges [starts[i], ends[i])."""
+        starts = np.asarray(starts)
+        ends = np.maximum(np.asarray(ends), starts)
+        return self.coverage(ends) - self.coverage(starts)
+
+    def intersection(self, other: 'IntervalSet') -> 'IntervalSet':
+        i, j = _overlapping_pairs(self.starts, self.ends, other.starts, other.ends)
+        return IntervalSet(np.maximum(self.starts[i], other.starts[j]), np.minimum(self.ends[i], other.ends[j]))
+
+    def complement(self, dtype=None) -> 'IntervalSet':
+        """The gaps between the intervals, extended to the minimum and maximum values of dtype."""
+        dtype = np.result_type(self.starts, self.ends) if dtype is None else dtype
+        lowest, highest = _extreme_values(dtype)
+        starts = np.concatenate(([lowest], self.ends)).astype(dtype)
+        ends = np.concatenate((self.starts, [highest])).astype(dtype)
+        non_empty = ends > starts
+        return IntervalSet(starts[non_empty], ends[non_empty])
+
+    def subtract(self, other: 'IntervalSet') -> 'IntervalSet':
+        dtype = np.result_type(self.starts, self.ends, other.starts, other.ends)
+        return self.intersection(other.complement(dtype))
+
+    def union(self, other: 'IntervalSet') -> 'IntervalSet':
+        return IntervalSet.from_arrays(np.concatenate((self.starts, other.starts)),
+                                       np.concatenate((self.ends, other.ends)))
+
+
+def coverage_with_value(starts: np.ndarray, ends: np.ndarray, values: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """Return the integral of the values of the ranges over the time before each of the times.
+    The ranges must be sorted and must not overlap each other, like the ones of merge_ranges_with_value.
+    """
+    times = np.asarray(times)
+    if len(starts) == 0:
+        return np.zeros(times.shape)
+    integrals = np.zeros(len(starts) + 1)
+    np.cumsum((ends - starts) * values, out=integrals[1:])
+    i = np.searchsorted(starts, times, side='right')
+    last = np.maximum(i - 1, 0)
+    beyond = np.where(i > 0, np.maximum(ends[last] - times, 0) * values[last], 0)
+    return integrals[i] - beyond
+
+
+# The functions on the lists of tuples below are kept for compatibility, they wrap IntervalSet.
+# The ranges are (start, end) except the ones with value, and the empty ranges are dropped.
 
 # src_ranges: item of (start_time, end_time, value)
 def merge_ranges_with_value(src_ranges):
-    from collections import namedtuple
-    from enum import IntEnum
-
-    class EndpointTypes(IntEnum):
-        START = 0
-        END = 1
-
-    EndPoint = namedtuple('EndPoint', ['time', 'pt_type', 'value'])
-
-    merged_ranges = []
-    if len(src_ranges) > 0:
-        # Build tuple of (time, type, value)
-        endpoints: List[EndPoint] = []
-        for r in src_ranges:
-            endpoints.append(EndPoint(r[0], EndpointTypes.START, r[2]))
-            endpoints.append(EndPoint(r[1], EndpointTypes.END, r[2]))
-        endpoints.sort(key=lambda x: [x.time, int(x.pt_type)])  # Make START in front of END if equal on time.
-
-        last_endpoint_time = endpoints[0].time
-        last_value = endpoints[0].value
-        for i in range(1, len(endpoints)):
-            ep = endpoints[i]
-            if ep.time > last_endpoint_time and last_value > 0.0:
-                approximated_sm_efficiency = min(last_value, 1.0)
-                merged_ranges.append((last_endpoint_time, ep.time, approximated_sm_efficiency))
-            last_endpoint_time = ep.time
-            if ep.pt_type == EndpointTypes.START:
-                last_value += ep.value
-            else:
-                last_value -= ep.value
-
-    return merged_ranges
+    """Merge the ranges into the non-overlapping ones whose value is the sum of the values of the source ranges
+    covering it, capped by 1.0. The parts with no positive value are dropped.
+    """
+    if len(src_ranges) == 0:
+        return []
+
+    starts, ends, values = _columns(src_ranges)
+    times = np.concatenate((starts, ends))
+    is_end = np.repeat([0, 1], len(starts))
+    deltas = np.concatenate((values, -values))
+    # START in front of END if equal on time, otherwise in the order of the source ranges.
+    order = np.lexsort((is_end, times))
+    times = times[order]
+    values = np.add.accumulate(deltas[order])
+
+    emit = (times[1:] > times[:-1]) & (values[:-1] > 0.0)
+    return list(zip(times[:-1][emit].tolist(), times[1:][emit].tolist(),
+                    np.minimum(values[:-1][emit], 1.0).tolist()))
 
 
 # range_list1 item is length 3. range_list2 item is length 2.
 # Reture value's item is length 3.
 def intersection_ranges_lists_with_value(range_list1, range_list2) -> List[Tuple[int, int, int]]:
-    range_list_dst = []
     if len(range_list1) == 0 or len(range_list2) == 0:
-        return range_list_dst
-    r1 = range_list1[0]
-    r2 = range_list2[0]
-    i1 = i2 = 0
-    while i1 < len(range_list1):
-        if i2 == len(range_list2):
-            break
-        elif r2[1] <= r1[0]:
-            r2, i2 = pop_list(range_list2, i2)
-        elif r2[0] <= r1[0] and r2[1] < r1[1]:
-            assert (r2[1] > r1[0])
-            range_list_dst.append((r1[0], r2[1], r1[2]))
-            r1 = (r2[1], r1[1], r1[2])
-            r2, i2 = pop_list(range_list2, i2)
-        elif r2[0] <= r1[0]:
-            assert (r2[1] >= r1[1])
-            range_list_dst.append(r1)
-            r2 = (r1[1], r2[1])
-            r1, i1 = pop_list(range_list1, i1)
-        elif r2[1] < r1[1]:
-            assert (r2[0] > r1[0])
-            range_list_dst.append((r2[0], r2[1], r1[2]))
-            r1 = (r2[1], r1[1], r1[2])
-            r2, i2 = pop_list(range_list2, i2)
-        elif r2[0] < r1[1]:
-            assert (r2[1] >= r1[1])
-            range_list_dst.append((r2[0], r1[1], r1[2]))
-            r2 = (r1[1], r2[1])
-            r1, i1 = pop_list(range_list1, i1)
-        else:
-            assert (r2[0] >= r1[1])
-            r1, i1 = pop_list(range_list1, i1)
-    return range_list_dst
+        return []
+    starts1, ends1, values1 = _columns(range_list1)
+    starts2, ends2 = _columns(range_list2)
+    i, j = _overlapping_pairs(starts1, ends1, starts2, ends2)
+    return list(zip(np.maximum(starts1[i], starts2[j]).tolist(),
+                    np.minimum(ends1[i], ends2[j]).tolist(),
+                    values1[i].tolist()))
 
 
 def subtract_ranges_lists(range_list1: List[Tuple[int, int]],
                           range_list2: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
-    range_list_dst = []
     if len(range_list1) == 0:
-        return range_list_dst
-    if len(range_list2) == 0:
-        range_list_dst = list(range_list1)
-        return range_list_dst
-    r1 = range_list1[0]
-    r2 = range_list2[0]
-    i1 = i2 = 0
-    while i1 < len(range_list1):
-        if i2 == len(range_list2):
-            range_list_dst.append(r1)
-            r1, i1 = pop_list(range_list1, i1)
-        elif r2[1] <= r1[0]:
-            r2, i2 = pop_list(range_list2, i2)
-        elif r2[0] <= r1[0] and r2[1] < r1[1]:
-            r1 = (r2[1], r1[1])
-            r2, i2 = pop_list(range_list2, i2)
-        elif r2[0] <= r1[0]:
-            assert (r2[1] >= r1[1])
-            r2 = (r1[1], r2[1])
-            r1, i1 = pop_list(range_list1, i1)
-        elif r2[0] < r1[1]:
-            assert (r2[0] > r1[0])
-            range_list_dst.append((r1[0], r2[0]))
-            r1 = (r2[0], r1[1])
-        else:
-            assert (r2[0] >= r1[1])
-            range_list_dst.append(r1)
-            r1, i1 = pop_list(range_list1, i1)
-    return range_list_dst
+        return []
+    intervals = IntervalSet.from_ranges(range_list1, True)
+    return intervals.subtract(IntervalSet.from_ranges(range_list2, True)).to_list()
 
 
 def intersection_ranges_lists(range_list1: List[Tuple[int, int]],
                               range_list2: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
-    range_list_dst = []
     if len(range_list1) == 0 or len(range_list2) == 0:
-        return range_list_dst
-    r1 = range_list1[0]
-    r2 = range_list2[0]
-    i1 = i2 = 0
-    while i1 < len(range_list1):
-        if i2 == len(range_list2):
-            break
-        elif r2[1] <= r1[0]:
-            r2, i2 = pop_list(range_list2, i2)
-        elif r2[0] <= r1[0] and r2[1] < r1[1]:
-            assert (r2[1] > r1[0])
-            range_list_dst.append((r1[0], r2[1]))
-            r1 = (r2[1], r1[1])
-            r2, i2 = pop_list(range_list2, i2)
-        elif r2[0] <= r1[0]:
-            assert (r2[1] >= r1[1])
-            range_list_dst.append(r1)
-            r2 = (r1[1], r2[1])
-            r1, i1 = pop_list(range_list1, i1)
-        elif r2[1] < r1[1]:
-            assert (r2[0] > r1[0])
-            range_list_dst.append(r2)
-            r1 = (r2[1], r1[1])
-            r2, i2 = pop_list(range_list2, i2)
-        elif r2[0] < r1[1]:
-            assert (r2[1] >= r1[1])
-            range_list_dst.append((r2[0], r1[1]))
-            r2 = (r1[1], r2[1])
-            r1, i1 = pop_list(range_list1, i1)
-        else:
-            assert (r2[0] >= r1[1])
-            r1, i1 = pop_list(range_list1, i1)
-    return range_list_dst
+        return []
+    intervals = IntervalSet.from_ranges(range_list1, True)
+    return intervals.intersection(IntervalSet.from_ranges(range_list2, True)).to_list()
 
 
 def get_ranges_sum(ranges: List[Tuple[int, int]]) -> int:
@@ -161,30 +206,8 @@ def get_ranges_sum(ranges: List[Tuple[int, int]]) -> int:
     return sum
 
 
-def pop_list(range_list, index):
-    next_index = index + 1
-    if next_index >= len(range_list):
-        return None, len(range_list)
-    next_item = range_list[next_index]
-    return next_item, next_index
-
-
 def merge_ranges(src_ranges, is_sorted=False) -> List[Tuple[int, int]]:
     if not src_ranges:
         # return empty list if src_ranges is None or its length is zero.
         return []
-
-    if not is_sorted:
-        src_ranges.sort(key=lambda x: x[0])
-
-    merged_ranges = []
-    merged_ranges.append(src_ranges[0])
-    for src_id in range(1, len(src_ranges)):
-        src_range = src_ranges[src_id]
-        if src_range[1] > merged_ranges[-1][1]:
-            if src_range[0] <= merged_ranges[-1][1]:
-                merged_ranges[-1] = (merged_ranges[-1][0], src_range[1])
-            else:
-                merged_ranges.append((src_range[0], src_range[1]))
-
-    return merged_ranges
+    return IntervalSet.from_ranges(src_ranges, is_sorted).to_list()
@@ -14,6 +14,19 @@ from .overall_parser import ProfileRole
 logger = utils.get_logger()
 
 
+class _ViewData:
+    """The aggregates of RunProfileData which the views generated on demand are built from.
+    It is kept by RunProfile instead of the whole RunProfileData.
+    """
+    _ATTRIBUTES = ['has_kernel', 'has_memcpy_or_memset', 'op_list_groupby_name', 'op_list_groupby_name_input',
+                   'stack_lists_group_by_name', 'stack_lists_group_by_name_input', 'kernel_list_groupby_name_op',
+                   'kernel_stat', 'tc_used_ratio', 'gpu_metrics_parser']
+
+    def __init__(self, profile_data: RunProfileData):
+        for name in self._ATTRIBUTES:
+            setattr(self, name, getattr(profile_data, name))
+
+
 class RunGenerator:
     def __init__(self, worker, span, profile_data: RunProfileData):
         self.worker = worker
@@ -32,25 +45,13 @@ class RunGenerator:
         profile_run.overview = self._generate_overview()
 
         profile_run.views.append(consts.OP_VIEW)
-        profile_run.operation_pie_by_name = self._generate_op_pie()
-        profile_run.operation_table_by_name = self._generate_op_table(self.profile_data.op_list_groupby_name)
-        profile_run.operation_stack_by_name = self._generate_op_table_for_stack(False)
-        profile_run.operation_pie_by_name_input = self._generate_op_pie(True)
-        profile_run.operation_table_by_name_input = self._generate_op_table(
-            self.profile_data.op_list_groupby_name_input, True)
-        profile_run.operation_stack_by_name_input = self._generate_op_table_for_stack(True)
-
         if self.profile_data.has_kernel:
             profile_run.views.append(consts.KERNEL_VIEW)
-            profile_run.kernel_op_table = self._generate_kernel_op_table()
-            profile_run.kernel_pie = self._generate_kernel_pie()
-            profile_run.kernel_table = self._generate_kernel_table()
-            profile_run.tc_pie = self._generate_tc_pie()
 
         profile_run.views.append(consts.TRACE_VIEW)
         profile_run.trace_file_path = self.profile_data.trace_file_path
-
-        profile_run.gpu_metrics = self.profile_data.gpu_metrics_parser.get_gpu_metrics()
+        profile_run.steps = self.profile_data.steps
+        profile_run.steps_names = self.profile_data.steps_names
 
         gpu_infos = {gpu_id: RunGenerator._get_gpu_info(self.profile_data.device_props, gpu_id)
                      for gpu_id in self.profile_data.gpu_metrics_parser.gpu_ids}
@@ -59,6 +60,7 @@ class RunGenerator:
         profile_run.gpu_summary, profile_run.gpu_tooltip = \
             self.profile_data.gpu_metrics_parser.get_gpu_metrics_data_tooltip(
                 gpu_infos, self.profile_data.tc_ratio)
+        profile_run.gpu_metrics_parser = self.profile_data.gpu_metrics_parser
 
         profile_run.tid2tree = self.profile_data.tid2tree
         profile_run.pl_tid2tree = self.profile_data.pl_tid2tree
@@ -67,6 +69,7 @@ class RunGenerator:
             profile_run.views.append(consts.MEMORY_VIEW)
             profile_run.memory_snapshot = self.profile_data.memory_snapshot
 
+        # the module statistics decide whether the module view is shown, so they are not deferred.
         profile_run.module_stats = aggegate_module_view(self.profile_data.tid2tree, self.profile_data.events)
         profile_run.pl_module_stats = aggegate_pl_module_view(self.profile_data.tid2tree, self.profile_data.events)
         if profile_run.is_pytorch_lightning and profile_run.pl_module_stats:
@@ -74,8 +77,38 @@ class RunGenerator:
         elif profile_run.module_stats:
             profile_run.views.append(consts.MODULE_VIEW)
 
+        profile_run.view_generator = RunGenerator(self.worker, self.span, _ViewData(self.profile_data))
         return profile_run
 
+    def generate_view(self, name: str):
+        """Generate the view of RunProfile with the attribute name, None if the profile doesn't have it."""
+        if name in ('kernel_op_table', 'kernel_pie', 'kernel_table', 'tc_pie') and not self.profile_data.has_kernel:
+            return None
+
+        if name == 'operation_pie_by_name':
+            return self._generate_op_pie()
+        if name == 'operation_table_by_name':
+            return self._generate_op_table(self.profile_data.op_list_groupby_name)
+        if name == 'operation_stack_by_name':
+            return self._generate_op_table_for_stack(False)
+        if name == 'operation_pie_by_name_input':
+            return self._generate_op_pie(True)
+        if name == 'operation_table_by_name_input':
+            return self._generate_op_table(self.profile_data.op_list_groupby_name_input, True)
+        if name == 'operation_stack_by_name_input':
+            return self._generate_op_table_for_stack(True)
+        if name == 'gpu_metrics':
+            return self.profile_data.gpu_metrics_parser.get_gpu_metrics()
+        if name == 'kernel_op_table':
+            return self._generate_kernel_op_table()
+        if name == 'kernel_pie':
+            return self._generate_kernel_pie()
+        if name == 'kernel_table':
+            return self._generate_kernel_table()
+        if name == 'tc_pie':
+            return self._generate_tc_pie()
+        raise ValueError('Unknown view {}'.format(name))
+
     def _generate_overview(self):
         def build_part_time_str(part_cost: float, part_name: str):
             format_str = ('<div class="visualization-tooltip" style="white-space: nowrap;">'
@@ -290,7 +323,7 @@ class RunGenerator:
             row['tc_self_ratio'] = round(100 * op.tc_self_ratio, 2)
             row['tc_total_ratio'] = round(100 * op.tc_total_ratio, 2)
             if call_stack:
-                row['call_stack'] = op.callstacks.pop()
+                row['call_stack'] = next(iter(op.callstacks))
             else:
                 if group_by_input_shape:
                     key = op.name + '###' + str(op.input_shape)
@@ -0,0 +1,81 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# -------------------------------------------------------------------------
+"""Pass the python objects between processes through memory-mapped files.
+
+The object is pickled with protocol 5 and its NumPy arrays are written out-of-band after the pickle stream.
+The reader maps the file and the arrays are unpickled as views of the mapping instead of copies, the pages
+are shared with the page cache and loaded only when accessed. The other objects are unpickled as usual.
+"""
+import mmap
+import os
+import pickle
+import struct
+from typing import Any, BinaryIO
+
+__all__ = ['dump', 'load']
+
+_MAGIC = b'TBPF'
+_HEADER = struct.Struct('<4sQQ')
+_BUFFER = struct.Struct('<QQ')
+# the alignment of the buffers in the file, enough for any NumPy dtype.
+_ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def dump(obj: Any, f: BinaryIO):
+    """Write the object to the binary file f, which must be at position 0."""
+    buffers = []
+
+    def buffer_callback(buffer: pickle.PickleBuffer):
+        try:
+            buffers.append(buffer.raw())
+        except BufferError:
+            # not contiguous, serialize it in-band.
+            return True
+        return False
+
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffer_callback)
+
+    offset = _HEADER.size + _BUFFER.size * len(buffers) + len(data)
+    table = []
+    for buffer in buffers:
+        offset = _align(offset)
+        table.append(_BUFFER.pack(offset, buffer.nbytes))
+        offset += buffer.nbytes
+
+    f.write(_HEADER.pack(_MAGIC, len(data), len(buffers)))
+    f.writelines(table)
+    f.write(data)
+    position = _HEADER.size + _BUFFER.size * len(buffers) + len(data)
+    for buffer in buffers:
+        padding = _align(position) - position
+        f.write(b'\0' * padding)
+        f.write(buffer)
+        position += padding + buffer.nbytes
+
+
+def load(path: str, remove: bool = False) -> Any:
+    """Load the object written by dump. The file is deleted once it is loaded if remove is True."""
+    with open(path, 'rb') as f:
+        if os.name == 'nt' and remove:
+            # a mapped file cannot be deleted on Windows.
+            content = memoryview(f.read())
+        else:
+            # copy-on-write so that the arrays are writable as the unpickled ones.
+            content = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY))
+    if remove:
+        os.remove(path)
+
+    magic, data_size, num_buffers = _HEADER.unpack_from(content)
+    if magic != _MAGIC:
+        raise ValueError('{} is not a shared object file'.format(path))
+    buffers = []
+    for i in range(num_buffers):
+        offset, size = _BUFFER.unpack_from(content, _HEADER.size + _BUFFER.size * i)
+        buffers.append(content[offset:offset + size])
+    start = _HEADER.size + _BUFFER.size * num_buffers
+    return pickle.loads(content[start:start + data_size], buffers=buffers)
@@ -0,0 +1,131 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# -------------------------------------------------------------------------
+"""The index of a table view to serve it page by page, sorted by any column and filtered by the name.
+
+The rows stay in the order of the generated view, the row orders of a column in both directions are
+computed on its first use and kept as arrays, the ties keep the order of the view. The numbers are sorted
+numerically with None as the smallest value.
+"""
+import numbers
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .. import utils
+
+logger = utils.get_logger()
+
+__all__ = ['TableIndex']
+
+
+class TableIndex:
+    def __init__(self, rows: Sequence, keys: Sequence, search_key: Any, number_keys: Iterable = ()):
+        """The rows are either dicts or lists, the keys are the dict keys or the column names of the list
+        positions. search_key is the default column searched by the query. The values of the number_keys
+        columns are sorted as numbers even if they are strings.
+        """
+        self.rows = rows
+        self.keys = list(keys)
+        self.search_key = search_key
+        self.number_keys = set(number_keys)
+        self._orders: Dict[Tuple[Any, bool], np.ndarray] = {}
+        self._strings: Dict[Any, np.ndarray] = {}
+
+    @staticmethod
+    def from_table(table: Dict) -> 'TableIndex':
+        """Index the {'columns': [...], 'rows': [...]} table of a kernel view, searched by its first column."""
+        names = [column['name'] for column in table['columns']]
+        number_names = [column['name'] for column in table['columns'] if column.get('type') == 'number']
+        return TableIndex(table['rows'], names, names[0] if names else None, number_names)
+
+    @staticmethod
+    def from_records(records: List[Dict], search_key: str) -> 'TableIndex':
+        """Index the rows of an operator view, which are dicts of the same keys."""
+        return TableIndex(records, list(records[0].keys()) if records else [], search_key)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _column(self, key) -> List:
+        if self.rows and isinstance(self.rows[0], dict):
+            return [row.get(key) for row in self.rows]
+        position = self.keys.index(key)
+        return [row[position] for row in self.rows]
+
+    def get_order(self, key, descending: bool) -> np.ndarray:
+        """Return the row indices sorted by the column."""
+        order = self._orders.get((key, descending))
+        if order is None:
+            codes = self._get_codes(key)
+            order = np.argsort(-codes if descending else codes, kind='stable')
+            self._orders[(key, descending)] = order
+        return order
+
+    def _get_codes(self, key) -> np.ndarray:
+        """Return the rank of the value of every row in the column, the equal values have the same rank."""
+        values = self._column(key)
+        if key in self.number_keys:
+            values = [_to_number(v) for v in values]
+        if all(v is None or isinstance(v, numbers.Number) for v in values):
+            # None and NaN are ranked -1, below all the numbers.
+            array = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            valid = ~np.isnan(array)
+            codes = np.full(len(values), -1, dtype=np.int64)
+            codes[valid] = np.unique(array[valid], return_inverse=True)[1].reshape(-1)
+            return codes
+        try:
+            _, codes = np.unique(np.array(values), return_inverse=True)
+        except TypeError:
+            # the values of mixed types are compared as strings.
+            _, codes = np.unique(np.array([str(v) for v in values]), return_inverse=True)
+        return codes.reshape(-1)
+
+    def _get_strings(self, key) -> np.ndarray:
+        strings = self._strings.get(key)
+        if strings is None:
+            strings = np.array([v if isinstance(v, str) else '' for v in self._column(key)], dtype=np.str_)
+            self._strings[key] = strings
+        return strings
+
+    def query(self, sort_by=None, descending=True, search: Optional[str] = None, search_by=None,
+              offset: int = 0, limit: Optional[int] = None) -> Tuple[List, int]:
+        """Return the rows of the page and the number of rows which match the search.
+
+        The rows keep the order of the view if sort_by is None. search is a case-sensitive substring of
+        the search_by column, the name column by default.
+        """
+        if not self.rows:
+            # the columns of an empty operator table are unknown.
+            return [], 0
+        if sort_by is not None and sort_by not in self.keys:
+            raise ValueError('unknown column {}'.format(sort_by))
+        if search_by is None:
+            search_by = self.search_key
+        elif search_by not in self.keys:
+            raise ValueError('unknown column {}'.format(search_by))
+
+        indices = self.get_order(sort_by, descending) if sort_by is not None else None
+        if search:
+            matched = np.char.find(self._get_strings(search_by), search) >= 0
+            if indices is None:
+                indices = np.flatnonzero(matched)
+            else:
+                indices = indices[matched[indices]]
+        total = len(self.rows) if indices is None else len(indices)
+
+        offset = max(offset, 0)
+        end = total if limit is None else min(offset + max(limit, 0), total)
+        if indices is None:
+            return list(self.rows[offset:end]), total
+        return [self.rows[i] for i in indices[offset:end].tolist()], total
+
+
+def _to_number(value) -> Optional[float]:
+    """Convert the value of a number column, which could be a string, to a number, None if it is not one."""
+    if value is None or isinstance(value, numbers.Number):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -171,52 +171,76 @@ class PLModuleEvent(DurationEvent):
 
 def create_event(event, is_pytorch_lightning) -> Optional[BaseEvent]:
     try:
-        type = event.get('ph')
-        if type == 'X':
-            return create_trace_event(event, is_pytorch_lightning)
-        elif type == 'i' and event.get('name') == '[memory]':
-            return MemoryEvent(EventTypes.MEMORY, event)
-        else:
+        type = get_event_type(event, is_pytorch_lightning)
+        if type is None:
             return None
+        return create_event_of_type(type, event)
     except Exception as ex:
         logger.warning('Failed to parse profile event. Exception=%s. Event=%s', ex, event, exc_info=True)
         raise
 
 
-def create_trace_event(event, is_pytorch_lightning) -> Optional[BaseEvent]:
+def get_event_type(event, is_pytorch_lightning) -> Optional[str]:
+    """Return the EventTypes of the event, or None if the event is not used by the profiler."""
+    type = event.get('ph')
+    if type == 'X':
+        return get_trace_event_type(event, is_pytorch_lightning)
+    elif type == 'i' and event.get('name') == '[memory]':
+        return EventTypes.MEMORY
+    else:
+        return None
+
+
+def get_trace_event_type(event, is_pytorch_lightning) -> Optional[str]:
     category = event.get('cat')
     event_type = EventTypeMap.get(category.lower())
     if event_type == EventTypes.USER_ANNOTATION:
         name = event.get('name')
         if name and name.startswith('ProfilerStep#'):
-            return ProfilerStepEvent(event)
+            return EventTypes.PROFILER_STEP
         if name in GlooOpNameSet or name in NcclOpNameSet:
-            return OperatorEvent(event_type, event)
+            return event_type
+        return None
     elif event_type == EventTypes.OPERATOR:
         name = event.get('name')
         if name and name.startswith('ProfilerStep#'):
-            return ProfilerStepEvent(event)
+            return EventTypes.PROFILER_STEP
         if is_pytorch_lightning:
             if name and name.startswith('[pl][profile]'):
-                return PLProfileEvent(event)
+                return EventTypes.PL_PROFILE
             elif name and name.startswith('[pl][module]'):
-                return PLModuleEvent(event)
-        return OperatorEvent(event_type, event)
-    elif event_type == EventTypes.PYTHON:
-        return OperatorEvent(event_type, event)
-    elif event_type == EventTypes.KERNEL:
-        return KernelEvent(event_type, event)
+                return EventTypes.PL_MODULE
+        return event_type
     elif event_type == EventTypes.PYTHON_FUNCTION:
         if is_pytorch_lightning:
             return None
         args = event.get('args')
         if args and args.get('Python module id') is not None:
-            return ModuleEvent(event)
-        else:
-            return PythonFunctionEvent(event_type, event)
-    elif event_type is not None:
-        return DurationEvent(event_type, event)
-    return None
+            return EventTypes.MODULE
+        return event_type
+    return event_type
+
+
+def create_event_of_type(type: str, event) -> BaseEvent:
+    """Create the event object of the EventTypes returned by get_event_type."""
+    if type == EventTypes.PROFILER_STEP:
+        return ProfilerStepEvent(event)
+    elif type == EventTypes.MODULE:
+        return ModuleEvent(event)
+    elif type == EventTypes.PL_PROFILE:
+        return PLProfileEvent(event)
+    elif type == EventTypes.PL_MODULE:
+        return PLModuleEvent(event)
+    elif type in (EventTypes.OPERATOR, EventTypes.PYTHON, EventTypes.USER_ANNOTATION):
+        return OperatorEvent(type, event)
+    elif type == EventTypes.KERNEL:
+        return KernelEvent(type, event)
+    elif type == EventTypes.PYTHON_FUNCTION:
+        return PythonFunctionEvent(type, event)
+    elif type == EventTypes.MEMORY:
+        return MemoryEvent(type, event)
+    else:
+        return DurationEvent(type, event)
 
 
 def create_association_events(events) -> Dict[int, int]:
@@ -0,0 +1,127 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# -------------------------------------------------------------------------
+"""The index of the trace events by time, to send the trace view only the events within a time window.
+
+The events are encoded again into blocks of about 1 MB in the order of the trace file, each block is a
+separate gzip member of the data file. The index keeps the start and end time of every event and its
+position in the block. A window is answered by copying the compressed blocks whose events are all within
+it, only the blocks across the window boundaries are decompressed. The metadata events, e.g. the process
+names, and the other top-level keys of the trace are always sent.
+"""
+import gzip
+from array import array
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from .. import json_codec, utils
+from .trace_stream import iter_trace_events
+
+logger = utils.get_logger()
+
+__all__ = ['TraceIndex']
+
+_BLOCK_SIZE = 1024 * 1024
+_SEPARATOR = b', '
+
+
+class TraceIndex:
+    def __init__(self, data_path: str):
+        self.data_path = data_path
+        self.metadata: Dict[str, Any] = {}
+        # the encoded events sent in every window.
+        self.global_events: List[bytes] = []
+        # the start and end time of the events in the blocks.
+        self.ts = np.empty(0)
+        self.end_ts = np.empty(0)
+        # the end of each event within its block.
+        self.event_ends = np.empty(0, dtype=np.int32)
+        # the index of the first event of each block, followed by the number of events.
+        self.block_events = np.zeros(1, dtype=np.int64)
+        # the position of each block in the data file, followed by the file size.
+        self.block_offsets = np.zeros(1, dtype=np.int64)
+
+    @staticmethod
+    def build(trace_path: str, data_path: str) -> 'TraceIndex':
+        """Index the events of the trace file, the blocks are written to data_path."""
+        index = TraceIndex(data_path)
+        ts = array('d')
+        end_ts = array('d')
+        event_ends = array('i')
+        block_events = array('q', [0])
+        block_offsets = array('q', [0])
+        with open(data_path, 'wb') as f:
+            block = bytearray()
+
+            def flush():
+                data = gzip.compress(block, 1)
+                f.write(data)
+                block_offsets.append(block_offsets[-1] + len(data))
+                block_events.append(len(ts))
+                block.clear()
+
+            for event in iter_trace_events(trace_path, index.metadata):
+                data = json_codec.dumps(event)
+                start = event.get('ts')
+                if event.get('ph') == 'M' or not isinstance(start, (int, float)):
+                    index.global_events.append(data)
+                    continue
+                if block:
+                    block += _SEPARATOR
+                block += data
+                dur = event.get('dur')
+                ts.append(start)
+                end_ts.append(start + dur if isinstance(dur, (int, float)) else start)
+                event_ends.append(len(block))
+                if len(block) >= _BLOCK_SIZE:
+                    flush()
+            if block:
+                flush()
+
+        index.ts = np.frombuffer(ts, dtype=np.float64).copy()
+        index.end_ts = np.frombuffer(end_ts, dtype=np.float64).copy()
+        index.event_ends = np.frombuffer(event_ends, dtype=np.int32).copy()
+        index.block_events = np.frombuffer(block_events, dtype=np.int64).copy()
+        index.block_offsets = np.frombuffer(block_offsets, dtype=np.int64).copy()
+        return index
+
+    def __len__(self):
+        return len(self.ts) + len(self.global_events)
+
+    def iter_window(self, start_ts: Optional[float], end_ts: Optional[float]) -> Iterator[bytes]:
+        """Yield the gzip members of the trace json which has the events overlapping [start_ts, end_ts),
+        the instant events at start_ts included.
+        """
+        mask = np.ones(len(self.ts), dtype=bool)
+        if end_ts is not None:
+            mask &= self.ts < end_ts
+        if start_ts is not None:
+            mask &= self.end_ts >= start_ts
+        selected = np.flatnonzero(mask)
+        blocks = np.searchsorted(self.block_events, selected, side='right') - 1
+        block_ids, firsts, counts = np.unique(blocks, return_index=True, return_counts=True)
+
+        yield gzip.compress(b'{"traceEvents": [' + _SEPARATOR.join(self.global_events), 1)
+        need_separator = bool(self.global_events)
+        with open(self.data_path, 'rb') as f:
+            for block_id, first, count in zip(block_ids.tolist(), firsts.tolist(), counts.tolist()):
+                f.seek(self.block_offsets[block_id])
+                member = f.read(self.block_offsets[block_id + 1] - self.block_offsets[block_id])
+                if count == self.block_events[block_id + 1] - self.block_events[block_id]:
+                    # all the events of the block are in the window, send it as it is.
+                    if need_separator:
+                        yield gzip.compress(_SEPARATOR, 1)
+                    yield member
+                else:
+                    block = gzip.decompress(member)
+                    events = selected[first:first + count]
+                    ends = self.event_ends[events]
+                    is_first = events == self.block_events[block_id]
+                    starts = np.where(is_first, 0, self.event_ends[events - 1] + len(_SEPARATOR))
+                    data = _SEPARATOR.join(block[start:end] for start, end in zip(starts.tolist(), ends.tolist()))
+                    yield gzip.compress(_SEPARATOR + data if need_separator else data, 1)
+                need_separator = True
+
+        tail = json_codec.dumps(self.metadata)
+        yield gzip.compress(b'], ' + tail[1:] if self.metadata else b']}', 1)
@@ -0,0 +1,231 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# -------------------------------------------------------------------------
+import codecs
+import gzip
+import json
+import re
+from json.decoder import JSONDecodeError
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Tuple
+
+from .. import io, json_codec
+
+__all__ = ['iter_trace_events', 'dump_trace', 'write_trace_body', 'append_trace_events']
+
+_CHUNK_SIZE = 8 * 1024 * 1024
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NEXT_OBJECT = re.compile(r'[ \t\n\r]*\{[ \t\n\r]*"')
+# the prefixes of the numbers, true, false, null, NaN, Infinity and the \uXXXX escapes.
+_PARTIAL_TOKEN = re.compile(r'[-+.\w]*')
+
+
+class _JsonStream:
+    """Decode json values one by one from a file object which is read in chunks.
+    Only the undecoded tail of the current chunk is kept in memory.
+    """
+
+    def __init__(self, fp, chunk_size: int = _CHUNK_SIZE):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        # strict=False to accept the non-ascii control characters exported by some Kineto versions
+        self._json_decoder = json.JSONDecoder(strict=False)
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        # the number of characters dropped from the head of _buf.
+        self._consumed = 0
+        # the stream offset up to which values() failed to decode the values at once.
+        self._failed_end = 0
+
+    def _read_more(self, size: int = 0) -> bool:
+        """Append at least one chunk and size characters, unless the end of file is reached, to the undecoded
+        tail of the buffer. Return False if it is at the end of file already.
+        """
+        if self._eof:
+            return False
+
+        texts = [self._buf[self._pos:]]
+        read = 0
+        while not self._eof and (read == 0 or read < size):
+            chunk = self._fp.read(self._chunk_size)
+            if chunk:
+                text = self._text_decoder.decode(chunk)
+            else:
+                text = self._text_decoder.decode(b'', final=True)
+                self._eof = True
+            texts.append(text)
+            read += len(text)
+        self._consumed += self._pos
+        self._buf = ''.join(texts)
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it, or '' at the end of stream."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._read_more():
+                return ''
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if not c or c not in chars:
+            raise JSONDecodeError('Expecting one of {!r}'.format(chars), self._buf, self._pos)
+        self._pos += 1
+        return c
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = self._json_decoder.raw_decode(self._buf, self._pos)
+            except JSONDecodeError as e:
+                # the value is cut by the end of the buffer if the error is in a string which is not closed
+                # before it, or at a token which is not complete before it. Otherwise it is invalid.
+                truncated = e.msg.startswith('Unterminated string') or _PARTIAL_TOKEN.fullmatch(self._buf, e.pos)
+                # at least double the undecoded text to decode it again, so a long value is decoded in
+                # linear time.
+                if truncated and self._read_more(len(self._buf) - self._pos):
+                    continue
+                raise
+
+            if end == len(self._buf) and self._read_more(len(self._buf) - self._pos):
+                # a number could continue in the next chunk, decode it again.
+                continue
+            self._pos = end
+            return obj
+
+    def values(self) -> List[Any]:
+        """Decode the following objects of an array which are complete in the buffer, at least one.
+
+        The objects up to the last '},' followed by another object in the buffer are decoded at once by
+        json_codec, which is much faster than decoding them one by one with the stdlib decoder. The '},' could
+        still be in a string or a nested object, then the slice is not a valid array and the objects up to it
+        are decoded one by one. The stream is left at the ',' or ']' following the last object.
+        """
+        self.peek()
+        end = len(self._buf)
+        while True:
+            end = self._buf.rfind('},', self._pos, end) + 1
+            if end <= self._pos or _NEXT_OBJECT.match(self._buf, end + 1):
+                break
+        if end > self._pos and self._consumed + end > self._failed_end:
+            try:
+                objs = json_codec.loads('[' + self._buf[self._pos:end] + ']')
+            except ValueError:
+                self._failed_end = self._consumed + end
+            else:
+                self._pos = end
+                return objs
+        return [self.value()]
+
+
+def _open(path: str):
+    if io.is_local(path):
+        fp = open(path, 'rb')
+    else:
+        fp = io.File(path, 'rb')
+    if path.endswith('.gz'):
+        return gzip.GzipFile(fileobj=fp, mode='rb'), fp
+    return fp, fp
+
+
+def iter_trace_events(path: str, metadata: Dict[str, Any], chunk_size: int = _CHUNK_SIZE) -> Iterator[Dict]:
+    """Return a generator of the items of 'traceEvents' in the chrome trace file, one at a time.
+
+    The other top-level keys are stored into ``metadata``. The keys ahead of 'traceEvents' are available
+    when this function returns, while the keys following it are only available after the generator is exhausted.
+    Raise JSONDecodeError if the file is not a valid json.
+    """
+    events = _iter_trace_events(path, metadata, chunk_size)
+    # run to the beginning of 'traceEvents'
+    next(events, None)
+    return events
+
+
+def _iter_trace_events(path: str, metadata: Dict[str, Any], chunk_size: int):
+    fp, raw_fp = _open(path)
+    try:
+        stream = _JsonStream(fp, chunk_size)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+
+        while True:
+            key = stream.value()
+            stream.expect(':')
+            if key == 'traceEvents':
+                stream.expect('[')
+                yield None
+                if stream.peek() == ']':
+                    stream.expect(']')
+                else:
+                    while True:
+                        yield from stream.values()
+                        if stream.expect(',]') == ']':
+                            break
+            else:
+                metadata[key] = stream.value()
+
+            if stream.expect(',}') == '}':
+                break
+    finally:
+        fp.close()
+        raw_fp.close()
+
+
+def dump_trace(fout: BinaryIO, metadata: Dict[str, Any], events: Iterable[Dict]):
+    """Write the chrome trace json without building the whole json string in memory."""
+    fout.write(b'{')
+    for key, value in metadata.items():
+        fout.write(json_codec.dumps(key) + b': ' + json_codec.dumps(value) + b', ')
+    fout.write(b'"traceEvents": [')
+    for i, event in enumerate(events):
+        if i > 0:
+            fout.write(b', ')
+        fout.write(json_codec.dumps(event))
+    fout.write(b']}')
+
+
+def write_trace_body(path: str, fout: BinaryIO, chunk_size: int = _CHUNK_SIZE) -> Tuple[bytes, bool]:
+    """Write the chrome trace file up to the closing bracket of 'traceEvents' to fout as one gzip member.
+    Return the rest of the file starting from the bracket, and whether 'traceEvents' is not empty.
+
+    The events are appended by append_trace_events as another gzip member. The gzip members can be
+    concatenated, so the body is written only once however the appended events change.
+    """
+    fp, raw_fp = _open(path)
+    try:
+        with gzip.GzipFile(fileobj=fout, mode='wb', compresslevel=1) as fzip:
+            # the data from the last closing bracket, which is the tail if no other bracket follows.
+            pending = b''
+            last_byte = b''
+            while True:
+                chunk = fp.read(chunk_size)
+                if not chunk:
+                    break
+                pending += chunk
+                index = pending.rfind(b']')
+                if index > 0:
+                    body = pending[:index]
+                    fzip.write(body)
+                    last_byte = body.rstrip()[-1:] or last_byte
+                    pending = pending[index:]
+    finally:
+        fp.close()
+        raw_fp.close()
+
+    if not pending.startswith(b']'):
+        raise JSONDecodeError('Expecting the end of traceEvents', pending.decode('utf-8', 'replace'), 0)
+    return pending, last_byte != b'['
+
+
+def append_trace_events(fout: BinaryIO, events: List[str], tail: bytes, has_events: bool):
+    """Append the json encoded events to the trace written by write_trace_body, followed by its tail."""
+    data = ', '.join(events).encode('utf-8')
+    if events and has_events:
+        data = b', ' + data
+    fout.write(gzip.compress(data + tail, 1))
@@ -0,0 +1,77 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+"""The cache of the gzipped json responses of the profiles.
+
+A loaded profile never changes, so the response of a view is encoded and compressed once and served from
+the cache afterwards, together with a strong ETag which lets the browser revalidate it by a 304 response.
+An entry is bound to the profile object it is generated from, a reloaded run gets new entries. The least
+recently used entries are removed once the cache exceeds TORCH_PROFILER_RESPONSE_CACHE_MB, 0 disables it.
+"""
+import gzip
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from . import utils
+
+logger = utils.get_logger()
+
+__all__ = ['ResponseCache']
+
+_DEFAULT_SIZE_MB = 256
+
+
+class ResponseCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Hashable, Tuple[weakref.ref, bytes, str]]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_env() -> 'ResponseCache':
+        try:
+            size_mb = int(os.getenv('TORCH_PROFILER_RESPONSE_CACHE_MB', _DEFAULT_SIZE_MB))
+        except ValueError:
+            size_mb = _DEFAULT_SIZE_MB
+        return ResponseCache(max(size_mb, 0) * 1024 * 1024)
+
+    def get(self, key: Hashable, profile: Any) -> Optional[Tuple[bytes, str]]:
+        """Return the (gzipped content, etag) of the key generated from the profile, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            profile_ref, data, etag = entry
+            if profile_ref() is not profile:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return data, etag
+
+    def put(self, key: Hashable, profile: Any, content: bytes) -> Tuple[bytes, str]:
+        """Compress the json content of the profile and cache it. Return the (gzipped content, etag)."""
+        data = gzip.compress(content, 1)
+        etag = hashlib.sha1(content).hexdigest()
+        if len(data) > self.max_size:
+            return data, etag
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (weakref.ref(profile), data, etag)
+            self._size += len(data)
+            while self._size > self.max_size:
+                self._remove(next(iter(self._entries)))
+        return data, etag
+
+    def _remove(self, key: Hashable):
+        _, data, _ = self._entries.pop(key)
+        self._size -= len(data)
+
+    def __len__(self):
+        return len(self._entries)
@@ -2,17 +2,23 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # --------------------------------------------------------------------------
 from collections import defaultdict
-from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
 
 from . import consts, utils
 from .profiler.diffrun import compare_op_tree, diff_summary
 from .profiler.memory_parser import MemoryMetrics, MemoryRecord, MemorySnapshot
 from .profiler.module_op import Stats
 from .profiler.node import OperatorNode
-from .utils import Canonicalizer, DisplayRounder, lttb_sample
+from .profiler.table_index import TableIndex
+from .utils import Canonicalizer, DisplayRounder, lttb_downsample
 
 logger = utils.get_logger()
 
+# the points of the memory curve of a device sent to the Memory view.
+MEMORY_CURVE_POINTS = 10240
+
 
 class Run:
     """ A profiler run. For visualization purpose only.
@@ -90,10 +96,39 @@ class Run:
             return self.profiles.values()
 
 
+class _LazyView:
+    """A view of RunProfile which is generated by the view_generator of the profile on the first access."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, profile, owner=None):
+        if profile is None:
+            return self
+        generator = profile.view_generator
+        value = generator.generate_view(self.name) if generator is not None else None
+        # memoize it, the instance attribute takes precedence over the descriptor from now on.
+        profile.__dict__[self.name] = value
+        return value
+
+
 class RunProfile:
     """ Cooked profiling result for a worker. For visualization purpose only.
+    The views except the overview are generated on demand, see RunGenerator.generate_view.
     """
 
+    operation_pie_by_name = _LazyView()
+    operation_table_by_name = _LazyView()
+    operation_stack_by_name: Dict = _LazyView()
+    operation_pie_by_name_input = _LazyView()
+    operation_table_by_name_input = _LazyView()
+    operation_stack_by_name_input: Dict = _LazyView()
+    kernel_op_table = _LazyView()
+    kernel_pie = _LazyView()
+    kernel_table = _LazyView()
+    tc_pie = _LazyView()
+    gpu_metrics = _LazyView()
+
     def __init__(self, worker, span):
         self.worker = worker
         self.span = span
@@ -105,22 +140,19 @@ class RunProfile:
         self.has_memcpy_or_memset = False
         self.profiler_start_ts = float('inf')
         self.overview = None
-        self.operation_pie_by_name = None
-        self.operation_table_by_name = None
-        self.operation_stack_by_name: Dict = None
-        self.operation_pie_by_name_input = None
-        self.operation_table_by_name_input = None
-        self.operation_stack_by_name_input: Dict = None
-        self.kernel_op_table = None
-        self.kernel_pie = None
-        self.kernel_table = None
-        self.tc_pie = None
+        self.view_generator = None
         self.trace_file_path: str = None
-
-        self.gpu_metrics = None
+        # whether the trace file already has the GPU metrics counters, see RunLoader._append_gpu_metrics.
+        self.trace_has_gpu_metrics = False
+        # the TraceIndex of the trace file built at load time, None for the small ones.
+        self.trace_index = None
+        # the (start, end) of the steps, in the order of steps_names.
+        self.steps: List[Tuple[int, int]] = []
+        self.steps_names: List[str] = []
 
         self.gpu_summary = None
         self.gpu_tooltip = None
+        self.gpu_metrics_parser = None
 
         # for memory stats and curve
         self.memory_snapshot: Optional[MemorySnapshot] = None
@@ -130,28 +162,56 @@ class RunProfile:
         self.module_stats: Optional[List(Stats)] = None
         self.pl_module_stats: Optional[List(Stats)] = None
 
-    def append_gpu_metrics(self, raw_data: bytes):
-        counter_json_str = ', {}'.format(', '.join(self.gpu_metrics))
-        counter_json_bytes = bytes(counter_json_str, 'utf-8')
-
-        raw_data_without_tail = raw_data[: raw_data.rfind(b']')]
-        raw_data = b''.join([raw_data_without_tail, counter_json_bytes, b']}'])
-
-        import gzip
-        raw_data = gzip.compress(raw_data, 1)
-        return raw_data
-
-    @staticmethod
-    def _filtered_by_ts(events: Iterable[MemoryRecord], start_ts, end_ts):
-        """Returns time-ordered events of memory allocation and free"""
-        if start_ts is not None and end_ts is not None:
-            events = [e for e in events if start_ts <= e.ts and e.ts <= end_ts]
-        elif start_ts is not None:
-            events = [e for e in events if start_ts <= e.ts]
-        elif end_ts is not None:
-            events = [e for e in events if e.ts <= end_ts]
-
-        return events
+        # the TableIndex of the table views, built on the first page request.
+        self._table_indices: Dict[str, TableIndex] = {}
+
+    def get_step_range(self, step: str) -> Optional[Tuple[int, int]]:
+        """Return the (start, end) of the step with the name, e.g. '5' for 'ProfilerStep#5'."""
+        for name, step_range in zip(self.steps_names, self.steps):
+            if name == step:
+                return step_range
+        return None
+
+    def get_gpu_counters(self, start_ts=None, end_ts=None, resolution=None):
+        """Return the GPU counter events of the trace view within [start_ts, end_ts), see
+        GPUMetricsParser.get_gpu_counters.
+        """
+        if not self.has_kernel or self.gpu_metrics_parser is None:
+            return []
+        if resolution is None:
+            return self.gpu_metrics_parser.get_gpu_counters(start_ts, end_ts)
+        return self.gpu_metrics_parser.get_gpu_counters(start_ts, end_ts, resolution)
+
+    def get_table_index(self, view_name: str) -> Optional[TableIndex]:
+        """Return the TableIndex of the operator or kernel table view, None if the view is not available."""
+        index = self._table_indices.get(view_name)
+        if index is None:
+            view = getattr(self, view_name)
+            if view is None:
+                return None
+            if view_name.startswith('operation_table'):
+                index = TableIndex.from_records(view['data'], 'name')
+            else:
+                index = TableIndex.from_table(view['data'])
+            self._table_indices[view_name] = index
+        return index
+
+    def get_table_page(self, view_name: str, sort_by=None, descending=True, search=None, search_by=None,
+                       offset=0, limit=None):
+        """Return the table view with only the rows of the page, see TableIndex.query. The number of
+        the matched rows is in metadata.total.
+        """
+        index = self.get_table_index(view_name)
+        if index is None:
+            return None
+        view = getattr(self, view_name)
+        rows, total = index.query(sort_by, descending, search, search_by, offset, limit)
+        metadata = dict(view['metadata'], total=total, offset=max(offset, 0))
+        if sort_by is not None:
+            metadata['sort'] = sort_by
+        if isinstance(view['data'], dict):
+            return {'metadata': metadata, 'data': dict(view['data'], rows=rows)}
+        return {'metadata': metadata, 'data': rows}
 
     def get_memory_stats(self, start_ts=None, end_ts=None, memory_metric='K'):
         cano = Canonicalizer(memory_metric=memory_metric)
@@ -214,69 +274,45 @@ class RunProfile:
             self,
             time_metric: str = 'ms',
             memory_metric: str = 'K',
-            patch_for_step_plot=True):
-        def get_curves_and_peaks(records: List[MemoryRecord], cano: Canonicalizer):
-            """Inputs:
-                records: Sorted list of MemoryRecord
-
-            For example:
-            ```py
-            {
-                'CPU': [# Timestamp, Total Allocated, Total Reserved, Device Total Memory, operator
-                    [1, 4, 4, 1000000, 'aten::add'],
-                    [2, 16, 16, 1000000, "aten::empty],
-                    [4, 4, 16, 1000000, '...'],
-                ],
-                'GPU0': ...
-            }
-            ```"""
-            curves = defaultdict(list)
-            peaks = defaultdict(float)
-            for r in records:
-                if r.addr is None:
-                    continue
-                dev = r.device_name
-                ts = r.ts
-                ta = r.total_allocated
-                tr = r.total_reserved
-
-                if ta != ta or tr != tr:  # isnan
-                    continue
-
-                curves[dev].append([
-                    cano.convert_time(ts - self.profiler_start_ts),
-                    cano.convert_memory(ta),
-                    cano.convert_memory(tr),
-                ])
-                peaks[dev] = max(peaks[dev], ta)
-
-            for dev in curves:
-                if len(curves[dev]) == 0:
-                    del curves[dev]
-                    del peaks[dev]
-
-            return curves, peaks
-
+            patch_for_step_plot=True,
+            start_ts=None,
+            end_ts=None,
+            points: int = MEMORY_CURVE_POINTS):
+        """Return the memory curves sampled to at most the given points. If start_ts or end_ts is given, only
+        the range [start_ts, end_ts] is sampled from the full resolution curves, along with the last point
+        before it, so a zoomed in curve keeps its details.
+        """
         # NOTE: this should have been occured in frontend
-        def patch_curves_for_step_plot(curves: Dict[str, List]):
+        def patch_curve_for_step_plot(curve: np.ndarray):
             # For example, if a curve is [(0, 0), (1, 1), (2,2)], the line plot
             # is a stright line. Interpolating it as [(0, 0), (1, 0), (1, 1),
             # (2,1) (2,2)], then the line plot will work as step plot.
-            new_curves = defaultdict(list)
-            for dev, curve in curves.items():
-                new_curve = []
-                for i, p in enumerate(curve):
-                    if i != 0:
-                        new_curve.append(p[:1] + new_curve[-1][1:])
-                    new_curve.append(p)
-                new_curves[dev] = new_curve
-            return new_curves
+            if len(curve) == 0:
+                return curve
+            patched = np.empty((2 * len(curve) - 1, curve.shape[1]), dtype=curve.dtype)
+            patched[0::2] = curve
+            patched[1::2, 0] = curve[1:, 0]
+            patched[1::2, 1:] = curve[:-1, 1:]
+            return patched
 
         cano = Canonicalizer(time_metric, memory_metric)
 
-        curves, peaks = get_curves_and_peaks(self.memory_snapshot.memory_records, cano)
-        if patch_for_step_plot:
-            curves = patch_curves_for_step_plot(curves)
+        curves = {}
+        peaks = {}
+        for dev, curve in self.memory_snapshot.get_memory_curves().items():
+            if len(curve) == 0:
+                continue
+            peaks[dev] = curve[:, 1].max()
+            if start_ts is not None:
+                curve = curve[max(int(np.searchsorted(curve[:, 0], start_ts, side='right')) - 1, 0):]
+            if end_ts is not None:
+                curve = curve[:int(np.searchsorted(curve[:, 0], end_ts, side='right'))]
+            if patch_for_step_plot:
+                curve = patch_curve_for_step_plot(curve)
+            curves[dev] = np.stack((cano.convert_time(curve[:, 0] - self.profiler_start_ts),
+                                    cano.convert_memory(curve[:, 1]),
+                                    cano.convert_memory(curve[:, 2])), axis=1)
+
         peaks_formatted = {}
         totals = {}
         for dev, value in peaks.items():
@@ -294,7 +330,7 @@ class RunProfile:
                 default_device = dev
                 break
 
-        curves = lttb_sample(curves)
+        curves = {dev: lttb_downsample(curve, points).tolist() for dev, curve in curves.items()}
 
         return {
             'metadata': {
@@ -334,43 +370,23 @@ class RunProfile:
         round = DisplayRounder(ndigits=2)
 
         profiler_start_ts = self.profiler_start_ts
-        memory_records = RunProfile._filtered_by_ts(self.memory_snapshot.memory_records, start_ts, end_ts)
+        memory_records = self.memory_snapshot.memory_records
+        alloc_idx, free_idx, allocations, releases = self.memory_snapshot.get_allocations(start_ts, end_ts)
 
         events = defaultdict(list)
-        alloc = {}  # allocation events may or may not have paired free event
-        free = {}  # free events that does not have paired alloc event
-        prev_ts = float('-inf')  # ensure ordered memory records is ordered
-        for i, r in enumerate(memory_records):
-            if r.addr is None:
-                # profile json data prior to pytorch 1.10 do not have addr
-                # we should ignore them
-                continue
-            assert prev_ts <= r.ts
-            prev_ts = r.ts
-            addr = r.addr
-            size = r.bytes
-            if r.is_allocation:
-                # to be matched with a release event
-                alloc[addr] = i
-            else:
-                if addr in alloc:
-                    alloc_r = memory_records[alloc[addr]]
-                    alloc_ts = alloc_r.ts
-                    free_ts = r.ts
-                    events[alloc_r.device_name].append([
-                        get_op_name_or_ctx(alloc_r),
-                        round(cano.convert_memory(-size)),
-                        round(cano.convert_time(alloc_ts - profiler_start_ts)),
-                        round(cano.convert_time(free_ts - profiler_start_ts)),
-                        round(cano.convert_time(free_ts - alloc_ts)),
-                    ])
-                    del alloc[addr]
-                else:
-                    if addr in free:
-                        logger.warning(f'Address {addr} is freed multiple times')
-                    free[addr] = i
-
-        for i in alloc.values():
+        for i, j in zip(alloc_idx.tolist(), free_idx.tolist()):
+            alloc_r = memory_records[i]
+            alloc_ts = alloc_r.ts
+            free_ts = memory_records[j].ts
+            events[alloc_r.device_name].append([
+                get_op_name_or_ctx(alloc_r),
+                round(cano.convert_memory(-memory_records[j].bytes)),
+                round(cano.convert_time(alloc_ts - profiler_start_ts)),
+                round(cano.convert_time(free_ts - profiler_start_ts)),
+                round(cano.convert_time(free_ts - alloc_ts)),
+            ])
+
+        for i in allocations.tolist():
             r = memory_records[i]
             events[r.device_name].append([
                 get_op_name_or_ctx(r),
@@ -380,7 +396,7 @@ class RunProfile:
                 None,
             ])
 
-        for i in free.values():
+        for i in releases.tolist():
             r = memory_records[i]
             events[r.device_name].append([
                 get_op_name_or_ctx(r),
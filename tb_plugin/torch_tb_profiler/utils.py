@@ -126,32 +126,95 @@ def timing(description: str, force: bool = False) -> None:
 def _areas_of_triangles(a, bs, c):
     """Calculate areas of triangles from duples of vertex coordinates.
 
-    Uses implicit numpy broadcasting along first axis of ``bs``.
+    Uses implicit numpy broadcasting along the bins axis of ``a`` and ``c``
+    and the points axis of ``bs``.
 
     Returns
     -------
     numpy.array
-        Array of areas of shape (len(bs),)
+        Array of areas of shape bs.shape[:-1]
     """
-    bs_minus_a = bs - a
-    a_minus_bs = a - bs
-    return 0.5 * abs(
-        (a[0] - c[0]) * (bs_minus_a[:, 1]) - (a_minus_bs[:, 0]) * (c[1] - a[1])
+    a = a[:, None, :]
+    c = c[:, None, :]
+    return 0.5 * np.abs(
+        (a[..., 0] - c[..., 0]) * (bs[..., 1] - a[..., 1]) - (a[..., 0] - bs[..., 0]) * (c[..., 1] - a[..., 1])
     )
 
 
-def lttb_sample(memory_curves, n_out = 10240):
+# the passes over all the bins before LTTB falls back to visit the remaining bins one by one.
+_LTTB_MAX_PASSES = 32
+
+
+def lttb_downsample(data: np.ndarray, n_out: int) -> np.ndarray:
+    """Downsample the rows of ``data`` to ``n_out`` rows using the LTTB algorithm on the first two columns.
+
+    The data except the first and last rows is split into ``n_out - 2`` bins as np.array_split does, they
+    have at most two sizes and are viewed as two 3-d arrays. LTTB selects the point of a bin by the point
+    selected in the previous bin, so every pass selects the points of all the bins at once from the points
+    of the last pass, until nothing changes. A pass fixes at least the next bin, the bins which are still
+    changing after _LTTB_MAX_PASSES are visited one by one.
+    """
+    length = len(data)
+    if n_out >= length:
+        return data
+    if n_out < 3:
+        return data[[0, length - 1]][:n_out]
+
+    n_bins = n_out - 2
+    inner = data[1:length - 1]
+    size, n_large = divmod(len(inner), n_bins)
+    columns = data.shape[1]
+    groups = [inner[:n_large * (size + 1)].reshape(n_large, size + 1, columns),
+              inner[n_large * (size + 1):].reshape(n_bins - n_large, size, columns)]
+
+    means = np.concatenate([group.mean(axis=1) for group in groups])
+    # the centroid of the next bin of every bin, the last point for the last bin.
+    centroids = np.concatenate([means[1:], data[length - 1:]])
+
+    def select(previous, first, last):
+        """Select the points of the bins [first, last) from the points selected in their previous bins."""
+        selected = []
+        for offset, group in ((0, groups[0]), (n_large, groups[1])):
+            begin, end = max(first, offset), min(last, offset + len(group))
+            if begin < end:
+                bins = group[begin - offset:end - offset]
+                areas = _areas_of_triangles(previous[begin - first:end - first], bins, centroids[begin:end])
+                selected.append(bins[np.arange(end - begin), np.argmax(areas, axis=1)])
+        return np.concatenate(selected)
+
+    out = np.empty((n_out, columns), dtype=data.dtype)
+    out[0] = data[0]
+    out[n_out - 1] = data[length - 1]
+    # the point selected in the previous bin of every bin, starting from the centroids.
+    points = np.concatenate([data[:1], means[:-1]])
+    start = 0
+    for _ in range(_LTTB_MAX_PASSES):
+        selected = select(points[start:], start, n_bins)
+        out[start + 1:n_out - 1] = selected
+        changed = np.flatnonzero(np.any(selected[:-1] != points[start + 1:], axis=1))
+        if len(changed) == 0:
+            return out
+        points[start + 1:] = selected[:-1]
+        # the bins up to the first changed one have been selected from their final previous points.
+        start += int(changed[0]) + 1
+
+    for i in range(start, n_bins):
+        out[i + 1] = select(out[i:i + 1], i, i + 1)[0]
+    return out
+
+
+def lttb_sample(memory_curves, n_out=10240):
     """
     sample ``memory_curves`` to ``n_out`` points using the LTTB algorithm.
 
     Parameters
     ----------
     memory_curves : dict(str, list(list(time,allocated,reverved)))
-        A dict, key for device (cpu, gpu0, gpu1, ...), 
+        A dict, key for device (cpu, gpu0, gpu1, ...),
         value is a list of list of (time,allocated,reverved)
     n_out : int
         Number of data points to downsample to
-    
+
     Returns
     -------
     sumpled memory_curves with at most n_out points.
@@ -159,38 +222,10 @@ def lttb_sample(memory_curves, n_out = 10240):
     sampled_memory_curves = {}
     for key in memory_curves:
         data = memory_curves[key]
-        length = len(data)
-        if n_out >= length:
+        if n_out >= len(data):
             sampled_memory_curves[key] = memory_curves[key]
             continue
 
-        # Split data into bins
-        n_bins = n_out - 2
-        data = np.array(data)
-        data_bins = np.array_split(data[1 : length - 1], n_bins)
-
-        # Prepare output array
-        # First and last points are the same as in the input.
-        out = np.zeros((n_out, 3))
-        out[0] = data[0]
-        out[len(out) - 1] = data[length - 1]
-
         # note that we only need to perform LTTB on (time,allocated)
-        # Largest Triangle Three Buckets (LTTB):
-        # In each bin, find the point that makes the largest triangle
-        # with the point saved in the previous bin
-        # and the centroid of the points in the next bin.
-        for i in range(len(data_bins)):
-            this_bin = data_bins[i]
-            if i < n_bins - 1:
-                next_bin = data_bins[i + 1]
-            else:
-                next_bin = data[len(data) - 1 :]
-            a = out[i]
-            bs = this_bin
-            c = next_bin.mean(axis=0)
-            areas = _areas_of_triangles(a, bs, c)
-            out[i + 1] = bs[np.argmax(areas)]
-
-        sampled_memory_curves[key] = out.tolist()
+        sampled_memory_curves[key] = lttb_downsample(np.array(data), n_out).tolist()
     return sampled_memory_curves